@@ -51,6 +51,7 @@ setup(
     zip_safe=False,
     install_requires=read('requirements.txt', as_list=True),
     extras_require={
+        'encrypted_cookies': ['cryptography'],
         'test': read('requirements-test.txt', as_list=True)
     },
 )
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Runs benchmarks of the hot paths and compares them against the baselines.
+
+Each benchmark records its latency (via watson.auth.benchmark.measure) and
+the number of queries executed by a call once it has been warmed up. A
+benchmark fails if it executes more queries than the baseline plus the query
+threshold.
+
+Wall clock latency varies too much between machines to be checked by default,
+set WATSON_AUTH_BENCHMARK_CHECK_LATENCY=1 to also fail benchmarks whose p50
+latency exceeds the baseline by more than the latency threshold (a ratio, so
+1.5 allows it to be 150% slower).
+
+Set WATSON_AUTH_BENCHMARK_SAVE=1 to write the results as the new baselines
+rather than comparing against them, and WATSON_AUTH_BENCHMARK_LATENCY or
+WATSON_AUTH_BENCHMARK_QUERIES to override the configured thresholds.
+"""
+import contextlib
+import json
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from watson.auth import benchmark
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+
+@contextlib.contextmanager
+def count_queries(engine):
+    """Counts the queries executed against the engine (or all engines if
+    the Engine class is given).
+
+    Yields:
+        list: Each statement that has been executed
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class Suite(object):
+
+    """Measures benchmarks and checks them against the baselines.
+
+    Attributes:
+        engine: The SQLAlchemy engine queries are counted against, defaults
+                to all engines
+        path (string): The path of the baselines file
+        save (boolean): Whether to save the results as the new baselines
+        check_latency (boolean): Whether to check the latency against the
+                                 baselines as well as the number of queries
+    """
+
+    def __init__(self, engine=Engine, path=BASELINES, save=None,
+                 check_latency=None):
+        self.engine = engine
+        self.path = path
+        if save is None:
+            save = bool(os.environ.get('WATSON_AUTH_BENCHMARK_SAVE'))
+        self.save = save
+        if check_latency is None:
+            check_latency = bool(
+                os.environ.get('WATSON_AUTH_BENCHMARK_CHECK_LATENCY'))
+        self.check_latency = check_latency
+        self.results = {}
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = {}
+        self.baselines = data.get('benchmarks', {})
+        self.configured = data.get(
+            'thresholds', {'latency': 1.5, 'queries': 0})
+        self.thresholds = dict(self.configured)
+        for name, cast in (('latency', float), ('queries', int)):
+            value = os.environ.get(
+                'WATSON_AUTH_BENCHMARK_{}'.format(name.upper()))
+            if value:
+                self.thresholds[name] = cast(value)
+
+    def run(self, name, func, iterations=100, setup=None):
+        """Measures the function and checks it against its baseline.
+
+        Args:
+            name (string): The name of the benchmark
+            func (callable): The hot path being measured
+            iterations (int): The number of timed calls
+            setup (callable): Called (untimed) before each call
+
+        Returns:
+            dict: The result of the benchmark
+
+        Raises:
+            AssertionError if the result regresses beyond the thresholds
+        """
+        for counted in (False, True):
+            if setup:
+                setup()
+            if counted:
+                with count_queries(self.engine) as statements:
+                    func()
+            else:
+                func()
+        result = benchmark.measure(func, iterations, warmup=0, setup=setup)
+        result['queries'] = len(statements)
+        self.results[name] = result
+        if not self.save:
+            self.check(name, result)
+        return result
+
+    def check(self, name, result):
+        baseline = self.baselines.get(name)
+        if not baseline:
+            return
+        queries = baseline['queries'] + self.thresholds['queries']
+        assert result['queries'] <= queries, (
+            '{} executed {} queries, the baseline is {}'.format(
+                name, result['queries'], baseline['queries']))
+        if not self.check_latency:
+            return
+        latency = baseline['p50_ms'] * (1 + self.thresholds['latency'])
+        assert result['p50_ms'] <= latency, (
+            '{} took {}ms (p50), the baseline is {}ms'.format(
+                name, result['p50_ms'], baseline['p50_ms']))
+
+    def write(self):
+        """Saves the results as the new baselines (if save is enabled).
+        """
+        if not self.save or not self.results:
+            return
+        baselines = dict(self.baselines)
+        baselines.update(self.results)
+        with open(self.path, 'w') as file:
+            json.dump({
+                'thresholds': self.configured,
+                'benchmarks': baselines,
+            }, file, indent=2, sort_keys=True)
+            file.write('\n')
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from watson.auth import authorization, benchmark, snapshots
+from watson.auth.providers import JWT
+from watson.auth.providers.basic import decorators as basic
+from watson.auth.providers.jwt import decorators as jwt
+from watson.auth.providers.session import decorators as session
+from watson.events import types
+from watson.framework import controllers
+from tests.benchmarks.support import Suite
+from tests.watson.auth import support
+
+suite = None
+
+
+def setup_module(module):
+    module.suite = Suite(support.engine)
+
+
+def teardown_module(module):
+    module.suite.write()
+
+
+class SampleController(controllers.Action):
+
+    @session.auth(roles='admin')
+    def session_action(self):
+        return 'session'
+
+    @session.login
+    def login_action(self, form):
+        return 'login'
+
+    @jwt.auth(permissions='create')
+    def jwt_action(self):
+        return 'jwt'
+
+    @basic.auth(roles='admin')
+    def basic_action(self):
+        return 'basic'
+
+
+def authenticated_request(provider, **environ):
+    return benchmark.authenticated_request(
+        provider, support.admin_user, support.Request,
+        support.sample_environ(**environ))
+
+
+class TestListeners(object):
+
+    def test_route(self):
+        provider = support.app.container.get('watson.auth.providers.Session')
+        listener = support.app.container.get('watson.auth.listeners.Route')
+        router = support.app.container.get('router')
+        request = authenticated_request(provider)
+        environ = dict(request.environ)
+        context = {}
+
+        def setup():
+            request.user = None
+            request.environ.clear()
+            request.environ.update(environ)
+            context.clear()
+            context.update(
+                request=request,
+                route_match=router.match(request))
+
+        event = types.Event('test', params={'context': context})
+        suite.run('listeners.Route', lambda: listener(event), setup=setup)
+        assert request.user.id == support.admin_user.id
+
+
+class TestProviders(object):
+
+    def test_jwt_handle_request(self):
+        provider = JWT(
+            support.default_provider_settings, support.session,
+            executor=support.InlineExecutor())
+        request = authenticated_request(provider)
+        environ = dict(request.environ)
+
+        def setup():
+            request.user = None
+            request.environ.clear()
+            request.environ.update(environ)
+
+        suite.run(
+            'jwt.handle_request',
+            lambda: provider.handle_request(request),
+            setup=setup)
+        assert request.user.id == support.admin_user.id
+
+
+class TestAcl(object):
+
+    def test_generate_user_permissions(self):
+        acl = authorization.Acl(support.complex_user)
+        suite.run(
+            'authorization.Acl._generate_user_permissions',
+            acl._generate_user_permissions,
+            setup=support.session.expire_all)
+        assert acl._permissions
+        assert suite.results[
+            'authorization.Acl._generate_user_permissions']['queries'] == 2
+
+    def test_generate_snapshot_permissions(self):
+        user = benchmark.SyntheticUser(roles=20, permissions_per_role=100)
+        acl = snapshots.Acl(user, user.snapshot)
+        suite.run(
+            'snapshots.Acl._generate_user_permissions',
+            acl._generate_user_permissions)
+        assert acl._permissions
+
+
+class TestDecorators(object):
+
+    def setup(self):
+        controller = support.app.container.get(
+            'tests.benchmarks.test_hot_paths.SampleController')
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        request.user = support.admin_user
+        controller.event = types.Event('test', params={
+            'context': {
+                'request': request
+            }
+        })
+        self.controller = controller
+
+    def test_session_auth(self):
+        suite.run(
+            'session.decorators.auth', self.controller.session_action, iterations=1000)
+        assert self.controller.session_action() == 'session'
+
+    def test_session_login(self):
+        self.controller.request.user = None
+        suite.run(
+            'session.decorators.login', self.controller.login_action, iterations=1000)
+        assert self.controller.login_action() == 'login'
+
+    def test_jwt_auth(self):
+        suite.run(
+            'jwt.decorators.auth', self.controller.jwt_action, iterations=1000)
+        assert self.controller.jwt_action() == 'jwt'
+
+    def test_basic_auth(self):
+        suite.run(
+            'basic.decorators.auth', self.controller.basic_action, iterations=1000)
+        assert self.controller.basic_action() == 'basic'
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Checks that importing watson.auth stays within its budget and does not
+import the dependencies of providers that are not used.
+
+Each module is imported in a fresh interpreter (the best of 3 runs is used).
+If WATSON_AUTH_BENCHMARK_CHECK_LATENCY is set, each must also import within
+WATSON_AUTH_BENCHMARK_IMPORT_BUDGET seconds (defaults to 1.0).
+"""
+import json
+import os
+import subprocess
+import sys
+
+BUDGET = float(os.environ.get('WATSON_AUTH_BENCHMARK_IMPORT_BUDGET', 1.0))
+CHECK_LATENCY = bool(os.environ.get('WATSON_AUTH_BENCHMARK_CHECK_LATENCY'))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import {0}
+print(json.dumps([time.perf_counter() - started, sorted(sys.modules)]))
+'''
+
+
+def import_module(name, runs=3):
+    """Imports the module in a fresh interpreter.
+
+    Returns:
+        tuple: The fastest import time and the modules that were imported
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-W', 'ignore', '-c', SCRIPT.format(name)],
+            cwd=ROOT)
+        results.append(json.loads(output.decode('utf-8')))
+    duration, modules = min(results, key=lambda result: result[0])
+    return duration, set(modules)
+
+
+def check_budget(duration):
+    if CHECK_LATENCY:
+        assert duration < BUDGET
+
+
+class TestImportTime(object):
+
+    def test_providers(self):
+        duration, modules = import_module('watson.auth.providers')
+        check_budget(duration)
+        assert not modules & {
+            'jwt', 'bcrypt', 'watson.auth.providers.session',
+            'watson.auth.providers.jwt', 'watson.auth.providers.basic',
+            'watson.auth.providers.api_key'}
+
+    def test_session_provider(self):
+        duration, modules = import_module('watson.auth.providers.session')
+        check_budget(duration)
+        assert not modules & {'jwt', 'bcrypt', 'watson.auth.providers.jwt'}
+
+    def test_jwt_provider(self):
+        duration, modules = import_module('watson.auth.providers.jwt')
+        check_budget(duration)
+        assert 'jwt' in modules
+        assert 'watson.auth.providers.session' not in modules
+
+    def test_listeners(self):
+        duration, modules = import_module('watson.auth.listeners')
+        check_budget(duration)
+        assert not modules & {
+            'jwt', 'bcrypt', 'watson.auth.commands', 'watson.auth.metrics'}
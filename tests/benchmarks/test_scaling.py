@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Measures how lookups, ACL compilation and exports scale with the size of
+the dataset.
+
+The scales (numbers of users) default to 1000 and 4000, and can be set via
+WATSON_AUTH_BENCHMARK_SCALES (e.g. 1000,100000,1000000).
+"""
+import os
+from watson.auth import authorization, dataset, exporter
+from watson.auth.providers import Session
+from tests.benchmarks.support import Suite
+from tests.watson.auth import support
+
+SCALES = [int(scale) for scale in os.environ.get(
+    'WATSON_AUTH_BENCHMARK_SCALES', '1000,4000').split(',')]
+
+suite = None
+sessions = {}
+
+
+def setup_module(module):
+    module.suite = Suite()
+    for scale in SCALES:
+        session = support.create_session()
+        dataset.Generator(
+            session, support.TestUser, users=scale,
+            permissions=max(100, scale // 100), roles=max(10, scale // 2000),
+            permissions_per_role=50, roles_per_user=3,
+            overrides_per_user=2, skew=1.2).run()
+        sessions[scale] = session
+
+
+def teardown_module(module):
+    module.suite.write()
+    for session in sessions.values():
+        session.close()
+    sessions.clear()
+
+
+def run(name, benchmark, iterations=100, expire=False):
+    """Runs the benchmark created by benchmark(session, scale) at each scale.
+    """
+    results = {}
+    for scale, session in sessions.items():
+        results[scale] = suite.run(
+            '{}[{}]'.format(name, scale), benchmark(session, scale),
+            iterations, setup=session.expire_all if expire else None)
+    return results
+
+
+class TestScaling(object):
+
+    def test_get_user(self):
+        def get_user(session, scale):
+            provider = Session(support.default_provider_settings, session)
+            identifier = 'synthetic.user{}'.format(scale - 1)
+            return lambda: provider.get_user(identifier)
+        results = run('scaling.get_user', get_user)
+        assert {result['queries'] for result in results.values()} == {1}
+
+    def test_generate_user_permissions(self):
+        def generate(session, scale):
+            user = session.query(support.TestUser).filter_by(
+                username='synthetic.user{}'.format(scale // 2)).one()
+            return authorization.Acl(user)._generate_user_permissions
+        results = run(
+            'scaling.Acl._generate_user_permissions', generate, iterations=20,
+            expire=True)
+        assert {result['queries'] for result in results.values()} == {2}
+
+    def test_export(self):
+        def export(session, scale):
+            exporter_ = exporter.Exporter(
+                session, support.TestUser, 'username')
+            return lambda: sum(1 for _ in exporter_.records())
+        results = run('scaling.export', export, iterations=1)
+        for scale, result in results.items():
+            batches = -(-scale // 1000)
+            pages = scale // 1000 + 1
+            assert result['queries'] == 2 + pages + 2 * batches
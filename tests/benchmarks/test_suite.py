@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+from pytest import raises
+from tests.benchmarks.support import Suite
+from tests.watson.auth import support
+
+
+def query():
+    support.session.execute('SELECT 1')
+
+
+class TestSuite(object):
+
+    def _suite(self, tmpdir, benchmarks, check_latency=None, **thresholds):
+        path = str(tmpdir.join('baselines.json'))
+        with open(path, 'w') as file:
+            json.dump({
+                'thresholds': dict({'latency': 1.5, 'queries': 0}, **thresholds),
+                'benchmarks': benchmarks}, file)
+        return Suite(
+            support.engine, path, save=False, check_latency=check_latency)
+
+    def test_counts_queries(self, tmpdir):
+        suite = self._suite(tmpdir, {})
+        result = suite.run('query', query, iterations=5)
+        assert result['queries'] == 1
+        assert result['iterations'] == 5
+
+    def test_query_regression(self, tmpdir):
+        suite = self._suite(
+            tmpdir, {'query': {'queries': 0, 'p50_ms': 1000}})
+        with raises(AssertionError):
+            suite.run('query', query, iterations=5)
+        suite = self._suite(
+            tmpdir, {'query': {'queries': 0, 'p50_ms': 1000}}, queries=1)
+        suite.run('query', query, iterations=5)
+
+    def test_latency_regression(self, tmpdir):
+        suite = self._suite(
+            tmpdir, {'query': {'queries': 1, 'p50_ms': 0.000001}},
+            check_latency=True)
+        with raises(AssertionError):
+            suite.run('query', query, iterations=5)
+
+    def test_latency_not_checked_by_default(self, tmpdir, monkeypatch):
+        monkeypatch.delenv('WATSON_AUTH_BENCHMARK_CHECK_LATENCY', False)
+        suite = self._suite(
+            tmpdir, {'query': {'queries': 1, 'p50_ms': 0.000001}})
+        assert not suite.check_latency
+        suite.run('query', query, iterations=5)
+
+    def test_save(self, tmpdir):
+        suite = self._suite(tmpdir, {'other': {'queries': 0, 'p50_ms': 1}})
+        suite.save = True
+        suite.run('query', query, iterations=5)
+        suite.write()
+        with open(suite.path) as file:
+            data = json.load(file)
+        assert set(data['benchmarks']) == {'other', 'query'}
+        assert data['benchmarks']['query']['queries'] == 1
+        assert data['thresholds'] == {'latency': 1.5, 'queries': 0}
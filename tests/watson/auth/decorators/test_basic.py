@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from watson.auth.providers.basic.decorators import auth
+from watson.events import types
+from watson.framework import controllers
+from tests.watson.auth import support
+
+
+class SampleController(controllers.Rest):
+
+    @auth(roles='admin')
+    def GET(self):
+        return 'get'
+
+
+class TestAuth(object):
+    def setup(self):
+        controller = SampleController()
+        controller.container = support.app.container
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        request.user = None
+        controller.event = types.Event('test', params={
+            'context': {
+                'request': request
+            }
+        })
+        self.controller = controller
+
+    def test_unauthenticated(self):
+        response = self.controller.GET()
+        assert response.status_code == 401
+        assert response.headers['WWW-Authenticate'].startswith('Basic')
+
+    def test_unauthorized(self):
+        self.controller.request.user = support.regular_user
+        response = self.controller.GET()
+        assert response.status_code == 403
+
+    def test_overridden_is_authorized(self, monkeypatch):
+        provider = support.app.container.get('watson.auth.providers.Basic')
+        monkeypatch.setattr(
+            type(provider), 'is_authorized', lambda *args: False)
+        self.controller.request.user = support.admin_user
+        response = self.controller.GET()
+        assert response.status_code == 403
+
+    def test_authorized(self):
+        self.controller.request.user = support.admin_user
+        assert self.controller.GET() == 'get'
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import asyncio
 from io import BytesIO, BufferedReader
 from pytest import raises
 from watson.auth.providers.session.decorators import auth, login, logout, forgotten, reset
@@ -7,16 +8,32 @@ from watson.framework import controllers, exceptions
 from tests.watson.auth import support
 
 
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
 class SampleController(controllers.Action):
 
     @auth(login_redirect='login')
     def index_action(self):
         return 'index'
 
+    @auth(permissions='posts.edit', resource=('post', 'id'))
+    def edit_action(self, id):
+        return 'edit'
+
+    @auth(login_redirect='login')
+    async def async_index_action(self):
+        return 'async index'
+
     @login
     def login_action(self, form):
         return 'login'
 
+    @login
+    async def async_login_action(self, form):
+        return 'async login'
+
     @logout
     def logout_action(self):
         return 'logout'
@@ -84,6 +101,25 @@ class TestLogin(BaseDecoratorCase):
         response = self.controller.login_action()
         assert response.headers['location'] == '/'
 
+    def test_valid_user_remembered(self):
+        post_data = 'username=admin&password=test&remember=1'
+        environ = support.sample_environ(
+            REQUEST_METHOD='POST',
+            CONTENT_LENGTH=len(post_data))
+        environ['wsgi.input'] = BufferedReader(
+            BytesIO(post_data.encode('utf-8')))
+        self.controller.request = self._generate_request(**environ)
+        provider = self.controller.container.get(
+            'watson.auth.providers.Session')
+        provider.config['remember']['enabled'] = True
+        try:
+            self.controller.login_action()
+        finally:
+            provider.config['remember']['enabled'] = False
+        cookies = provider.response_cookies(self.controller.request)
+        assert cookies['watson.auth.remember'].value
+        provider.revoke_remember_tokens(support.admin_user)
+
     def test_already_authenticated_user(self):
         self.controller.request.user = support.regular_user
         response = self.controller.login_action()
@@ -102,6 +138,21 @@ class TestLogin(BaseDecoratorCase):
         response = self.controller.login_action()
         assert response.headers['location'].endswith('/existing-url?to-here&and-here')
 
+    def test_async_valid_user(self):
+        post_data = 'username=admin&password=test'
+        environ = support.sample_environ(
+            REQUEST_METHOD='POST',
+            CONTENT_LENGTH=len(post_data))
+        environ['wsgi.input'] = BufferedReader(
+            BytesIO(post_data.encode('utf-8')))
+        self.controller.request = self._generate_request(**environ)
+        response = run(self.controller.async_login_action())
+        assert response.headers['location'] == '/'
+        assert self.controller.request.user == support.admin_user
+
+    def test_async_no_post(self):
+        assert run(self.controller.async_login_action()) == 'async login'
+
 
 class TestLogout(BaseDecoratorCase):
     def setup(self):
@@ -130,6 +181,23 @@ class TestAuth(BaseDecoratorCase):
         response = self.controller.index_action()
         assert response.headers['location'].startswith('/login')
 
+    def test_async_unauthenticated(self):
+        response = run(self.controller.async_index_action())
+        assert response.headers['location'].startswith('/login')
+
+    def test_async_authenticated(self):
+        self.controller.request.user = support.regular_user
+        assert run(self.controller.async_index_action()) == 'async index'
+
+    def test_authorized_resource(self):
+        self.controller.request.user = support.editor_user
+        assert self.controller.edit_action(id=1) == 'edit'
+
+    def test_unauthorized_resource(self):
+        self.controller.request.user = support.editor_user
+        with raises(exceptions.ApplicationError):
+            self.controller.edit_action(id=2)
+
     # def test_authenticated(self):
     #     self.controller.request.session['watson.user'] = 'regular'
     #     response = self.controller.index_action()
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import contextlib
+from concurrent import futures
 from wsgiref import util
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, create_engine, event
+from sqlalchemy.orm import sessionmaker
 from watson.framework import applications, events, controllers
 from watson.http.messages import Request
 from watson.auth.providers.session.decorators import login as session_login
@@ -19,6 +22,16 @@ def sample_environ(**kwargs):
     return environ
 
 
+class InlineExecutor(futures.Executor):
+    """Executes submitted calls immediately, as in-memory sqlite databases
+    cannot be shared between threads.
+    """
+    def submit(self, fn, *args, **kwargs):
+        future = futures.Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
 app_config = {
     'debug': {
         'enabled': True
@@ -39,6 +52,11 @@ app_config = {
             'reset_password_route': 'auth/reset-password',
             'forgotten_password_route': 'auth/forgotten-password'
         },
+        'providers': {
+            'watson.auth.providers.Session': {},
+            'watson.auth.providers.Basic': {},
+            'watson.auth.providers.JWT': {'secret': 'APP_SECRET'},
+        },
     },
     'routes': {
         'home': {
@@ -68,6 +86,15 @@ app_config = {
             ('watson.auth.listeners.Init', 1)
         ],
     },
+    'dependencies': {
+        'definitions': {
+            'watson.auth.providers.Session': {
+                'property': {
+                    'executor': InlineExecutor()
+                }
+            }
+        }
+    },
     'mail': {
         'backend': {
             'class': 'tests.watson.auth.support.MockMailBackend'
@@ -131,6 +158,35 @@ models.Model.metadata.create_all(engine)
 
 session = app.container.get('sqlalchemy_session_default')
 
+
+def create_session():
+    """Creates a session for a separate, empty in-memory database so that
+    large generated datasets do not affect the shared fixtures.
+    """
+    engine = create_engine('sqlite://')
+    models.Model.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+@contextlib.contextmanager
+def count_queries(bind=engine):
+    """Records the statements executed against the engine.
+
+    Yields:
+        list: Each statement that has been executed
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(bind, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, 'before_cursor_execute', before_cursor_execute)
+
+
 # Add some roles
 role_guest = models.Role(name='Guest', key='guest')
 role_regular = models.Role(name='Regular', key='regular')
@@ -146,6 +202,13 @@ permission_read = models.Permission(name='Read', key='read')
 session.add(permission_create)
 session.add(permission_delete)
 session.add(permission_read)
+permission_posts = models.Permission(name='Posts', key='posts.*')
+permission_posts_delete = models.Permission(
+    name='Delete Posts', key='posts.delete')
+session.add(permission_posts)
+session.add(permission_posts_delete)
+permission_posts_edit = models.Permission(name='Edit Posts', key='posts.edit')
+session.add(permission_posts_edit)
 
 # Add the permissions to the roles
 role_admin.add_permission(permission_create)
@@ -158,6 +221,10 @@ role_regular.add_permission(permission_delete)
 
 role_guest.add_permission(permission_read)
 
+role_editor = models.Role(name='Editor', key='editor')
+role_editor.add_permission(permission_posts)
+session.add(role_editor)
+
 
 # Add a sample user
 guest_user = TestUser(username='test', password='test')
@@ -178,4 +245,12 @@ complex_user.roles.append(role_guest)
 complex_user.roles.append(role_admin)
 complex_user.add_permission(permission_delete, 0)
 
+# Add a user with wildcard permissions
+editor_user = TestUser(username='editor', password='test')
+editor_user.roles.append(role_editor)
+editor_user.add_permission(permission_posts_delete, 0)
+editor_user.add_resource_permission(permission_posts_edit, 'post', 2, 0)
+editor_user.add_resource_permission(permission_posts_delete, 'post', 3)
+session.add(editor_user)
+
 session.commit()
@@ -8,6 +8,14 @@ class TestAcl(object):
         acl = authorization.Acl(support.regular_user)
         assert acl.user is support.regular_user
 
+    def test_generated_from_unloaded_grants(self):
+        user = support.complex_user
+        loaded = authorization.Acl(user).permissions
+        support.session.expire(user)
+        with support.count_queries() as queries:
+            assert authorization.Acl(user).permissions == loaded
+        assert len(queries) == 2
+
     def test_user_has_roles(self):
         acl = authorization.Acl(support.regular_user)
         assert acl.has_role('regular') is True
@@ -53,3 +61,114 @@ class TestAcl(object):
         assert not acl.has_permission('delete')
         assert acl.has_role('guest')
         assert acl.has_role('admin')
+
+    def test_user_wildcard_permission(self):
+        acl = authorization.Acl(support.editor_user)
+        acl.allow_default = False
+        assert acl.has_permission('posts.create')
+        assert acl.has_permission('posts.comments.edit')
+        assert not acl.has_permission('posts')
+        assert not acl.has_permission('pages.create')
+
+    def test_user_explicit_deny_overrides_wildcard(self):
+        acl = authorization.Acl(support.editor_user)
+        assert not acl.has_permission('posts.delete')
+
+    def test_resource_permission_falls_back_to_permission(self):
+        acl = authorization.Acl(support.editor_user)
+        assert acl.has_resource_permission('posts.edit', 'post', 1)
+        assert not acl.has_resource_permission('posts.delete', 'post', 1)
+
+    def test_resource_permission_overrides_permission(self):
+        acl = authorization.Acl(support.editor_user)
+        assert not acl.has_resource_permission('posts.edit', 'post', 2)
+        assert acl.has_resource_permission('posts.delete', 'post', '3')
+
+    def test_load_resource_permissions(self):
+        acl = authorization.Acl(support.editor_user)
+        acl.resources.load('post', [1, 2, 3])
+        assert len(acl.resources._trees) == 3
+        assert acl.resources.match('posts.edit', 'post', 2) is False
+        acl.resources.clear()
+        assert not acl.resources._trees
+
+    def test_resolve_resource(self):
+        assert authorization.resolve_resource(None, {'id': 1}) is None
+        assert authorization.resolve_resource(
+            ('post', 'id'), {'id': 1}) == ('post', 1)
+        assert authorization.resolve_resource(('post', 'id'), {}) is None
+
+
+class TestPermissionTree(object):
+
+    def test_exact_match(self):
+        tree = authorization.PermissionTree({'posts.create': 1})
+        assert tree.match('posts.create') is True
+        assert tree.match('posts.edit') is None
+
+    def test_wildcard_segment(self):
+        tree = authorization.PermissionTree({'*.read': 1})
+        assert tree.match('posts.read') is True
+        assert tree.match('posts.comments.read') is None
+
+    def test_trailing_wildcard(self):
+        tree = authorization.PermissionTree({'posts.*': 1})
+        assert tree.match('posts.create') is True
+        assert tree.match('posts.comments.create') is True
+        assert tree.match('pages.create') is None
+
+    def test_deny_takes_precedence(self):
+        tree = authorization.PermissionTree({'posts.*': 1, '*.delete': 0})
+        assert tree.match('posts.create') is True
+        assert tree.match('posts.delete') is False
+        tree.add('posts.create', 0)
+        tree.add('posts.create', 1)
+        assert tree.match('posts.create') is False
+
+
+class TestPolicy(object):
+
+    def test_empty_policy(self):
+        policy = authorization.Policy()
+        assert policy(support.regular_user)
+
+    def test_normalizes_keys(self):
+        policy = authorization.Policy(roles='admin', permissions=['read'])
+        assert policy.roles == frozenset(('admin',))
+        assert policy.permissions == frozenset(('read',))
+
+    def test_roles(self):
+        policy = authorization.Policy(roles=('admin', 'regular'))
+        assert policy(support.regular_user)
+        assert not policy(support.guest_user)
+
+    def test_permissions(self):
+        policy = authorization.Policy(permissions=('read', 'delete'))
+        assert policy(support.admin_user)
+        assert not policy(support.complex_user)
+
+    def test_resource_permissions(self):
+        policy = authorization.Policy(
+            permissions='posts.edit', resource=('post', 'id'))
+        assert policy(support.editor_user, {'id': 1})
+        assert not policy(support.editor_user, {'id': 2})
+
+    def test_resource_permissions_without_param(self):
+        policy = authorization.Policy(
+            permissions='posts.edit', resource=('post', 'id'))
+        assert support.editor_user.acl.has_permission('posts.edit')
+        assert not policy(support.editor_user, {})
+        assert not policy(support.editor_user, {'post_id': 1})
+        assert not policy(support.editor_user)
+
+    def test_short_circuits(self):
+        calls = []
+
+        def require(user):
+            calls.append(user)
+            return True
+        policy = authorization.Policy(roles='admin', requires=[require])
+        assert not policy(support.regular_user)
+        assert not calls
+        assert policy(support.admin_user)
+        assert calls == [support.admin_user]
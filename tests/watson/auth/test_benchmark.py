@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from watson.auth import benchmark
+from watson.auth.providers import JWT, Session
+from tests.watson.auth import support
+
+
+def assert_measured(result, iterations):
+    assert result['iterations'] == iterations
+    assert result['p50_ms'] <= result['p99_ms']
+    assert result['ops_per_sec'] > 0
+
+
+class TestMeasure(object):
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        assert benchmark.percentile(samples, 50) == 51
+        assert benchmark.percentile(samples, 99) == 99
+        assert benchmark.percentile(samples, 100) == 100
+        assert benchmark.percentile([], 50) == 0.0
+
+    def test_measure(self):
+        calls = []
+        setups = []
+        result = benchmark.measure(
+            lambda: calls.append(1), 10, warmup=2,
+            setup=lambda: setups.append(1))
+        assert len(calls) == 12
+        assert len(setups) == 12
+        assert_measured(result, 10)
+
+
+class TestBenchmarks(object):
+
+    def test_crypto(self):
+        results = benchmark.crypto_benchmarks((4,), 2)
+        assert set(results) == {'generate_password[4]', 'check_password[4]'}
+        assert_measured(results['check_password[4]'], 2)
+
+    def test_synthetic_user(self):
+        user = benchmark.SyntheticUser(roles=2, permissions_per_role=10)
+        assert user.acl.has_role('role1')
+        assert user.acl.has_permission('resource0.action5') in (True, False)
+        assert len(user.keys) == 20
+
+    def test_acl(self):
+        results = benchmark.acl_benchmarks(((2, 10),), 20)
+        assert_measured(results['snapshot_acl.generate[2x10]'], 2)
+        assert_measured(results['snapshot_acl.has_permission[2x10]'], 20)
+
+    def test_user_acl(self):
+        results = benchmark.user_acl_benchmarks(support.complex_user, 2)
+        assert_measured(results['acl.generate'], 2)
+        assert support.complex_user.acl.has_permission('create')
+
+    def test_authenticate(self):
+        provider = Session(
+            support.default_provider_settings, support.session,
+            executor=support.InlineExecutor())
+        results = benchmark.authenticate_benchmarks(
+            provider, 'admin', 'test', 2)
+        assert_measured(results['session.authenticate'], 2)
+
+
+class TestHandleRequestBenchmarks(object):
+
+    def _benchmark(self, provider_class):
+        provider = provider_class(
+            support.default_provider_settings, support.session,
+            executor=support.InlineExecutor())
+        request = benchmark.authenticated_request(
+            provider, support.admin_user, support.Request,
+            support.sample_environ())
+        provider.handle_request(request)
+        assert request.user.id == support.admin_user.id
+        return benchmark.handle_request_benchmarks(provider, request, 5)
+
+    def test_session(self):
+        results = self._benchmark(Session)
+        assert_measured(results['session.handle_request'], 5)
+
+    def test_jwt(self):
+        results = self._benchmark(JWT)
+        assert_measured(results['jwt.handle_request'], 5)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+from watson.auth import crypto, dataset, models
+from tests.watson.auth import support
+
+
+class TestGenerator(object):
+
+    def setup(self):
+        self.session = support.create_session()
+        self.generator = dataset.Generator(
+            self.session, support.TestUser, users=50, permissions=30,
+            roles=5, permissions_per_role=10, roles_per_user=2,
+            overrides_per_user=2, skew=2.0, batch_size=16)
+
+    def test_run(self):
+        progress = []
+        counts = self.generator.run(
+            lambda table, count: progress.append((table, count)))
+        session = self.session
+        assert counts['permissions'] == session.query(models.Permission).count() == 30
+        assert counts['roles'] == session.query(models.Role).count() == 5
+        assert counts['grants'] == session.query(models.RolesHasPermission).count() == 50
+        assert counts['users'] == session.query(support.TestUser).count() == 50
+        assert counts['memberships'] == session.query(models.UsersHasRole).count()
+        assert counts['overrides'] == session.query(models.UsersHasPermission).count() == 100
+        assert ('users', 16) in progress
+        assert models.AclVersion.current(session) == 1
+
+    def test_users(self):
+        self.generator.run()
+        user = self.session.query(support.TestUser).filter_by(
+            username='synthetic.user3').one()
+        assert crypto.check_password('password', user.password, user.salt)
+        assert 1 <= len(user.roles) <= 2
+        assert len(user.permissions) == 2
+        assert user.acl.has_role(user.roles[0].key)
+
+    def test_skewed_membership(self):
+        self.generator.run()
+        memberships = Counter(
+            role_id for role_id, in self.session.query(
+                models.UsersHasRole.role_id))
+        ranked = [count for _, count in memberships.most_common()]
+        assert memberships.most_common(1)[0][0] == 1
+        assert ranked[0] > ranked[-1]
+
+    def test_reproducible(self):
+        self.generator.run()
+        other = support.create_session()
+        dataset.Generator(
+            other, support.TestUser, users=50, permissions=30, roles=5,
+            permissions_per_role=10, overrides_per_user=2, skew=2.0).run()
+        grants = [tuple(row) for row in self.session.query(
+            models.RolesHasPermission.role_id,
+            models.RolesHasPermission.permission_id,
+            models.RolesHasPermission.value)]
+        assert grants == [tuple(row) for row in other.query(
+            models.RolesHasPermission.role_id,
+            models.RolesHasPermission.permission_id,
+            models.RolesHasPermission.value)]
+
+    def test_alongside_existing_data(self):
+        self.generator.run()
+        counts = dataset.Generator(
+            self.session, support.TestUser, users=5, permissions=5, roles=1,
+            prefix='other').run()
+        assert counts['users'] == 5
+        assert self.session.query(support.TestUser).count() == 55
+        role = self.session.query(models.Role).filter_by(key='other.role0').one()
+        assert role.id == 6
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import json
+from watson.auth import exporter
+from tests.watson.auth import support
+
+
+class TestExporter(object):
+
+    def setup(self):
+        self.exporter = exporter.Exporter(
+            support.session, support.TestUser, 'username', batch_size=2)
+
+    def _record(self, username):
+        for record in self.exporter.records():
+            if record['identifier'] == username:
+                return record
+
+    def test_records(self):
+        records = list(self.exporter.records())
+        assert len(records) == support.session.query(support.TestUser).count()
+        record = self._record('editor')
+        assert record['id'] == support.editor_user.id
+        assert record['roles'] == ['editor']
+        assert 'posts.*' in record['permissions']
+        assert record['denied'] == ['posts.delete']
+
+    def test_batches(self):
+        batches = list(self.exporter._users())
+        ids = [id_ for batch in batches for id_, _ in batch]
+        assert all(len(batch) == 2 for batch in batches[:-1])
+        assert ids == sorted(ids)
+        assert len(ids) == support.session.query(support.TestUser).count()
+
+    def test_inherited_permissions(self):
+        record = self._record('regular')
+        assert record['roles'] == ['regular']
+        assert 'read' in record['permissions']
+
+    def test_write_jsonl(self):
+        output = io.StringIO()
+        count = exporter.write_records(
+            [self._record('admin')], output, 'jsonl')
+        assert count == 1
+        assert json.loads(output.getvalue())['identifier'] == 'admin'
+
+    def test_write_csv(self):
+        output = io.StringIO()
+        exporter.write_records([self._record('editor')], output, 'csv')
+        header, row = output.getvalue().splitlines()
+        assert header == 'id,identifier,roles,permissions,denied'
+        assert row.endswith(',posts.delete')
+
+    def test_gzip_output(self, tmpdir):
+        path = str(tmpdir.join('users.jsonl.gz'))
+        with exporter.open_output(path) as output:
+            exporter.write_records(self.exporter.records(), output)
+        with gzip.open(path, 'rt') as file:
+            assert len(file.readlines()) == support.session.query(
+                support.TestUser).count()
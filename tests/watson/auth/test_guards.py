@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import copy
+from pytest import raises
+from watson.auth import guards
+from watson.auth.providers import Session
+from watson.auth.providers.session.decorators import auth
+from watson.auth.providers.basic.decorators import auth as basic_auth
+from watson.auth.providers.jwt.decorators import auth as jwt_auth
+from watson.events import types
+from watson.framework import applications, controllers, exceptions
+from watson.routing.routers import DictRouter
+from tests.watson.auth import support
+
+
+class PostController(controllers.Action):
+
+    @auth(permissions='posts.edit', resource=('post', 'id'))
+    def edit_action(self, id):
+        return 'edit'
+
+    @auth(login_redirect='login')
+    def index_action(self):
+        return 'index'
+
+    def public_action(self):
+        return 'public'
+
+
+class PostRestController(controllers.Rest):
+
+    @jwt_auth(roles='admin')
+    def GET(self):
+        return 'get'
+
+
+class ServiceController(controllers.Rest):
+    executed = 0
+
+    @basic_auth(roles='admin')
+    def GET(self):
+        ServiceController.executed += 1
+        return 'get'
+
+
+router = DictRouter({
+    'posts': {
+        'path': '/posts',
+        'options': {'controller': 'tests.watson.auth.test_guards.PostController'},
+    },
+    'post': {
+        'path': '/posts/:id',
+        'options': {'controller': 'tests.watson.auth.test_guards.PostController'},
+        'defaults': {'action': 'edit'}
+    },
+    'public': {
+        'path': '/public',
+        'options': {'controller': 'tests.watson.auth.test_guards.PostController'},
+        'defaults': {'action': 'public'}
+    },
+    'api': {
+        'path': '/api/posts',
+        'options': {'controller': 'tests.watson.auth.test_guards.PostRestController'},
+    },
+    'service': {
+        'path': '/service',
+        'options': {'controller': 'tests.watson.auth.test_guards.ServiceController'},
+    },
+    'missing': {
+        'path': '/missing',
+        'options': {'controller': 'tests.watson.auth.test_guards.Missing'},
+    },
+})
+
+
+def _match(path, user=None):
+    request = support.Request.from_environ(
+        support.sample_environ(PATH_INFO=path), 'watson.http.sessions.Memory')
+    request.user = user
+    return request, router.match(request)
+
+
+class TestRouteGuards(object):
+
+    def setup(self):
+        self.guards = guards.RouteGuards()
+        self.guards.build(router)
+        self.provider = Session(
+            support.default_provider_settings, support.session)
+
+    def test_build(self):
+        assert len(self.guards) == 5
+        assert 'missing' not in self.guards.routes
+
+    def test_match(self):
+        request, route_match = _match('/posts/1')
+        guard = self.guards.match(route_match, request)
+        assert guard is PostController.edit_action.__auth_guard__
+        request, route_match = _match('/public')
+        assert not self.guards.match(route_match, request)
+        request, route_match = _match('/api/posts')
+        assert self.guards.match(route_match, request).provider == 'watson.auth.providers.JWT'
+
+    def test_enforce_authorized(self):
+        request, route_match = _match('/posts/1', support.editor_user)
+        guard = self.guards.match(route_match, request)
+        assert self.guards.enforce(guard, self.provider, request, route_match)
+
+    def test_enforce_unauthorized(self):
+        request, route_match = _match('/posts/2', support.editor_user)
+        guard = self.guards.match(route_match, request)
+        with raises(exceptions.ApplicationError) as exc:
+            self.guards.enforce(guard, self.provider, request, route_match)
+        assert exc.value.status_code == '401'
+        assert str(exc.value) == 'You are not authorized to view this page.'
+
+    def test_enforce_unauthenticated(self):
+        request, route_match = _match('/posts/2')
+        guard = self.guards.match(route_match, request)
+        with raises(exceptions.ApplicationError) as exc:
+            self.guards.enforce(guard, self.provider, request, route_match)
+        assert exc.value.status_code == '403'
+        assert str(exc.value) == 'You must be logged in to view this page.'
+
+    def test_enforce_jwt(self):
+        provider = support.app.container.get('watson.auth.providers.JWT')
+        for user, status_code in ((None, '403'), (support.regular_user, '401')):
+            request, route_match = _match('/api/posts', user)
+            guard = self.guards.match(route_match, request)
+            with raises(exceptions.ApplicationError) as exc:
+                self.guards.enforce(guard, provider, request, route_match)
+            assert exc.value.status_code == status_code
+            assert guards.CHALLENGE_ENVIRON_KEY not in request.environ
+
+    def test_response_without_guard(self):
+        controller = PostRestController()
+        controller.container = support.app.container
+        for user, status_code in ((None, 403), (support.regular_user, 401)):
+            request, route_match = _match('/api/posts', user)
+            controller.event = types.Event('test', params={
+                'context': {'request': request}})
+            response = controller.GET()
+            assert response.status_code == status_code
+
+    def test_unauthenticated_redirect_deferred_to_decorator(self):
+        request, route_match = _match('/posts')
+        guard = self.guards.match(route_match, request)
+        assert not self.guards.enforce(
+            guard, self.provider, request, route_match)
+
+    def test_enforce_challenge(self):
+        request, route_match = _match('/service')
+        guard = self.guards.match(route_match, request)
+        provider = support.app.container.get('watson.auth.providers.Basic')
+        with raises(exceptions.ApplicationError) as exc:
+            self.guards.enforce(guard, provider, request, route_match)
+        assert exc.value.status_code == '401'
+        assert request.environ[guards.CHALLENGE_ENVIRON_KEY].startswith(
+            'Basic realm=')
+
+    def test_challenge_without_guard(self):
+        request, _ = _match('/service')
+        controller = ServiceController()
+        controller.container = support.app.container
+        controller.event = types.Event('test', params={
+            'context': {'request': request}})
+        response = controller.GET()
+        assert response.status_code == 401
+        assert response.headers['WWW-Authenticate'].startswith('Basic realm=')
+
+    def test_lazy_provider(self):
+        class Container(object):
+            def __init__(self):
+                self.retrieved = []
+
+            def get(self, name):
+                self.retrieved.append(name)
+                return object()
+        get_provider = guards.LazyProvider('watson.auth.providers.Session')
+        controller = PostController()
+        controller.container = Container()
+        provider = get_provider(controller)
+        assert get_provider(controller) is provider
+        assert controller.container.retrieved == [
+            'watson.auth.providers.Session']
+        controller.container = Container()
+        assert get_provider(controller) is not provider
+
+    def test_is_enforced(self):
+        guard = PostController.edit_action.__auth_guard__
+        controller = PostController()
+        assert not guards.is_enforced(controller, guard)
+        controller.event = types.Event('test', params={
+            'context': {guards.CONTEXT_KEY: guard}})
+        assert guards.is_enforced(controller, guard)
+        assert controller.edit_action(id=2) == 'edit'
+
+
+class TestApplication(object):
+
+    def test_rejected_before_dispatch(self):
+        app_config = copy.deepcopy(support.app_config)
+        app_config['routes']['service'] = {
+            'path': '/service',
+            'options': {
+                'controller': 'tests.watson.auth.test_guards.ServiceController'
+            },
+        }
+        app = applications.Http(app_config)
+        executed = ServiceController.executed
+        responses = []
+        environ = support.sample_environ(
+            PATH_INFO='/service', HTTP_ACCEPT='application/json')
+        app(environ,
+            lambda status, headers: responses.append((status, headers)))
+        status, headers = responses[0]
+        assert status.startswith('401')
+        headers = {name.lower(): value for name, value in headers}
+        assert headers['www-authenticate'].startswith('Basic realm=')
+        assert ServiceController.executed == executed
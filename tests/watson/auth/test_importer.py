@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import datetime
+import io
+from pytest import raises
+from watson.auth import crypto, importer
+from tests.watson.auth import support
+
+
+class TestReadRecords(object):
+
+    def test_csv(self):
+        file = io.StringIO('username,password\nimported,secret\n')
+        records = list(importer.read_records(file, 'csv'))
+        assert records == [{'username': 'imported', 'password': 'secret'}]
+
+    def test_jsonl(self):
+        file = io.StringIO('{"username": "imported"}\n\n{"username": "other"}\n')
+        records = list(importer.read_records(file))
+        assert [record['username'] for record in records] == ['imported', 'other']
+
+
+class TestHashRecord(object):
+
+    def test_plain_password(self):
+        record = importer.hash_record(
+            {'username': 'imported', 'password': 'secret'}, rounds=4)
+        assert 'password' not in record
+        assert crypto.check_password(
+            'secret', record['password_hash'], record['salt'])
+
+    def test_existing_hash(self):
+        password_hash, salt = crypto.generate_password('secret', 4)
+        record = importer.hash_record(
+            {'username': 'imported', 'password_hash': password_hash})
+        assert record['password_hash'] == password_hash
+        assert record['salt'] == salt
+
+    def test_missing_password(self):
+        assert importer.validate_record({'username': 'imported'})
+        with raises(ValueError):
+            importer.hash_record({'username': 'imported'})
+
+
+class TestConvertRecord(object):
+
+    def test_convert(self):
+        converters = importer.column_converters(support.TestUser)
+        assert 'username' not in converters
+        record = importer.convert_record(
+            {'username': 'imported', 'id': '5',
+             'created_date': '2020-01-02T03:04:05', 'updated_date': ''},
+            converters)
+        assert record == {
+            'username': 'imported', 'id': 5,
+            'created_date': datetime.datetime(2020, 1, 2, 3, 4, 5),
+            'updated_date': None}
+
+    def test_invalid(self):
+        converters = importer.column_converters(support.TestUser)
+        with raises(ValueError):
+            importer.convert_record({'created_date': 'yesterday'}, converters)
+
+
+class TestImporter(object):
+
+    def _records(self, prefix, count):
+        return ({'username': '{}{}'.format(prefix, i), 'password': 'test',
+                 'email': '{}{}@test.com'.format(prefix, i)}
+                for i in range(count))
+
+    def test_run(self):
+        progress = []
+        importer_ = importer.Importer(
+            support.session, support.TestUser, batch_size=2, processes=0,
+            rounds=4)
+        imported = importer_.run(
+            self._records('import', 5),
+            lambda imported, elapsed: progress.append(imported))
+        assert imported == 5
+        assert progress == [2, 4, 5]
+        user = support.session.query(support.TestUser).filter_by(
+            username='import4').one()
+        assert user.email == 'import4@test.com'
+        assert crypto.check_password('test', user.password, user.salt)
+
+    def test_skips_invalid(self):
+        invalid = []
+        records = list(self._records('invalid', 3))
+        del records[1]['password']
+        importer_ = importer.Importer(
+            support.session, support.TestUser, batch_size=2, processes=0,
+            rounds=4)
+        assert importer_.run(
+            records, invalid=lambda record, reason: invalid.append(
+                record['username'])) == 2
+        assert invalid == ['invalid1']
+
+    def test_reads_in_batches(self):
+        read = []
+
+        def records():
+            for record in self._records('window', 6):
+                read.append(record)
+                yield record
+
+        importer_ = importer.Importer(
+            support.session, support.TestUser, batch_size=2, processes=2,
+            rounds=4)
+        progress = []
+        importer_.run(records(), lambda imported, elapsed: progress.append(
+            (imported, len(read))))
+        # at most the current and next batch have been read
+        assert all(count <= imported + 4 for imported, count in progress)
+        assert progress[-1] == (6, 6)
+
+    def test_run_in_pool(self):
+        importer_ = importer.Importer(
+            support.session, support.TestUser, processes=2, rounds=4)
+        assert importer_.run(self._records('pooled', 3)) == 3
+        assert support.session.query(support.TestUser).filter(
+            support.TestUser.username.like('pooled%')).count() == 3
+
+    def test_converts_dates(self):
+        invalid = []
+        records = list(self._records('dated', 3))
+        records[0]['created_date'] = '2020-01-02 03:04:05'
+        records[1]['created_date'] = '02/01/2020'
+        importer_ = importer.Importer(
+            support.session, support.TestUser, batch_size=3, processes=0,
+            rounds=4)
+        assert importer_.run(
+            records, invalid=lambda record, reason: invalid.append(
+                (record['username'], reason))) == 2
+        assert invalid == [
+            ('dated1', "Invalid value for created_date: '02/01/2020'")]
+        user = support.session.query(support.TestUser).filter_by(
+            username='dated0').one()
+        assert user.created_date == datetime.datetime(2020, 1, 2, 3, 4, 5)
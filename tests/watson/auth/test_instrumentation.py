@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import functools
+from watson.events import types
+from watson.events.dispatcher import EventDispatcher
+from watson.auth import authorization, instrumentation
+from watson.auth.providers import Basic, JWT, Session
+from watson.common.datastructures import dict_deep_update
+from tests.watson.auth import support
+
+
+def create_provider(provider_class=Session, **settings):
+    return provider_class(
+        dict_deep_update(support.default_provider_settings, settings),
+        support.session,
+        executor=support.InlineExecutor())
+
+
+class TestHooks(object):
+
+    def test_add_remove(self):
+        hooks = instrumentation.Hooks()
+        events = []
+        hooks.add('test', events.append)
+        assert 'test' in hooks
+        assert 'other' not in hooks
+        hooks.trigger(instrumentation.Instrumentation(hooks=hooks).emit(
+            'test', None, {}))
+        assert len(events) == 2
+        hooks.remove('test', events.append)
+        assert 'test' not in hooks
+        hooks.add('test', events.append)
+        hooks.remove('test')
+        assert 'test' not in hooks
+
+
+class TestInstrumentation(object):
+
+    def setup(self):
+        self.events = []
+        for name in instrumentation.EVENTS:
+            instrumentation.hooks.add(name, self.events.append)
+
+    def teardown(self):
+        for name in instrumentation.EVENTS:
+            instrumentation.hooks.remove(name)
+
+    def _events(self, name):
+        return [event for event in self.events if event.name == name]
+
+    def test_not_listening(self):
+        self.teardown()
+        create_provider().get_user('admin')
+        assert not self.events
+
+    def test_get_user(self):
+        provider = create_provider()
+        provider.get_user('admin')
+        event, = self._events(instrumentation.GET_USER)
+        assert event.target is provider
+        assert event.params['queries'] == 1
+        assert event.params['duration'] > 0
+        assert event.params['cache_hit'] is None
+
+    def test_authenticate_includes_nested_queries(self):
+        create_provider().authenticate('admin', 'test')
+        event, = self._events(instrumentation.AUTHENTICATE)
+        assert event.params['queries'] == 1
+        assert event.params['cache_hit'] is False
+        assert event.params['authenticated'] is True
+        assert self._events(instrumentation.GET_USER)
+        check, = self._events(instrumentation.PASSWORD_CHECK)
+        assert check.params['nested'] is True
+
+    def test_basic_cache_hit(self):
+        provider = create_provider(Basic)
+        provider.authenticate('admin', 'test')
+        provider.authenticate('admin', 'test')
+        first, second = self._events(instrumentation.AUTHENTICATE)
+        assert first.params['cache_hit'] is False
+        assert second.params['cache_hit'] is True
+
+    def test_session_snapshot_cache_hit(self):
+        provider = create_provider(
+            snapshot={'enabled': True, 'revalidate_interval': 300})
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        provider.login(support.admin_user, request)
+        request.user = None
+        provider.handle_request(request)
+        event, = self._events(instrumentation.HANDLE_REQUEST)
+        assert event.params['cache_hit'] is True
+        assert event.params['queries'] == 0
+
+    def test_jwt_decode(self):
+        provider = create_provider(JWT)
+        token = provider.login(support.admin_user, support.request)
+        assert provider.decode_token(token.encode('utf-8'))
+        assert provider.decode_token(b'invalid') is None
+        valid, invalid = self._events(instrumentation.JWT_DECODE)
+        assert valid.params['valid'] is True
+        assert invalid.params['valid'] is False
+
+    def test_jwt_handle_request(self):
+        provider = create_provider(JWT)
+        token = provider.login(support.admin_user, support.request)
+        request = support.Request(support.sample_environ(
+            HTTP_AUTHORIZATION='Bearer {}'.format(token)))
+        provider.handle_request(request)
+        event, = self._events(instrumentation.HANDLE_REQUEST)
+        assert event.params['queries'] == 1
+        assert request.user.id == support.admin_user.id
+
+    def test_acl_generate(self):
+        support.session.expire_all()
+        acl = authorization.Acl(support.complex_user)
+        acl.has_permission('create')
+        acl.has_permission('delete')
+        event, = self._events(instrumentation.ACL_GENERATE)
+        assert event.target is acl
+        assert event.params['queries'] > 0
+        assert event.params['cache_hit'] is False
+
+    def test_dispatcher(self):
+        self.teardown()
+        dispatcher = EventDispatcher()
+        dispatcher.add(instrumentation.GET_USER, self.events.append)
+        provider = create_provider()
+        provider.instrumentation = instrumentation.Instrumentation(dispatcher)
+        provider.get_user('admin')
+        provider.authenticate('admin', 'test')
+        assert [event.name for event in self.events] == [
+            instrumentation.GET_USER, instrumentation.GET_USER]
+
+    def test_application_dispatcher(self):
+        provider = support.app.container.get('watson.auth.providers.Session')
+        assert provider.instrumentation.dispatcher is support.app.container.get(
+            'shared_event_dispatcher')
+
+    def test_route_listener(self):
+        refreshed = []
+        providers = [
+            support.app.container.get(name)
+            for name in support.app_config['auth']['providers']]
+        for provider in providers:
+            provider.refresh_acl = functools.partial(
+                lambda provider, user: refreshed.append(provider), provider)
+        listener = support.app.container.get('watson.auth.listeners.Route')
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        session_provider = support.app.container.get(
+            'watson.auth.providers.Session')
+        try:
+            session_provider.login(support.admin_user, request)
+            request.user = None
+            listener(types.Event(
+                'test', params={'context': {'request': request}}))
+        finally:
+            for provider in providers:
+                del provider.refresh_acl
+        assert refreshed == [session_provider]
+        assert providers[-1] is not session_provider
+        assert request.user.acl.instrumentation is \
+            session_provider.instrumentation
+
+    def test_annotate_without_timer(self):
+        instrumentation.annotate(cache_hit=True)
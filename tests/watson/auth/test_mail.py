@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from watson.auth import mail
+from watson.framework.mail import Mailer
+from watson.mail.backends import SMTP
+
+
+class Backend(object):
+    _smtp = None
+    _connected = False
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+        self.connections_closed = 0
+
+    def send(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise Exception('Mail server unavailable')
+        self.sent.append(message)
+
+    def quit(self):
+        self.connections_closed += 1
+
+
+class SMTPClient(object):
+    connections = []
+
+    def __init__(self, host, port, **kwargs):
+        self.sent = []
+        self.connections.append(self)
+
+    def login(self, username, password):
+        pass
+
+    def sendmail(self, from_addr, to_addrs, msg, **kwargs):
+        self.sent.append(msg)
+
+    def quit(self):
+        pass
+
+
+class SMTPBackend(SMTP):
+    smtp_class = SMTPClient
+
+
+def create_queue(backend, **kwargs):
+    kwargs.setdefault('backoff', 0)
+    return mail.Queue(Mailer(backend, None), **kwargs)
+
+
+def create_message(queue, subject='Test'):
+    return queue.mailer.create(
+        subject=subject, from_='test@test.com', to='user@test.com',
+        body='Test')
+
+
+class TestQueue(object):
+
+    def test_put(self):
+        backend = Backend()
+        queue = create_queue(backend)
+        message = create_message(queue)
+        queue.put(message)
+        assert queue.running
+        queue.join()
+        assert backend.sent == [message]
+        queue.stop()
+        assert not queue.running
+
+    def test_batches(self):
+        backend = Backend()
+        queue = create_queue(backend, batch_size=2)
+        messages = [create_message(queue, str(i)) for i in range(4)]
+        for message in messages:
+            queue._queue.put(message)
+        queue.start()
+        queue.join()
+        queue.stop()
+        assert backend.sent == messages
+        assert queue.backend.connections_closed == 2
+        assert backend.connections_closed == 0
+
+    def test_retries(self):
+        backend = Backend(failures=2)
+        queue = create_queue(backend, retries=2)
+        queue.put(create_message(queue))
+        queue.stop()
+        assert len(backend.sent) == 1
+
+    def test_retries_exhausted(self):
+        backend = Backend(failures=3)
+        queue = create_queue(backend, retries=2)
+        queue.put(create_message(queue))
+        queue.stop()
+        assert not backend.sent
+
+    def test_dropped_when_full(self):
+        backend = Backend()
+        queue = create_queue(backend, max_size=1)
+        queue.start = lambda: None  # prevent the queue from being consumed
+        assert queue.put(create_message(queue))
+        assert not queue.put(create_message(queue, 'Full'))
+        assert not backend.sent
+
+    def test_stop_when_full(self):
+        backend = Backend()
+        queue = create_queue(backend, max_size=2)
+        start = queue.start
+        queue.start = lambda: None
+        queue.put(create_message(queue, '1'))
+        queue.put(create_message(queue, '2'))
+        start()
+        queue.stop(timeout=5)
+        assert not queue.running
+        assert len(backend.sent) == 2
+
+    def test_own_backend(self):
+        backend = Backend()
+        backend._smtp = object()
+        backend._connected = True
+        queue = create_queue(backend)
+        assert queue.backend is not backend
+        assert queue.backend._smtp is None
+        assert queue.backend._connected is False
+        message = create_message(queue)
+        queue.put(message)
+        queue.stop()
+        assert message.backend is queue.backend
+
+    def test_stop_drains_queue(self):
+        backend = Backend()
+        queue = create_queue(backend)
+        for i in range(5):
+            queue.put(create_message(queue, str(i)))
+        queue.stop()
+        assert len(backend.sent) == 5
+
+    def test_smtp_reconnects_per_batch(self):
+        SMTPClient.connections = []
+        queue = create_queue(SMTPBackend(), batch_size=2, retries=0)
+        for i in range(4):
+            queue._queue.put(create_message(queue, str(i)))
+        queue.start()
+        queue.join()
+        queue.stop()
+        assert [len(client.sent) for client in SMTPClient.connections] == [2, 2]
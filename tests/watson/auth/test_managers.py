@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
-from watson.auth import managers
+import datetime
+from watson.auth import mail, managers, models, signing
 from watson.auth.providers import Session
+from watson.framework.mail import Mailer
+from tests.watson.auth import test_mail
 from tests.watson.auth import support
 
 
+class Renderer(object):
+    def render(self, template, data):
+        return template
+
+
 class TestForgottenPasswordTokenManager(object):
 
     provider = None
@@ -23,5 +31,67 @@ class TestForgottenPasswordTokenManager(object):
         token = self.manager.create_token(
             user, request=support.request)
         assert token.user == user
+        assert token.digest != token.token
         token = self.manager.get_token(token=token.token)
         assert token.user == user
+
+    def test_expired_token(self):
+        user = self.provider.get_user('test')
+        token = self.manager.create_token(user, request=support.request)
+        token.created_date = datetime.datetime.now() - datetime.timedelta(
+            seconds=self.provider.config['forgotten_password_token_ttl'] + 1)
+        support.session.commit()
+        assert not self.manager.get_token(token=token.token)
+        assert not self.manager.get_token(token=None)
+
+    def test_notify_user_via_queue(self):
+        backend = test_mail.Backend()
+        self.manager.mailer = Mailer(backend, Renderer())
+        self.manager.mail_queue = mail.Queue(self.manager.mailer)
+        user = self.provider.get_user('test')
+        self.manager.notify_user(
+            user, request=support.request, subject='Reset',
+            template='auth/emails/forgotten-password',
+            token=self.manager.create_token(user, request=support.request))
+        self.manager.mail_queue.stop()
+        assert backend.sent[0].subject == 'Reset'
+
+
+class TestSignedForgottenPasswordTokenManager(object):
+
+    def setup(self):
+        settings = dict(support.default_provider_settings)
+        settings['forgotten_password_token_signed'] = True
+        self.provider = Session(settings, support.session)
+        self.manager = managers.ForgottenPasswordToken(
+            mailer=support.app.container.get('mailer'),
+            email_address_field='email')
+        self.manager.provider = self.provider
+
+    def test_create_token(self):
+        user = self.provider.get_user('test')
+        count = support.session.query(models.ForgottenPasswordToken).count()
+        token = self.manager.create_token(user, request=support.request)
+        assert support.session.query(
+            models.ForgottenPasswordToken).count() == count
+        assert self.manager.get_token(token.token).user == user
+
+    def test_invalid_token(self):
+        user = self.provider.get_user('test')
+        token = self.manager.create_token(user, request=support.request)
+        assert not self.manager.get_token(token.token[:-1])
+        assert not self.manager.get_token(
+            signing.sign({'u': user.id}, 'APP_SECRET'))
+
+    def test_expired_token(self):
+        self.provider.config['forgotten_password_token_ttl'] = -1
+        user = self.provider.get_user('test')
+        token = self.manager.create_token(user, request=support.request)
+        assert not self.manager.get_token(token.token)
+
+    def test_invalidated_by_password_change(self):
+        user = self.provider.get_user('test')
+        token = self.manager.get_token(
+            self.manager.create_token(user, request=support.request).token)
+        self.manager.update_user_password(token, 'test')
+        assert not self.manager.get_token(token.token)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import copy
+import os
+import shutil
+import tempfile
+from watson.framework import applications
+from watson.auth import authorization, instrumentation, metrics
+from watson.auth.providers import Basic, JWT, Session
+from watson.common.datastructures import dict_deep_update
+from tests.watson.auth import support
+
+
+def create_provider(provider_class=Session, **settings):
+    return provider_class(
+        dict_deep_update(support.default_provider_settings, settings),
+        support.session,
+        executor=support.InlineExecutor())
+
+
+class TestRegistry(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_counter(self):
+        registry = metrics.Registry()
+        counter = registry.counter('test_total', 'A test.', ('result',))
+        counter.labels('success').inc()
+        counter.labels('success').inc(2)
+        counter.labels('fail"ure').inc()
+        assert registry.counter('test_total', 'A test.') is counter
+        assert registry.render() == '\n'.join([
+            '# HELP test_total A test.',
+            '# TYPE test_total counter',
+            'test_total{result="fail\\"ure"} 1.0',
+            'test_total{result="success"} 3.0',
+            ''])
+
+    def test_histogram(self):
+        registry = metrics.Registry()
+        histogram = registry.histogram(
+            'test_seconds', 'A test.', buckets=(0.5, 0.1))
+        histogram.observe(0.1)
+        histogram.observe(0.3)
+        histogram.observe(2)
+        assert registry.render() == '\n'.join([
+            '# HELP test_seconds A test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{le="0.1"} 1.0',
+            'test_seconds_bucket{le="0.5"} 2.0',
+            'test_seconds_bucket{le="+Inf"} 3.0',
+            'test_seconds_sum 2.4',
+            'test_seconds_count 3.0',
+            ''])
+
+    def test_invalid(self):
+        registry = metrics.Registry()
+        registry.counter('test', 'A test.', ('result',))
+        for func in (lambda: registry.histogram('test', 'A test.'),
+                     lambda: registry['test'].labels()):
+            try:
+                func()
+                assert False  # pragma: no cover
+            except ValueError:
+                assert True
+
+    def test_aggregates_processes(self):
+        other = metrics.Registry(self.directory)
+        other.counter('test_total', 'A test.').inc(2)
+        other.histogram('test_seconds', 'A test.').observe(0.2)
+        other.flush()
+        os.rename(
+            os.path.join(self.directory, '{0}.json'.format(os.getpid())),
+            os.path.join(self.directory, '1.json'))
+        with open(os.path.join(self.directory, '2.json'), 'w') as file:
+            file.write('{')
+        registry = metrics.Registry(self.directory, flush_interval=0)
+        registry.counter('test_total', 'A test.').inc()
+        registry.histogram('test_seconds', 'A test.').observe(0.2)
+        registry.maybe_flush()
+        assert sorted(os.listdir(self.directory)) == sorted([
+            '1.json', '2.json', '{0}.json'.format(os.getpid())])
+        rendered = registry.render()
+        assert 'test_total 3.0' in rendered
+        assert 'test_seconds_bucket{le="0.25"} 2.0' in rendered
+        assert 'test_seconds_count 2.0' in rendered
+
+    def test_wsgi_app(self):
+        registry = metrics.Registry()
+        registry.counter('test_total', 'A test.').inc()
+        responses = []
+        body = metrics.wsgi_app(registry)(
+            support.sample_environ(),
+            lambda status, headers: responses.append((status, headers)))
+        status, headers = responses[0]
+        assert status == '200 OK'
+        assert dict(headers)['Content-Type'] == metrics.CONTENT_TYPE
+        assert b'test_total 1.0' in body[0]
+
+
+class TestCollector(object):
+
+    def setup(self):
+        self.hooks = instrumentation.Hooks()
+        self.registry = metrics.Registry()
+        metrics.Collector(self.registry).listen(self.hooks)
+        self.instrumentation = instrumentation.Instrumentation(
+            hooks=self.hooks)
+
+    def _provider(self, provider_class=Session, **settings):
+        provider = create_provider(provider_class, **settings)
+        provider.instrumentation = self.instrumentation
+        return provider
+
+    def _value(self, name, *labels):
+        return self.registry[name].labels(*labels).get()
+
+    def test_login_attempts(self):
+        provider = self._provider()
+        name = 'watson.auth.providers.session.Provider'
+        provider.authenticate('admin', 'test')
+        provider.authenticate('admin', 'invalid')
+        provider.authenticate('missing', 'test')
+        attempts = 'watson_auth_login_attempts_total'
+        assert self._value(attempts, name, 'success') == 1
+        assert self._value(attempts, name, 'failure') == 2
+        counts, _ = self._value('watson_auth_password_check_seconds', name)
+        assert sum(counts) == 2
+
+    def test_cache_requests(self):
+        provider = self._provider(Basic)
+        provider.authenticate('admin', 'test')
+        provider.authenticate('admin', 'test')
+        cache = 'watson_auth_cache_requests_total'
+        assert self._value(cache, 'authenticate', 'hit') == 1
+        assert self._value(cache, 'authenticate', 'miss') == 1
+
+    def test_jwt_decode_failures(self):
+        provider = self._provider(JWT)
+        provider.decode_token(b'invalid')
+        assert self._value(
+            'watson_auth_jwt_decode_failures_total',
+            'watson.auth.providers.jwt.Provider') == 1
+
+    def test_handle_request(self):
+        provider = self._provider()
+        provider.handle_request(support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory'))
+        counts, _ = self._value(
+            'watson_auth_handle_request_seconds',
+            'watson.auth.providers.session.Provider')
+        assert sum(counts) == 1
+
+    def test_authorization_denials(self):
+        acl = authorization.Acl(support.regular_user)
+        acl.instrumentation = self.instrumentation
+        acl.has_role('admin')
+        acl.has_role('regular')
+        acl.has_permission('create')
+        denials = 'watson_auth_authorization_denials_total'
+        assert self._value(denials, 'role') == 1
+        assert self._value(denials, 'permission') == 1
+        assert self._value(
+            'watson_auth_cache_requests_total', 'acl.generate', 'miss') == 1
+
+
+class TestApplication(object):
+
+    def test_disabled(self):
+        assert 'auth_metrics' not in support.app.container.definitions
+
+    def test_route(self):
+        app_config = copy.deepcopy(support.app_config)
+        app_config['auth']['metrics'] = {'enabled': True, 'route': '/metrics'}
+        app = applications.Http(app_config)
+        registry = app.container.get('auth_metrics')
+        registry['watson_auth_login_attempts_total'].labels(
+            'watson.auth.providers.session.Provider', 'failure').inc()
+        assert app.dispatcher.events[instrumentation.AUTHENTICATE]
+        responses = []
+        body = app(
+            support.sample_environ(PATH_INFO='/metrics'),
+            lambda status, headers: responses.append((status, headers)))
+        status, headers = responses[0]
+        assert status.startswith('200')
+        assert dict(headers)['Content-Type'] == metrics.CONTENT_TYPE
+        assert b'watson_auth_login_attempts_total{' in b''.join(body)
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
+import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
 from tests.watson.auth import support
+from watson.auth import models
 
 
 class TestCreateUser(object):
@@ -18,3 +22,104 @@ class TestCreateUser(object):
     def test_user_has_acl(self):
         user = support.regular_user
         assert user.acl
+
+
+class TestAclVersion(object):
+    session = None
+
+    def setup(self):
+        self.session = support.app.container.get('sqlalchemy_session_default')
+
+    def test_incremented_on_acl_change(self):
+        version = models.AclVersion.current(self.session)
+        assert version
+        role = models.Role(name='Temporary', key='temporary')
+        self.session.add(role)
+        self.session.commit()
+        assert models.AclVersion.current(self.session) == version + 1
+        self.session.delete(role)
+        self.session.commit()
+        assert models.AclVersion.current(self.session) == version + 2
+
+    def test_incremented_on_user_role_change(self):
+        version = models.AclVersion.current(self.session)
+        user = support.guest_user
+        user.roles.append(support.role_regular)
+        self.session.commit()
+        assert models.AclVersion.current(self.session) == version + 1
+        user.roles.remove(support.role_regular)
+        self.session.commit()
+        assert models.AclVersion.current(self.session) == version + 2
+
+    def test_not_incremented_on_user_change(self):
+        version = models.AclVersion.current(self.session)
+        support.guest_user.touch()
+        self.session.commit()
+        assert models.AclVersion.current(self.session) == version
+
+
+class TestTrackAclVersion(object):
+
+    def setup(self):
+        self.session = support.create_session()
+
+    def teardown(self):
+        self.session.close()
+
+    def test_seeded(self):
+        assert self.session.query(models.AclVersion).one().version == 0
+
+    def test_untracked_session(self):
+        self.session.add(models.Role(name='Untracked', key='untracked'))
+        self.session.commit()
+        assert models.AclVersion.current(self.session) == 0
+
+    def test_tracked_session(self):
+        session_factory = sessionmaker(bind=self.session.bind)
+        models.track_acl_version(session_factory)
+        models.track_acl_version(session_factory)
+        session = session_factory()
+        session.add(models.Role(name='Tracked', key='tracked'))
+        session.commit()
+        assert models.AclVersion.current(session) == 1
+        session.close()
+
+    def test_increment_inserted_concurrently(self):
+        engine = self.session.bind
+        self.session.query(models.AclVersion).delete()
+        self.session.commit()
+
+        def insert(conn, cursor, statement, *args):
+            if statement.startswith('SAVEPOINT'):
+                cursor.execute(
+                    'INSERT INTO acl_versions (id, version) VALUES (1, 1)')
+        event.listen(engine, 'before_cursor_execute', insert)
+        try:
+            models.AclVersion.increment(self.session.connection())
+        finally:
+            event.remove(engine, 'before_cursor_execute', insert)
+        self.session.commit()
+        assert models.AclVersion.current(self.session) == 2
+
+
+class TestDeleteInBatches(object):
+
+    def test_delete(self):
+        user = support.session.query(support.TestUser).filter_by(
+            username='test').first()
+        expired = datetime.datetime.now() - datetime.timedelta(days=30)
+        for i in range(5):
+            user.forgotten_password_tokens.append(
+                models.ForgottenPasswordToken(
+                    digest='expired{}'.format(i), created_date=expired))
+        user.forgotten_password_tokens.append(
+            models.ForgottenPasswordToken(digest='valid'))
+        support.session.commit()
+        model = models.ForgottenPasswordToken
+        deleted = models.delete_in_batches(
+            support.session, model,
+            model.created_date <= datetime.datetime.now() - datetime.timedelta(days=10),
+            batch_size=2)
+        assert deleted == 5
+        assert support.session.query(model).filter_by(
+            digest='valid').count() == 1
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
+import types
 from tests.watson.auth import support
+from watson.auth import authorization, instrumentation
 from watson.auth.panels import User
+from watson.auth.providers import Session
+from watson.events.dispatcher import EventDispatcher
 from watson.events.types import Event
+from watson.framework import events
 
 
 class TestUserPanel(object):
@@ -12,3 +17,59 @@ class TestUserPanel(object):
         panel.event = Event('test', params={'context': {'request': request}})
         assert panel.user == 'admin'
         assert panel.render_key_stat() == 'admin'
+
+
+class TestUserPanelPerformance(object):
+    def setup(self):
+        self.application = types.SimpleNamespace(
+            run=None, dispatcher=EventDispatcher(), config=support.app.config)
+        self.panel = User({'enabled': True}, None, self.application)
+        self.panel.register_listeners()
+        self.instrumentation = instrumentation.Instrumentation(
+            self.application.dispatcher)
+
+    def _handle_request(self):
+        provider = Session(
+            support.default_provider_settings, support.session,
+            executor=support.InlineExecutor())
+        provider.instrumentation = self.instrumentation
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        provider.login(support.admin_user, request)
+        request.user = None
+        context = {'request': request}
+        self.application.dispatcher.trigger(
+            Event(events.ROUTE_MATCH, params={'context': context}))
+        provider.handle_request(request)
+        self.panel.event = Event('test', params={'context': context})
+        return request
+
+    def test_performance(self):
+        request = self._handle_request()
+        acl = authorization.Acl(request.user)
+        acl.instrumentation = self.instrumentation
+        assert acl.has_role('admin')
+        allowed = acl.has_permission('missing.permission')
+        performance = self.panel.performance
+        assert performance['provider'] == 'watson.auth.providers.session.Provider'
+        assert performance['handle_request_ms'] > 0
+        assert performance['acl_ms'] > 0
+        assert performance['queries'] >= 1
+        role, permission = performance['checks']
+        assert (role['check'], role['key'], role['result']) == ('role', 'admin', True)
+        assert (permission['key'], permission['result']) == (
+            'missing.permission', allowed)
+        assert ('watson.auth.acl.generate',
+                'watson.auth.authorization.Acl', False) in performance['caches']
+
+    def test_not_collected_outside_of_requests(self):
+        self._handle_request()
+        self.panel.renderer = Renderer()
+        self.panel.render()
+        self.panel.record(Event(instrumentation.GET_USER, params={}))
+        assert len(self.panel.events) == 2
+
+
+class Renderer(object):
+    def render(self, template, data):
+        return data
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import copy
+import os
+import pstats
+import shutil
+import tempfile
+import time
+from watson.events import types
+from watson.framework import applications
+from watson.auth import profiling
+from tests.watson.auth import support
+
+
+@profiling.profiled()
+def fast():
+    return 'fast'
+
+
+@profiling.profiled('slow')
+def slow(duration=0.05):
+    time.sleep(duration)
+    return 'slow'
+
+
+@profiling.profiled()
+def outer():
+    return fast()
+
+
+@profiling.profiled()
+def failing():
+    raise ValueError('Failed')
+
+
+class TestProfiler(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self):
+        profiling.install(None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def install(self, **kwargs):
+        profiler = profiling.Profiler(self.directory, **kwargs)
+        profiling.install(profiler)
+        return profiler
+
+    def test_not_installed(self):
+        assert fast() == 'fast'
+        assert not os.listdir(self.directory)
+
+    def test_sample_rate(self):
+        profiler = self.install(threshold=None, sample_rate=2)
+        for _ in range(4):
+            assert fast() == 'fast'
+        profiles = profiler.profiles()
+        assert len(profiles) == 2
+        assert profiles[0].endswith('ms-tests.watson.auth.test_profiling.fast.prof')
+        stats = pstats.Stats(profiles[0])
+        assert any(name == 'fast' for _, _, name in stats.stats)
+
+    def test_nested(self):
+        profiler = self.install(threshold=None, sample_rate=1)
+        assert outer() == 'fast'
+        profile, = profiler.profiles()
+        assert profile.endswith('outer.prof')
+
+    def test_threshold(self):
+        profiler = self.install(threshold=0.01, interval=0.001)
+        assert fast() == 'fast'
+        assert not profiler.profiles()
+        assert slow() == 'slow'
+        profile, = profiler.profiles()
+        assert profile.endswith('-slow.txt')
+        with open(profile) as file:
+            contents = file.read()
+        assert contents.startswith('# phase: slow\n')
+        assert 'tests.watson.auth.test_profiling.slow ' in contents
+
+    def test_sleeps_until_threshold(self, monkeypatch):
+        samples = []
+        current_frames = profiling.sys._current_frames
+        monkeypatch.setattr(
+            profiling.sys, '_current_frames',
+            lambda: samples.append(1) or current_frames())
+        profiler = self.install(threshold=1, interval=0.001)
+        assert slow() == 'slow'
+        assert not samples
+        assert not profiler.profiles()
+
+    def test_decorator_excludes_action(self):
+        profiler = self.install(threshold=None, sample_rate=1)
+        controller = support.app.container.get(
+            'tests.watson.auth.decorators.test_session.SampleController')
+        controller.request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        controller.logout_action()
+        profile, = profiler.profiles()
+        assert profile.endswith(
+            'watson.auth.providers.session.decorators.logout.prof')
+        stats = pstats.Stats(profile)
+        assert not any(name == 'logout_action' for _, _, name in stats.stats)
+
+    def test_max_files(self):
+        profiler = self.install(threshold=None, sample_rate=1, max_files=2)
+        for _ in range(4):
+            fast()
+        assert len(profiler.profiles()) == 2
+
+    def test_exception(self):
+        profiler = self.install(threshold=0)
+        try:
+            failing()
+            assert False  # pragma: no cover
+        except ValueError:
+            assert True
+        assert len(profiler.profiles()) == 1
+
+    def test_unwritable(self):
+        self.install(threshold=0)
+        shutil.rmtree(self.directory)
+        assert fast() == 'fast'
+
+    def test_route_and_authenticate(self):
+        profiler = self.install(threshold=None, sample_rate=1)
+        provider = support.app.container.get('watson.auth.providers.Session')
+        listener = support.app.container.get('watson.auth.listeners.Route')
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        listener(types.Event('test', params={'context': {'request': request}}))
+        assert provider.authenticate('admin', 'test')
+        route, authenticate = profiler.profiles()
+        assert route.endswith('watson.auth.listeners.Route.__call__.prof')
+        assert authenticate.endswith(
+            'watson.auth.providers.abc.Base.authenticate.prof')
+
+
+class TestApplication(object):
+
+    def teardown(self):
+        profiling.install(None)
+
+    def test_disabled(self):
+        assert 'auth_profiler' not in support.app.container.definitions
+        assert profiling.profiler is None
+
+    def test_enabled(self):
+        directory = tempfile.mkdtemp()
+        app_config = copy.deepcopy(support.app_config)
+        app_config['auth']['profiling'] = {
+            'enabled': True, 'directory': directory, 'sample_rate': 10}
+        try:
+            app = applications.Http(app_config)
+            profiler = app.container.get('auth_profiler')
+            assert profiling.profiler is profiler
+            assert profiler.sample_rate == 10
+            assert profiler.threshold == 0.5
+        finally:
+            shutil.rmtree(directory)
@@ -1,16 +1,49 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import base64
+import datetime
+import os
+import shutil
+import tempfile
+from concurrent import futures
+import pytest
+from pytest import raises
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session, scoped_session, sessionmaker
+from watson.auth.providers import ApiKey
+from watson.auth.providers import Basic
 from watson.auth.providers import JWT
+from watson.auth.providers import exceptions
 from watson.auth.providers import Session
+from watson.auth import authorization, models, providers, snapshots
+from watson.auth.providers import api_key as api_key_provider
+from watson.common import imports
 from tests.watson.auth import support
 
 
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class TestProviders(object):
+
+    def test_lazy_load(self):
+        assert imports.load_definition_from_string(
+            'watson.auth.providers.JWT') is JWT
+        assert 'Basic' in dir(providers)
+        with raises(AttributeError):
+            providers.Invalid
+
+
 class TestABCProvider(object):
     provider = None
 
     def setup(self):
         self.provider = Session(
             support.default_provider_settings,
-            support.session)
+            support.session,
+            executor=support.InlineExecutor())
 
     def test_user_model_identifier(self):
         assert self.provider.user_model_identifier == support.default_provider_settings['model']['identifier']
@@ -29,6 +62,32 @@ class TestABCProvider(object):
     def test_is_authorized(self):
         assert self.provider.is_authorized(support.admin_user)
 
+    def test_authorize(self):
+        policy = authorization.Policy(roles='admin')
+        assert self.provider.authorize(support.admin_user, policy)
+        assert not self.provider.authorize(support.regular_user, policy)
+
+    def test_authorize_overridden(self, monkeypatch):
+        calls = []
+
+        def is_authorized(provider, user, *args):
+            calls.append(args)
+            return user is support.regular_user
+        monkeypatch.setattr(
+            type(self.provider), 'is_authorized', is_authorized)
+        policy = authorization.Policy(
+            permissions=('posts.edit', 'posts.view'), resource=('post', 'id'))
+        assert not self.provider.authorize(support.regular_user, policy)
+        assert not calls
+        assert not self.provider.authorize(
+            support.admin_user, policy, {'id': 1})
+        calls.clear()
+        assert self.provider.authorize(
+            support.regular_user, policy, {'id': 1})
+        assert sorted(calls) == [
+            (None, 'posts.edit', (), ('post', 1)),
+            (None, 'posts.view', (), ('post', 1))]
+
     def test_authenticate_user(self):
         assert self.provider.authenticate('test', 'test')
         assert not self.provider.authenticate('test', 'testing')
@@ -36,6 +95,99 @@ class TestABCProvider(object):
     def test_authenticate_password_longer_max_length(self):
         assert not self.provider.authenticate('test', '1234567890123456789012345678901')
 
+    def test_aget_user(self):
+        assert run(self.provider.aget_user('admin')) == support.admin_user
+        assert not run(self.provider.aget_user('admin2'))
+
+    def test_aauthenticate_user(self):
+        assert run(self.provider.aauthenticate('test', 'test'))
+        assert not run(self.provider.aauthenticate('test', 'testing'))
+        assert not run(self.provider.aauthenticate(
+            'test', '1234567890123456789012345678901'))
+
+    def test_refresh_acl_disabled(self):
+        user = support.admin_user
+        user.acl.version = None
+        self.provider.refresh_acl(user)
+        assert user.acl.version is None
+
+    def test_refresh_acl(self):
+        settings = dict(support.default_provider_settings)
+        settings['acl_version_interval'] = 0
+        provider = Session(settings, support.session)
+        user = support.admin_user
+        user.acl.has_permission('read')
+        provider.refresh_acl(user)
+        assert user.acl.version == models.AclVersion.current(support.session)
+        assert not user.acl._permissions
+        user.acl.has_permission('read')
+        provider.refresh_acl(user)
+        assert user.acl._permissions
+
+
+class TestAsyncQueries(object):
+    """Users retrieved asynchronously against a database shared between
+    threads, so that their ACL must be usable from the event loop.
+    """
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.url = 'sqlite:///{0}'.format(
+            os.path.join(self.directory, 'auth.db'))
+        self.engine = create_engine(self.url)
+        models.Model.metadata.create_all(self.engine)
+        self.session = scoped_session(sessionmaker(bind=self.engine))
+        permission = models.Permission(name='Read', key='read')
+        role = models.Role(name='Admin', key='admin')
+        role.add_permission(permission, value=1)
+        user = support.TestUser(username='admin', password='test')
+        user.roles.append(role)
+        user.add_resource_permission(permission, 'post', 1, value=0)
+        self.session.add_all([role, user])
+        self.session.commit()
+        self.session.remove()
+
+    def teardown(self):
+        self.session.remove()
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def assert_acl(self, user):
+        assert user.acl.has_role('admin')
+        assert user.acl.has_permission('read')
+        assert not user.acl.has_resource_permission('read', 'post', 1)
+        assert user.acl.has_resource_permission('read', 'post', 2)
+
+    def test_executor(self):
+        executor = futures.ThreadPoolExecutor(1)
+        provider = Session(
+            support.default_provider_settings, self.session,
+            executor=executor)
+        try:
+            user = run(provider.aget_user('admin'))
+            assert object_session(user) is None
+            assert not executor.submit(self.session.registry.has).result()
+            self.assert_acl(user)
+        finally:
+            executor.shutdown()
+
+    def test_async_session(self):
+        asyncio_ext = pytest.importorskip('sqlalchemy.ext.asyncio')
+        pytest.importorskip('aiosqlite')
+        engine = asyncio_ext.create_async_engine(
+            self.url.replace('sqlite:', 'sqlite+aiosqlite:'))
+        async_session = asyncio_ext.AsyncSession(engine)
+        provider = Session(
+            support.default_provider_settings, self.session,
+            async_session=async_session)
+        try:
+            user = run(provider.aget_user('admin'))
+            assert not run(provider.aget_user('admin2'))
+            self.assert_acl(user)
+        finally:
+            run(async_session.close())
+            run(engine.dispose())
+
 
 class TestSessionProvider(object):
     provider = None
@@ -43,12 +195,20 @@ class TestSessionProvider(object):
     def setup(self):
         self.provider = Session(
             support.default_provider_settings,
-            support.session)
+            support.session,
+            executor=support.InlineExecutor())
 
     def test_handle_request(self):
         self.provider.handle_request(support.request)
         assert support.request.user
 
+    def test_ahandle_request(self):
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        request.session['watson.user'] = 'admin'
+        run(self.provider.ahandle_request(request))
+        assert request.user == support.admin_user
+
     def test_login(self):
         self.provider.login(support.admin_user, support.request)
         assert support.request.user == support.admin_user
@@ -60,13 +220,259 @@ class TestSessionProvider(object):
         assert not support.request.user
 
 
+class TestSessionProviderSnapshot(object):
+    provider = None
+
+    def setup(self):
+        settings = dict(support.default_provider_settings)
+        settings['snapshot'] = {'enabled': True, 'revalidate_interval': 300}
+        self.provider = Session(settings, support.session)
+
+    def _request(self):
+        request = support.Request.from_environ(
+            support.sample_environ(), 'watson.http.sessions.Memory')
+        return request
+
+    def test_requires_secret(self):
+        settings = dict(support.default_provider_settings)
+        del settings['secret']
+        settings['snapshot'] = {'enabled': True}
+        with raises(exceptions.InvalidConfiguration):
+            Session(settings, support.session)
+
+    def test_handle_request_from_snapshot(self):
+        request = self._request()
+        self.provider.login(support.regular_user, request)
+        assert request.session[self.provider.snapshot_key]
+        request.user = None
+        self.provider.handle_request(request)
+        user = request.user
+        assert isinstance(user, snapshots.User)
+        assert user == support.regular_user
+        assert user.username == 'regular'
+        assert user.acl.has_role('regular')
+        assert not user.acl.has_role(('admin', 'guest'))
+        assert user.acl.has_permission('read')
+        assert not user.acl.has_permission('create')
+        assert user.acl.permissions['delete'].inherited == 1
+
+    def test_snapshot_loads_user_on_demand(self):
+        request = self._request()
+        self.provider.login(support.admin_user, request)
+        request.user = None
+        self.provider.handle_request(request)
+        assert request.user.email == 'admin@test.com'
+        assert request.user.user is support.admin_user
+
+    def test_expired_snapshot_revalidated(self):
+        settings = dict(support.default_provider_settings)
+        settings['snapshot'] = {'enabled': True, 'revalidate_interval': -1}
+        provider = Session(settings, support.session)
+        request = self._request()
+        provider.login(support.admin_user, request)
+        request.user = None
+        provider.handle_request(request)
+        assert request.user is support.admin_user
+
+    def test_tampered_snapshot(self):
+        request = self._request()
+        self.provider.login(support.admin_user, request)
+        request.session[self.provider.snapshot_key] = 'invalid'
+        request.user = None
+        self.provider.handle_request(request)
+        assert request.user is support.admin_user
+        assert request.session[self.provider.snapshot_key] != 'invalid'
+
+    def test_logout(self):
+        request = self._request()
+        self.provider.login(support.admin_user, request)
+        self.provider.logout(request)
+        assert not request.session[self.provider.snapshot_key]
+
+
+class TestSessionProviderCookie(object):
+    provider = None
+
+    def setup(self):
+        self.provider = Session(self._settings(), support.session)
+
+    def _settings(self, **cookie):
+        settings = dict(support.default_provider_settings)
+        settings['cookie'] = dict(Session.defaults['cookie'], enabled=True)
+        settings['cookie'].update(cookie)
+        return settings
+
+    def _request(self, previous=None, provider=None):
+        environ = support.sample_environ()
+        if previous:
+            name = (provider or self.provider).config['cookie']['name']
+            morsel = (provider or self.provider).response_cookies(previous)[name]
+            environ['HTTP_COOKIE'] = '{}={}'.format(name, morsel.coded_value)
+        return support.Request.from_environ(
+            environ, 'watson.http.sessions.Memory')
+
+    def test_requires_secret(self):
+        settings = self._settings()
+        del settings['secret']
+        with raises(exceptions.InvalidConfiguration):
+            Session(settings, support.session)
+
+    def test_login_sets_cookie(self):
+        request = self._request()
+        self.provider.login(support.admin_user, request)
+        morsel = self.provider.response_cookies(request)['watson.auth']
+        assert morsel['httponly']
+        assert not request.session['watson.user']
+
+    def test_handle_request(self):
+        previous = self._request()
+        self.provider.login(support.admin_user, previous)
+        request = self._request(previous)
+        self.provider.handle_request(request)
+        assert request.user is support.admin_user
+        assert not request.session['watson.user']
+
+    def test_tampered_cookie(self):
+        request = support.Request.from_environ(
+            support.sample_environ(HTTP_COOKIE='watson.auth=invalid.cookie'),
+            'watson.http.sessions.Memory')
+        self.provider.handle_request(request)
+        assert not request.user
+
+    def test_expired_cookie(self):
+        provider = Session(self._settings(max_age=-1), support.session)
+        previous = self._request()
+        provider.login(support.admin_user, previous)
+        request = self._request(previous, provider)
+        provider.handle_request(request)
+        assert not request.user
+
+    def test_encrypted_cookie(self):
+        pytest.importorskip('cryptography')
+        provider = Session(self._settings(encrypt=True), support.session)
+        previous = self._request()
+        provider.login(support.admin_user, previous)
+        value = provider.response_cookies(previous)['watson.auth'].value
+        assert 'admin' not in base64.urlsafe_b64decode(value).decode('latin-1')
+        request = self._request(previous, provider)
+        provider.handle_request(request)
+        assert request.user is support.admin_user
+
+    def test_snapshot_stored_in_cookie(self):
+        settings = self._settings()
+        settings['snapshot'] = {'enabled': True, 'revalidate_interval': 300}
+        provider = Session(settings, support.session)
+        previous = self._request()
+        provider.login(support.regular_user, previous)
+        request = self._request(previous, provider)
+        provider.handle_request(request)
+        assert isinstance(request.user, snapshots.User)
+        assert request.user.acl.has_role('regular')
+        assert not request.session['watson.user']
+
+    def test_logout(self):
+        request = self._request()
+        self.provider.login(support.admin_user, request)
+        self.provider.logout(request)
+        assert not request.user
+        morsel = self.provider.response_cookies(request)['watson.auth']
+        assert morsel['expires'] == -1
+
+
+class TestSessionProviderRemember(object):
+    provider = None
+
+    def setup(self):
+        settings = dict(support.default_provider_settings)
+        settings['remember'] = dict(
+            Session.defaults['remember'], enabled=True)
+        self.provider = Session(
+            settings, support.session, executor=support.InlineExecutor())
+
+    def teardown(self):
+        self.provider.revoke_remember_tokens(support.admin_user)
+
+    def _request(self, previous=None):
+        environ = support.sample_environ()
+        if previous:
+            morsel = self.provider.response_cookies(
+                previous)['watson.auth.remember']
+            environ['HTTP_COOKIE'] = 'watson.auth.remember={}'.format(
+                morsel.coded_value)
+        return support.Request.from_environ(
+            environ, 'watson.http.sessions.Memory')
+
+    def test_remember(self):
+        request = self._request()
+        token = self.provider.remember(support.admin_user, request)
+        selector, validator = self.provider.response_cookies(
+            request)['watson.auth.remember'].value.split('.')
+        assert token.selector == selector
+        assert token.digest != validator
+        assert token in support.admin_user.remember_tokens
+
+    def test_handle_request_rotates_token(self):
+        previous = self._request()
+        token = self.provider.remember(support.admin_user, previous)
+        request = self._request(previous)
+        self.provider.handle_request(request)
+        assert request.user is support.admin_user
+        assert request.session['watson.user'] == 'admin'
+        rotated = self.provider.response_cookies(
+            request)['watson.auth.remember'].value
+        assert not rotated.startswith(token.selector)
+        request = self._request(previous)
+        self.provider.handle_request(request)
+        assert not request.user
+
+    def test_ahandle_request(self):
+        previous = self._request()
+        self.provider.remember(support.admin_user, previous)
+        request = self._request(previous)
+        run(self.provider.ahandle_request(request))
+        assert request.user is support.admin_user
+
+    def test_invalid_validator_revokes_tokens(self):
+        request = self._request()
+        token = self.provider.remember(support.admin_user, request)
+        self.provider.remember(support.admin_user, self._request())
+        request = support.Request.from_environ(
+            support.sample_environ(
+                HTTP_COOKIE='watson.auth.remember={}.invalid'.format(
+                    token.selector)),
+            'watson.http.sessions.Memory')
+        self.provider.handle_request(request)
+        assert not request.user
+        assert not support.admin_user.remember_tokens
+
+    def test_expired_token(self):
+        previous = self._request()
+        token = self.provider.remember(support.admin_user, previous)
+        token.expires_date = datetime.datetime.now()
+        support.session.commit()
+        request = self._request(previous)
+        self.provider.handle_request(request)
+        assert not request.user
+
+    def test_logout(self):
+        previous = self._request()
+        self.provider.remember(support.admin_user, previous)
+        request = self._request(previous)
+        self.provider.logout(request)
+        assert not support.admin_user.remember_tokens
+        morsel = self.provider.response_cookies(
+            request)['watson.auth.remember']
+        assert morsel['expires'] == -1
+
+
 class TestJWTProvider(object):
     provider = None
 
     def setup(self):
         self.provider = JWT(
             support.default_provider_settings,
-            support.session)
+            support.session,
+            executor=support.InlineExecutor())
 
     def test_login(self):
         token = self.provider.login(support.admin_user, support.request)
@@ -80,6 +486,14 @@ class TestJWTProvider(object):
         self.provider.handle_request(request)
         assert request.user == support.admin_user
 
+    def test_ahandle_request(self):
+        token = self.provider.login(support.admin_user, support.request)
+        request = support.Request(
+            support.sample_environ(
+                HTTP_AUTHORIZATION='Bearer {}'.format(token)))
+        run(self.provider.ahandle_request(request))
+        assert request.user == support.admin_user
+
     def test_logout(self):
         token = self.provider.login(support.admin_user, support.request)
         request = support.Request(
@@ -87,3 +501,164 @@ class TestJWTProvider(object):
                 HTTP_AUTHORIZATION='Bearer {}'.format(token)))
         self.provider.handle_request(request)
         assert not self.provider.logout(request)
+
+
+def basic_request(username, password):
+    credentials = base64.b64encode(
+        '{}:{}'.format(username, password).encode('utf-8')).decode('utf-8')
+    return support.Request(
+        support.sample_environ(
+            HTTP_AUTHORIZATION='Basic {}'.format(credentials)))
+
+
+class TestBasicProvider(object):
+    provider = None
+
+    def setup(self):
+        self.provider = Basic(
+            support.default_provider_settings,
+            support.session)
+
+    def test_handle_request(self):
+        request = basic_request('admin', 'test')
+        self.provider.handle_request(request)
+        assert request.user == support.admin_user
+
+    def test_handle_request_invalid_credentials(self):
+        request = basic_request('admin', 'testing')
+        self.provider.handle_request(request)
+        assert not request.user
+        request = support.Request(
+            support.sample_environ(HTTP_AUTHORIZATION='Basic !!!'))
+        self.provider.handle_request(request)
+        assert not request.user
+
+    def test_authenticate_caches_verified_credentials(self, monkeypatch):
+        assert self.provider.authenticate('admin', 'test')
+        assert len(self.provider.cache) == 1
+        calls = []
+        monkeypatch.setattr(
+            'watson.auth.crypto.check_password',
+            lambda *args: calls.append(args))
+        assert self.provider.authenticate('admin', 'test')
+        assert not calls
+        assert not self.provider.authenticate('admin', 'other')
+        assert calls
+
+    def test_cache_invalidated_on_password_change(self):
+        cache = self.provider.cache
+        digest = cache.digest('admin', 'test')
+        cache.set(digest, 'hash')
+        assert cache.get(digest, 'hash')
+        assert not cache.get(digest, 'changed')
+        assert not len(cache)
+
+    def test_cache_is_bounded(self):
+        cache = Basic(
+            dict(support.default_provider_settings,
+                 cache={'max_size': 2, 'ttl': 300}),
+            support.session).cache
+        for username in ('a', 'b', 'c'):
+            cache.set(cache.digest(username, 'test'), 'hash')
+        assert len(cache) == 2
+        assert not cache.get(cache.digest('a', 'test'), 'hash')
+
+    def test_concurrency_limit(self):
+        provider = Basic(
+            dict(support.default_provider_settings,
+                 concurrency={'max_per_client': 1, 'timeout': 0}),
+            support.session)
+        semaphore = provider._client_semaphore('admin')
+        semaphore.acquire()
+        assert not provider.authenticate('admin', 'test')
+        semaphore.release()
+        assert provider.authenticate('admin', 'test')
+
+    def test_login_logout(self):
+        request = basic_request('admin', 'test')
+        self.provider.login(support.admin_user, request)
+        assert request.user == support.admin_user
+        self.provider.logout(request)
+        assert not request.user
+        assert self.provider.challenge() == 'Basic realm="watson"'
+
+
+class TestApiKeyProvider(object):
+    provider = None
+
+    def setup(self):
+        self.provider = ApiKey(
+            support.default_provider_settings,
+            support.session)
+
+    def _request(self, key):
+        return support.Request(support.sample_environ(HTTP_X_API_KEY=key))
+
+    def test_generate_key(self):
+        api_key, key = self.provider.generate_key(
+            support.admin_user, name='Test')
+        prefix, secret = key.split('.')
+        assert api_key.prefix == prefix
+        assert api_key.digest != secret
+        assert self.provider.get_api_key(key) is api_key
+        assert not self.provider.get_api_key(prefix + '.invalid')
+        assert not self.provider.get_api_key('invalid.' + secret)
+        assert not self.provider.get_api_key(prefix)
+        self.provider.revoke_key(api_key)
+        assert not self.provider.get_api_key(key)
+
+    def test_generate_key_prefix_collision(self, monkeypatch):
+        existing, _ = self.provider.generate_key(support.admin_user)
+        prefixes = iter([existing.prefix, 'unique'])
+        monkeypatch.setattr(
+            api_key_provider.secrets, 'token_hex',
+            lambda length: next(prefixes))
+        api_key, key = self.provider.generate_key(support.admin_user)
+        assert api_key.prefix == 'unique'
+        assert self.provider.get_api_key(key) is api_key
+        prefixes = iter([existing.prefix] * api_key_provider.PREFIX_ATTEMPTS)
+        with raises(IntegrityError):
+            self.provider.generate_key(support.admin_user)
+        self.provider.revoke_key(api_key)
+        self.provider.revoke_key(existing)
+
+    def test_get_api_key_loads_user(self):
+        api_key, key = self.provider.generate_key(support.admin_user)
+        support.session.expire_all()
+        with support.count_queries(support.session.bind) as queries:
+            assert self.provider.get_api_key(key).user == support.admin_user
+        assert len(queries) == 1
+        self.provider.revoke_key(api_key)
+
+    def test_hmac_digest(self):
+        provider = ApiKey(
+            dict(support.default_provider_settings, secret='other'),
+            support.session)
+        assert provider.digest('secret') != self.provider.digest('secret')
+
+    def test_expired_key(self):
+        api_key, key = self.provider.generate_key(
+            support.admin_user, expires=-1)
+        assert api_key.is_expired()
+        assert not self.provider.get_api_key(key)
+        self.provider.revoke_key(api_key)
+
+    def test_handle_request(self):
+        api_key, key = self.provider.generate_key(support.guest_user)
+        request = self._request(key)
+        self.provider.handle_request(request)
+        assert request.user == support.guest_user
+        assert request.user.acl.scopes is None
+        self.provider.revoke_key(api_key)
+
+    def test_handle_request_with_scopes(self):
+        api_key, key = self.provider.generate_key(
+            support.admin_user, scopes=['read'])
+        request = self._request(key)
+        self.provider.handle_request(request)
+        acl = request.user.acl
+        assert acl.has_permission('read')
+        assert not acl.has_permission('delete')
+        acl.limit_to_scopes(None)
+        assert acl.has_permission('delete')
+        self.provider.revoke_key(api_key)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from watson.auth import signing
+
+
+class TestSigning(object):
+
+    def test_sign_unsign(self):
+        value = signing.sign({'id': 1}, 'secret')
+        assert signing.unsign(value, 'secret') == {'id': 1}
+
+    def test_invalid_signature(self):
+        value = signing.sign({'id': 1}, 'secret')
+        assert signing.unsign(value, 'other') is None
+        payload, signature = value.split('.')
+        tampered = signing.sign({'id': 2}, 'secret').split('.')[0]
+        assert signing.unsign('{}.{}'.format(tampered, signature), 'secret') is None
+
+    def test_malformed_value(self):
+        assert signing.unsign(None, 'secret') is None
+        assert signing.unsign('invalid', 'secret') is None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import io
+from watson.auth import models, sync
+from tests.watson.auth import support
+
+
+definition = {
+    'permissions': {
+        'sync.create': 'Create',
+        'sync.delete': 'Delete',
+    },
+    'roles': {
+        'synced': {
+            'name': 'Synced',
+            'permissions': {'sync.create': 1, 'sync.delete': 0},
+        },
+    },
+}
+
+
+def grants(role_key):
+    role = support.session.query(models.Role).filter_by(key=role_key).one()
+    return {grant.permission.key: grant.value for grant in role.permissions}
+
+
+class TestLoadDefinition(object):
+
+    def test_json(self):
+        file = io.StringIO('{"permissions": {"sync.create": "Create"}}')
+        assert sync.load_definition(file) == {
+            'permissions': {'sync.create': 'Create'}}
+
+
+class TestAclSync(object):
+
+    def setup(self):
+        self.sync = sync.AclSync(support.session)
+
+    def test_sync(self):
+        version = models.AclVersion.current(support.session)
+        changes = self.sync.sync(definition)
+        assert len(changes.permissions) == 2
+        assert len(changes.roles) == 1
+        assert len(changes.grants) == 2
+        assert grants('synced') == {'sync.create': 1, 'sync.delete': 0}
+        assert models.AclVersion.current(support.session) > version
+        assert not self.sync.diff(definition)
+
+        updated = {
+            'roles': {
+                'synced': {
+                    'name': 'Renamed',
+                    'permissions': {'sync.create': 0, 'sync.edit': 1},
+                },
+            },
+        }
+        changes = self.sync.diff(updated)
+        assert [obj.key for obj, _ in changes.renamed] == ['synced']
+        assert [permission.key for permission in changes.permissions] == ['sync.edit']
+        assert len(changes.updated_grants) == 1
+        assert len(changes.removed_grants) == 1
+        assert len(changes.summary()) == 5
+        self.sync.apply(changes)
+        assert grants('synced') == {'sync.create': 0, 'sync.edit': 1}
+
+    def test_dry_run(self):
+        changes = self.sync.sync(
+            {'permissions': {'sync.dry': 'Dry'}}, dry_run=True)
+        assert changes
+        assert not support.session.query(models.Permission).filter_by(
+            key='sync.dry').count()
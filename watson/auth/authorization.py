@@ -1,9 +1,316 @@
 # -*- coding: utf-8 -*-
 import collections
+import time
+from sqlalchemy import inspect
+from sqlalchemy.orm import object_session
+from watson.auth.instrumentation import (
+    annotate, check_params, timed, ACL_CHECK, ACL_GENERATE)
 
 
 Permission = collections.namedtuple('Permission', 'id name inherited value')
 
+SEPARATOR = '.'
+WILDCARD = '*'
+
+
+class PermissionTree(object):
+
+    """A prefix trie of permission grants, keyed by the segments of the
+    permission key.
+
+    Grants may contain wildcard segments, where `*` matches any single
+    segment, and a trailing `*` matches any number of remaining segments. For
+    example `posts.*` will match `posts.create` and `posts.comments.edit`,
+    whilst `*.read` will match `posts.read` but not `posts.comments.read`.
+
+    The cost of a lookup is bound by the number of segments in the key being
+    validated, not by the number of grants within the tree.
+    """
+
+    __slots__ = ('children', 'value')
+
+    def __init__(self, grants=None):
+        """Initializes the tree.
+
+        Args:
+            grants (dict): A dict of permission key => value (0 or 1)
+        """
+        self.children = {}
+        self.value = None
+        for key, value in (grants or {}).items():
+            self.add(key, value)
+
+    def add(self, key, value):
+        """Adds a grant to the tree.
+
+        If the same key is granted multiple times, a deny will always take
+        precedence over an allow.
+
+        Args:
+            key (string): The permission key, optionally containing wildcards
+            value (int): The value of the grant, 0 - deny, 1 - allow
+        """
+        node = self
+        for segment in key.split(SEPARATOR):
+            node = node.children.setdefault(segment, PermissionTree())
+        value = 1 if value else 0
+        node.value = value if node.value is None else min(node.value, value)
+
+    def match(self, key):
+        """Retrieves the value of the grants that match the key.
+
+        Args:
+            key (string): The permission key to match
+
+        Returns:
+            None if no grants match, False if any matching grant is a deny,
+            otherwise True.
+        """
+        values = set()
+        self._match(key.split(SEPARATOR), 0, values)
+        if not values:
+            return None
+        return 0 not in values
+
+    def _match(self, segments, index, values):
+        if index == len(segments):
+            if self.value is not None:
+                values.add(self.value)
+            return
+        wildcard = self.children.get(WILDCARD)
+        if wildcard is not None:
+            if wildcard.value is not None:
+                values.add(wildcard.value)
+            if wildcard.children:
+                wildcard._match(segments, index + 1, values)
+        if 0 in values:
+            return
+        node = self.children.get(segments[index])
+        if node is not None:
+            node._match(segments, index + 1, values)
+
+
+def resolve_resource(resource, params):
+    """Retrieves the resource a permission should be validated against.
+
+    Args:
+        resource (tuple): The (resource_type, param) pair
+        params (dict): The params (generally route params) to retrieve the
+                       resource identifier from
+
+    Returns:
+        A (resource_type, resource_id) tuple, or None if no resource was
+        specified or the param is missing.
+    """
+    if not resource:
+        return None
+    resource_type, param = resource
+    resource_id = params.get(param)
+    if resource_id is None:
+        return None
+    return resource_type, resource_id
+
+
+def _normalize_keys(keys):
+    if not keys:
+        return None
+    if isinstance(keys, str):
+        return frozenset((keys,))
+    return frozenset(keys)
+
+
+class Policy(object):
+
+    """A compiled set of authorization rules.
+
+    Policies are created once (generally when a controller action is
+    decorated) and then called for each request. The rules are evaluated
+    cheapest first, and evaluation stops as soon as a rule fails.
+
+    Example:
+
+    .. code-block:: python
+
+        policy = Policy(roles='admin', permissions=('posts.edit',))
+        policy(user)  # True/False
+    """
+
+    __slots__ = ('roles', 'permissions', 'requires', 'resource', '_rules')
+
+    def __init__(self, roles=None, permissions=None, requires=None,
+                 resource=None):
+        """Initializes and compiles the policy.
+
+        Args:
+            roles (list|string): The roles the user must have one of
+            permissions (list|string): The permissions the user must have all of
+            requires (list): Callables the user must satisfy
+            resource (tuple): A (resource_type, param) pair, the permissions
+                              will be validated against that resource
+        """
+        self.roles = _normalize_keys(roles)
+        self.permissions = _normalize_keys(permissions)
+        self.requires = tuple(requires or ())
+        self.resource = resource
+        rules = []
+        if self.roles:
+            rules.append(self._has_role)
+        if self.permissions:
+            if self.resource:
+                rules.append(self._has_resource_permissions)
+            else:
+                rules.append(self._has_permissions)
+        if self.requires:
+            rules.append(self._meets_requirements)
+        self._rules = tuple(rules)
+
+    def __call__(self, user, params=None):
+        """Validates the user against the policy.
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to validate
+            params (dict): The params to retrieve the resource identifier from
+        """
+        for rule in self._rules:
+            if not rule(user, params):
+                return False
+        return True
+
+    def _has_role(self, user, params):
+        return user.acl.has_role(self.roles)
+
+    def _has_permissions(self, user, params):
+        acl = user.acl
+        for permission in self.permissions:
+            if not acl.has_permission(permission):
+                return False
+        return True
+
+    def _has_resource_permissions(self, user, params):
+        resource = resolve_resource(self.resource, params or {})
+        if resource is None:
+            # fail closed, a misnamed param must not grant every resource
+            return False
+        acl = user.acl
+        for permission in self.permissions:
+            if not acl.has_resource_permission(permission, *resource):
+                return False
+        return True
+
+    def _meets_requirements(self, user, params):
+        for require in self.requires:
+            if not require(user):
+                return False
+        return True
+
+
+class ResourcePermissions(object):
+
+    """Loads and caches the resource scoped permissions for a user.
+
+    Grants are retrieved in batches, so that validating a permission against
+    many resources of the same type only requires a single query.
+
+    Example:
+
+    .. code-block:: python
+
+        user.acl.resources.load('post', [post.id for post in posts])
+        for post in posts:
+            user.acl.has_resource_permission('posts.edit', 'post', post.id)
+    """
+
+    def __init__(self, user, session=None):
+        """Initializes the loader.
+
+        Args:
+            watson.auth.models.UserMixin user: The user to load grants for
+            session: The SQLAlchemy session to query, defaults to the session
+                     the user is associated with
+        """
+        self.user = user
+        self.session = session
+        self._trees = {}
+
+    def load(self, resource_type, resource_ids):
+        """Retrieves the grants for any resources that have not been loaded.
+
+        Args:
+            resource_type (string): The type of the resources
+            resource_ids (list): The identifiers of the resources
+        """
+        from watson.auth.models import (
+            Permission as PermissionModel, UsersHasResourcePermission)
+        resource_ids = {str(resource_id) for resource_id in resource_ids}
+        resource_ids = [resource_id for resource_id in resource_ids
+                        if (resource_type, resource_id) not in self._trees]
+        if not resource_ids:
+            return
+        for resource_id in resource_ids:
+            self._trees[(resource_type, resource_id)] = PermissionTree()
+        session = self.session or object_session(self.user)
+        if not session:
+            return
+        query = session.query(
+            PermissionModel.key,
+            UsersHasResourcePermission.resource_id,
+            UsersHasResourcePermission.value).join(
+                UsersHasResourcePermission.permission).filter(
+                    UsersHasResourcePermission.user_id == self.user.id,
+                    UsersHasResourcePermission.resource_type == resource_type,
+                    UsersHasResourcePermission.resource_id.in_(resource_ids))
+        for key, resource_id, value in query:
+            self._trees[(resource_type, resource_id)].add(key, value)
+
+    def match(self, permission, resource_type, resource_id):
+        """Retrieves the value of the grants for the resource.
+
+        Returns:
+            None if no grants match, otherwise a boolean.
+        """
+        key = (resource_type, str(resource_id))
+        if key not in self._trees:
+            self.load(resource_type, [resource_id])
+        return self._trees[key].match(permission)
+
+    def clear(self):
+        """Clears any loaded grants.
+        """
+        self._trees = {}
+
+
+class AclVersionStamp(object):
+
+    """Tracks the global ACL version (see watson.auth.models.AclVersion).
+
+    The version is read from the database at most once per interval, which
+    allows each worker to cheaply determine whether or not its cached ACLs
+    are stale.
+
+    Attributes:
+        interval (int): The number of seconds between reads, 0 will read the
+                        version every time it is requested.
+        version (int): The last version that was read.
+    """
+    version = None
+    _checked = 0
+
+    def __init__(self, interval=0):
+        self.interval = interval
+
+    def current(self, session):
+        """Retrieves the current ACL version.
+
+        Args:
+            session: The SQLAlchemy session to query against
+        """
+        now = time.monotonic()
+        if self.version is None or now - self._checked >= self.interval:
+            from watson.auth.models import AclVersion
+            self.version = AclVersion.current(session)
+            self._checked = now
+        return self.version
+
 
 class Acl(object):
 
@@ -13,13 +320,29 @@ class Acl(object):
     By default, the user model contains an `acl` attribute, which allows
     access to the Acl object.
 
+    Permissions granted directly to the user override those inherited from
+    their roles. Within each of those, wildcard grants are supported (see
+    PermissionTree) and a deny will always take precedence over an allow.
+
     Attributes:
         allow_default (boolean): Whether or not to allow/deny access if the
                                  permission has not been set on that role.
+        version (int): The ACL version the permissions were generated against.
+        scopes (PermissionTree): If set, only permissions matching these
+                                 scopes can be granted (for example the
+                                 scopes of the API key used to authenticate).
+        instrumentation (watson.auth.instrumentation.Instrumentation): Emits
+            an event each time the permissions are generated, defaults to the
+            hook registry if not set.
 
     """
     allow_default = True
+    version = None
+    scopes = None
+    instrumentation = None
     _permissions = None
+    _role_tree = None
+    _user_tree = None
 
     def __init__(self, user):
         """Initializes the Acl.
@@ -28,6 +351,7 @@ class Acl(object):
             watson.auth.models.UserMixin user: The user to validate against
         """
         self.user = user
+        self.resources = ResourcePermissions(user)
 
     @property
     def permissions(self):
@@ -35,19 +359,22 @@ class Acl(object):
             self._generate_user_permissions()
         return self._permissions
 
+    @timed(ACL_CHECK, check_params('role'))
     def has_role(self, role_key):
         """Validates a role against the associated roles on a user.
 
         Args:
-            role_key (string|tuple|list): The role(s) to validate against.
+            role_key (string|tuple|list|set): The role(s) to validate against.
         """
         for role in self.user.roles:
-            if isinstance(role_key, (list, tuple)) and role.key in role_key:
+            if isinstance(role_key, (list, tuple, set, frozenset)) \
+                    and role.key in role_key:
                 return True
             elif role.key == role_key:
                 return True
         return False
 
+    @timed(ACL_CHECK, check_params('permission'))
     def has_permission(self, permission):
         """Check to see if a user has a specific permission.
 
@@ -57,32 +384,132 @@ class Acl(object):
         Args:
             permission (string): The permission to find.
         """
-        if permission not in self.permissions.keys():
+        if self.scopes is not None and not self.scopes.match(permission):
+            return False
+        if self._user_tree is None:
+            self._generate_user_permissions()
+        value = self._user_tree.match(permission)
+        if value is None:
+            value = self._role_tree.match(permission)
+        if value is None:
             return self.allow_default
-        if not self.permissions[permission].value:
+        return value
+
+    def limit_to_scopes(self, scopes):
+        """Limits the permissions that can be granted to the scopes.
+
+        Args:
+            scopes (list): The permission keys (which may contain wildcards),
+                           or None to remove the limit.
+        """
+        if scopes is None:
+            self.scopes = None
+        else:
+            self.scopes = PermissionTree({scope: 1 for scope in scopes})
+
+    @timed(ACL_CHECK, check_params('resource_permission'))
+    def has_resource_permission(self, permission, resource_type, resource_id):
+        """Check to see if a user has a permission for a specific resource.
+
+        If the permission has not been set for the resource, then the
+        permission is validated via has_permission.
+
+        Args:
+            permission (string): The permission to find.
+            resource_type (string): The type of the resource, e.g. 'post'
+            resource_id (mixed): The identifier of the resource
+        """
+        if self.scopes is not None and not self.scopes.match(permission):
             return False
-        return True
+        value = self.resources.match(permission, resource_type, resource_id)
+        if value is None:
+            return self.has_permission(permission)
+        return value
+
+    def invalidate(self, version=None):
+        """Clears the generated permissions so that they will be regenerated
+        the next time they are validated.
 
+        Args:
+            version (int): The ACL version the permissions are now valid for
+        """
+        self._permissions = None
+        self._role_tree = None
+        self._user_tree = None
+        self.resources.clear()
+        self.version = version
+
+    @timed(ACL_GENERATE)
     def _generate_user_permissions(self):
         """Internal method to generate the permissions for the user.
 
         Retrieve all the permissions associated with the users roles, and then
         merge the users individual permissions to overwrite the inherited
-        role permissions.
+        role permissions. The grants are then compiled into a PermissionTree
+        for both the roles and the user.
         """
+        annotate(cache_hit=False)
+        role_grants, user_grants = self._grants()
         permissions = {}
-        for role in self.user.roles:
-            permissions.update(
-                {permission.permission.key: Permission(
-                    id=permission.permission_id,
-                    name=permission.permission.name,
-                    inherited=1,
-                    value=permission.value)
-                    for permission in role.permissions})
-        permissions.update(
-            {permission.permission.key: Permission(
-                id=permission.permission_id,
-                name=permission.permission.name,
-                inherited=0, value=permission.value)
-                for permission in self.user.permissions})
+        role_tree = PermissionTree()
+        for id_, key, name, value in role_grants:
+            role_tree.add(key, value)
+            permissions[key] = Permission(
+                id=id_, name=name, inherited=1, value=value)
+        user_tree = PermissionTree()
+        for id_, key, name, value in user_grants:
+            user_tree.add(key, value)
+            permissions[key] = Permission(
+                id=id_, name=name, inherited=0, value=value)
         self._permissions = permissions
+        self._role_tree = role_tree
+        self._user_tree = user_tree
+
+    def _grants(self):
+        """Retrieves the (id, key, name, value) of the permissions granted to
+        the roles of the user, and to the user.
+
+        If the roles and permissions of the user have not been loaded, they
+        are retrieved with a query each rather than a query per role.
+        """
+        session = object_session(self.user)
+        identity = inspect(self.user).identity
+        if session is None or identity is None or _grants_loaded(self.user):
+            return (
+                [_grant(grant)
+                 for role in self.user.roles for grant in role.permissions],
+                [_grant(grant) for grant in self.user.permissions])
+        from watson.auth.models import (
+            Permission as PermissionModel, RolesHasPermission,
+            UsersHasPermission, UsersHasRole)
+        user_id, = identity
+        role_grants = session.query(
+            RolesHasPermission.permission_id,
+            PermissionModel.key,
+            PermissionModel.name,
+            RolesHasPermission.value).join(
+                RolesHasPermission.permission).join(
+                    UsersHasRole,
+                    UsersHasRole.role_id == RolesHasPermission.role_id).filter(
+                        UsersHasRole.user_id == user_id)
+        user_grants = session.query(
+            UsersHasPermission.permission_id,
+            PermissionModel.key,
+            PermissionModel.name,
+            UsersHasPermission.value).join(
+                UsersHasPermission.permission).filter(
+                    UsersHasPermission.user_id == user_id)
+        return list(role_grants), list(user_grants)
+
+
+def _grant(grant):
+    return (grant.permission_id, grant.permission.key, grant.permission.name,
+            grant.value)
+
+
+def _grants_loaded(user):
+    unloaded = inspect(user).unloaded
+    if 'roles' in unloaded or 'permissions' in unloaded:
+        return False
+    return not any(
+        'permissions' in inspect(role).unloaded for role in user.roles)
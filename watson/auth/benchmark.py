@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import itertools
+import random
+import time
+from sqlalchemy.orm import object_session
+from watson.auth import authorization, crypto, snapshots
+
+
+def percentile(samples, percent):
+    """Retrieves the percentile of a sorted list of samples.
+
+    Args:
+        samples (list): The sorted samples
+        percent (float): The percentile, between 0 and 100
+    """
+    if not samples:
+        return 0.0
+    index = int(round(percent / 100 * (len(samples) - 1)))
+    return samples[min(len(samples) - 1, index)]
+
+
+def measure(func, iterations=100, warmup=1, setup=None):
+    """Times the execution of a function.
+
+    Args:
+        func (callable): The function to time
+        iterations (int): The number of times to call the function
+        warmup (int): The number of untimed calls made before timing
+        setup (callable): Called (untimed) before each call of the function
+
+    Returns:
+        dict: The iterations, ops per second and the mean, p50 and p99
+              latency in milliseconds
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    samples = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = clock()
+        func()
+        samples.append(clock() - started)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / total, 2) if total else None,
+        'mean_ms': round(total / iterations * 1000, 4),
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p99_ms': round(percentile(samples, 99) * 1000, 4),
+    }
+
+
+def crypto_benchmarks(rounds=(4, 10, 12), iterations=10):
+    """Benchmarks hashing and checking passwords at each cost.
+    """
+    results = {}
+    for cost in rounds:
+        password, salt = crypto.generate_password('benchmark', cost)
+        results['generate_password[{}]'.format(cost)] = measure(
+            lambda: crypto.generate_password('benchmark', cost), iterations)
+        results['check_password[{}]'.format(cost)] = measure(
+            lambda: crypto.check_password('benchmark', password, salt),
+            iterations)
+    return results
+
+
+class SyntheticUser(object):
+
+    """A user with a synthetic role graph, not backed by the database.
+    """
+
+    def __init__(self, roles=10, permissions_per_role=50, overrides=10,
+                 seed=0):
+        generator = random.Random(seed)
+        keys = ['resource{}.action{}'.format(i // 10, i % 10)
+                for i in range(roles * permissions_per_role)]
+        role_permissions = {}
+        for key in generator.sample(keys, len(keys) // 2):
+            role_permissions[key] = generator.choice((0, 1))
+        for index in range(roles):
+            role_permissions['resource{}.*'.format(index)] = 1
+        self.id = 0
+        self.keys = keys
+        self.snapshot = {
+            'id': 0,
+            'r': ['role{}'.format(i) for i in range(roles)],
+            'rp': role_permissions,
+            'up': {key: generator.choice((0, 1))
+                   for key in generator.sample(
+                       keys, min(len(keys), overrides))},
+        }
+        self.acl = snapshots.Acl(self, self.snapshot)
+
+
+def acl_benchmarks(graphs=((5, 20), (20, 100), (50, 200)), iterations=1000):
+    """Benchmarks generating snapshot ACLs and checking permissions for
+    synthetic role graphs of (roles, permissions per role).
+    """
+    results = {}
+    for roles, permissions in graphs:
+        name = '{}x{}'.format(roles, permissions)
+        user = SyntheticUser(roles, permissions)
+        keys = itertools.cycle(
+            random.Random(1).choices(user.keys, k=iterations))
+        results['snapshot_acl.generate[{}]'.format(name)] = measure(
+            lambda: snapshots.Acl(user, user.snapshot).has_permission(
+                user.keys[0]), max(1, iterations // 10))
+        results['snapshot_acl.has_permission[{}]'.format(name)] = measure(
+            lambda: user.acl.has_permission(next(keys)), iterations)
+    return results
+
+
+def user_acl_benchmarks(user, iterations=100):
+    """Benchmarks generating the ACL of a user from the database, including
+    retrieving their roles and permissions.
+
+    Args:
+        user (watson.auth.models.UserMixin): A user attached to a session
+    """
+    session = object_session(user)
+    return {'acl.generate': measure(
+        lambda: authorization.Acl(user).permissions, iterations,
+        setup=lambda: session.expire(user))}
+
+
+def authenticate_benchmarks(provider, username, password, iterations=10):
+    """Benchmarks authenticating a user via the provider.
+    """
+    return {'{}.authenticate'.format(_name(provider)): measure(
+        lambda: provider.authenticate(username, password), iterations)}
+
+
+def handle_request_benchmarks(provider, request, iterations=100):
+    """Benchmarks handling a request that has already been authenticated.
+
+    Args:
+        provider (watson.auth.providers.abc.Base): The provider
+        request (watson.http.messages.Request): An authenticated request, see
+                                                authenticated_request
+    """
+    environ = dict(request.environ)
+
+    def reset():
+        request.user = None
+        request.environ.clear()
+        request.environ.update(environ)
+
+    return {'{}.handle_request'.format(_name(provider)): measure(
+        lambda: provider.handle_request(request), iterations, setup=reset)}
+
+
+def authenticated_request(provider, user, request_class, environ,
+                          session_class='watson.http.sessions.Memory'):
+    """Creates a request that the provider will authenticate as the user.
+    """
+    request = request_class.from_environ(dict(environ), session_class)
+    token = provider.login(user, request)
+    cookies = provider.response_cookies(request)
+    if isinstance(token, str):
+        environ = dict(environ, HTTP_AUTHORIZATION='Bearer {}'.format(token))
+    if cookies:
+        environ = dict(environ, HTTP_COOKIE='; '.join(
+            '{}={}'.format(name, morsel.coded_value)
+            for name, morsel in cookies.items()))
+    authenticated = request_class.from_environ(environ, session_class)
+    if request.session:
+        authenticated._session = request.session
+    return authenticated
+
+
+def _name(provider):
+    return type(provider).__module__.rsplit('.', 1)[-1]
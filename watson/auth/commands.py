@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
+import json
+import platform
+import sys
+from datetime import datetime, timedelta
 from watson.console import command, ConsoleError
 from watson.console.decorators import arg
 from watson.common import imports
@@ -210,6 +214,230 @@ class Auth(command.Base, BaseAuthCommand):
             session.delete(user)
             self.write('Deleted user {}'.format(username))
 
+    @arg('file')
+    @arg('format', optional=True)
+    @arg('batch_size', optional=True, default=1000)
+    @arg('processes', optional=True)
+    @arg('database', optional=True)
+    @arg('auth_provider', optional=True, default='watson.auth.providers.Session')
+    def import_users(self, file, format, batch_size, processes, auth_provider, database):
+        """Bulk imports users from a CSV or JSON lines file.
+
+        Each user requires the identifier field of the user model, and either
+        a plain text `password` or an existing bcrypt `password_hash`. Any
+        other fields matching columns of the user model are also imported,
+        converted into the types of the columns.
+
+        Args:
+            file: The file to import, or - to read from stdin
+            format: Either csv or jsonl, determined from the file extension if not set
+            batch_size: The number of users inserted per transaction
+            processes: The number of processes used to hash passwords
+            database: The name of the database session.
+        """
+        session = ensure_session_in_container(self.container, database)
+        provider = self.container.get(auth_provider)
+        from watson.auth import importer
+        importer_ = importer.Importer(
+            session,
+            provider.user_model,
+            batch_size=int(batch_size),
+            processes=int(processes) if processes is not None else None,
+            encoding=provider.config['encoding'])
+
+        def progress(imported, elapsed):
+            self.write('Imported {} users ({:.0f} users/s)'.format(
+                imported, imported / elapsed if elapsed else 0))
+
+        def invalid(record, reason):
+            self.write('Skipped {}: {}'.format(
+                record.get(provider.user_model_identifier), reason))
+
+        input_ = sys.stdin if file == '-' else open(file, newline='')
+        try:
+            imported = importer_.run(
+                importer.read_records(input_, format), progress, invalid)
+        finally:
+            if input_ is not sys.stdin:
+                input_.close()
+        self.write('Imported {} users'.format(imported))
+
+    @arg('users', optional=True, default=1000)
+    @arg('permissions', optional=True, default=100)
+    @arg('roles', optional=True, default=10)
+    @arg('skew', optional=True, default=1.0)
+    @arg('batch_size', optional=True, default=10000)
+    @arg('seed', optional=True, default=0)
+    @arg('database', optional=True)
+    @arg('auth_provider', optional=True, default='watson.auth.providers.Session')
+    def generate_dataset(self, users, permissions, roles, skew, batch_size,
+                         seed, auth_provider, database):
+        """Populates the database with synthetic users, roles and permissions.
+
+        Intended for measuring how lookups, ACL compilation and exports scale
+        with the size of the data, not for production databases. Every user
+        has the password `password`.
+
+        Args:
+            users: The number of users
+            permissions: The number of permissions
+            roles: The number of roles
+            skew: The skew of role membership, 0 for a uniform distribution
+            batch_size: The number of rows inserted per transaction
+            seed: The seed of the random number generator
+            database: The name of the database session.
+        """
+        session = ensure_session_in_container(self.container, database)
+        provider = self.container.get(auth_provider)
+        from watson.auth import dataset
+        generator = dataset.Generator(
+            session,
+            provider.user_model,
+            provider.user_model_identifier,
+            users=int(users),
+            permissions=int(permissions),
+            roles=int(roles),
+            skew=float(skew),
+            batch_size=int(batch_size),
+            seed=int(seed))
+
+        def progress(table, count):
+            self.write('Inserted {} {}'.format(count, table))
+
+        counts = generator.run(progress)
+        self.write('Generated {}'.format(', '.join(
+            '{} {}'.format(count, table) for table, count in counts.items())))
+
+    @arg('username')
+    @arg('name', optional=True)
+    @arg('scopes', optional=True)
+    @arg('auth_provider', optional=True, default='watson.auth.providers.ApiKey')
+    def create_api_key(self, username, name, scopes, auth_provider):
+        """Create a new API key for a user.
+
+        Args:
+            username: The username of the user
+            name: The human readable name for the key
+            scopes: A comma separated list of permission keys to limit the key to
+        """
+        provider = self.container.get(auth_provider)
+        user = provider.get_user(username)
+        if not user:
+            raise ConsoleError('No user named {}'.format(username))
+        api_key, key = provider.generate_key(
+            user, name=name, scopes=scopes.split(',') if scopes else None)
+        self.write('Created API key {} for user {}'.format(
+            api_key.prefix, username))
+        self.write('Key: {}'.format(key))
+
+    @arg('iterations', optional=True, default=100)
+    @arg('username', optional=True)
+    @arg('password', optional=True)
+    @arg('rounds', optional=True, default='4,10,12')
+    def benchmark(self, iterations, username, password, rounds):
+        """Benchmarks the hot paths of authentication and authorization.
+
+        Outputs the throughput and latency of hashing and checking passwords
+        at each cost, and checking permissions against synthetic role graphs
+        as JSON. If a username is specified, generating the ACL of that user
+        and handling requests authenticated as them (and authenticating them
+        if a password is specified) is also benchmarked for each of the
+        configured Session and JWT providers.
+
+        Args:
+            iterations: The number of times each benchmark is run
+            username: The username of an existing user
+            password: The password of the user
+            rounds: A comma separated list of bcrypt costs
+        """
+        from watson.auth import benchmark
+        from watson.auth.providers import JWT, Session
+        from watson.http.messages import Request
+        from wsgiref import util
+        iterations = int(iterations)
+        rounds = [int(cost) for cost in str(rounds).split(',')]
+        results = {}
+        results.update(benchmark.crypto_benchmarks(
+            rounds, max(1, iterations // 10)))
+        results.update(benchmark.acl_benchmarks(iterations=iterations))
+        for name in self.config['providers'] if username else ():
+            provider = self.container.get(name)
+            user = provider.get_user(username)
+            if not user:
+                raise ConsoleError('No user named {}'.format(username))
+            results.update(benchmark.user_acl_benchmarks(user, iterations))
+            if password:
+                results.update(benchmark.authenticate_benchmarks(
+                    provider, username, password, max(1, iterations // 10)))
+            if isinstance(provider, (Session, JWT)):
+                environ = {}
+                util.setup_testing_defaults(environ)
+                request = benchmark.authenticated_request(
+                    provider, user, Request, environ)
+                results.update(benchmark.handle_request_benchmarks(
+                    provider, request, iterations))
+        self.write(json.dumps({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, indent=2, sort_keys=True))
+
+    @arg('file', optional=True, default='-')
+    @arg('format', optional=True, default='jsonl')
+    @arg('compress', action='store_true', default=False, optional=True)
+    @arg('batch_size', optional=True, default=1000)
+    @arg('database', optional=True)
+    @arg('auth_provider', optional=True, default='watson.auth.providers.Session')
+    def export(self, file, format, compress, batch_size, auth_provider, database):
+        """Exports users with their effective roles and permissions.
+
+        Args:
+            file: The file to export to, defaults to stdout
+            format: Either jsonl or csv
+            compress: Gzip the output (always enabled for files ending in .gz)
+            batch_size: The number of users loaded at a time
+            database: The name of the database session.
+        """
+        session = ensure_session_in_container(self.container, database)
+        provider = self.container.get(auth_provider)
+        from watson.auth import exporter
+        exporter_ = exporter.Exporter(
+            session,
+            provider.user_model,
+            provider.user_model_identifier,
+            batch_size=int(batch_size))
+        output = exporter.open_output(file, compress)
+        try:
+            count = exporter.write_records(exporter_.records(), output, format)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        if file != '-':
+            self.write('Exported {} users to {}'.format(count, file))
+
+    @arg('file')
+    @arg('dry_run', action='store_true', default=False, optional=True)
+    @arg('database', optional=True)
+    def sync_acl(self, file, dry_run, database):
+        """Synchronizes roles, permissions and grants with a JSON or YAML file.
+
+        Args:
+            file: The definition of the roles and permissions
+            dry_run: Only output the changes that would be made
+            database: The name of the database session.
+        """
+        session = ensure_session_in_container(self.container, database)
+        from watson.auth import sync
+        with open(file) as definition_file:
+            definition = sync.load_definition(definition_file)
+        changes = sync.AclSync(session).sync(definition, dry_run=dry_run)
+        for line in changes.summary():
+            self.write(line)
+        if not changes:
+            self.write('No changes required')
+        elif dry_run:
+            self.write('Dry run, no changes were made')
+
     @arg('database', optional=True)
     def list_permissions(self, database):
         """Lists all available permissions.
@@ -222,3 +450,35 @@ class Auth(command.Base, BaseAuthCommand):
         for permission in session.query(Permission):
             self.write('Permission: {} (key: {})'.format(
                 permission.name, permission.key))
+
+    @arg('batch_size', optional=True, default=1000)
+    @arg('database', optional=True)
+    def purge_tokens(self, batch_size, database):
+        """Deletes expired forgotten password and remember me tokens.
+
+        Rows are deleted in batches so that the tables are not locked for the
+        duration of the purge.
+
+        Args:
+            batch_size: The maximum number of rows deleted per transaction
+            database: The name of the database session.
+        """
+        session = ensure_session_in_container(self.container, database)
+        from watson.auth import models
+        now = datetime.now()
+        batch_size = int(batch_size)
+        ttl = self.config['common'].get('forgotten_password_token_ttl')
+        if ttl:
+            deleted = models.delete_in_batches(
+                session,
+                models.ForgottenPasswordToken,
+                models.ForgottenPasswordToken.created_date <= now - timedelta(seconds=ttl),
+                batch_size)
+            self.write(
+                'Deleted {} expired forgotten password tokens'.format(deleted))
+        deleted = models.delete_in_batches(
+            session,
+            models.RememberToken,
+            models.RememberToken.expires_date <= now,
+            batch_size)
+        self.write('Deleted {} expired remember me tokens'.format(deleted))
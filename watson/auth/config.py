@@ -12,6 +12,30 @@ defaults = {
         'password': {
             'max_length': 30
         },
+        'acl_version_interval': None,
+        'forgotten_password_token_ttl': 86400,
+        'forgotten_password_token_signed': False,
+    },
+    'mail_queue': {
+        'enabled': False,
+        'max_size': 1000,
+        'batch_size': 20,
+        'retries': 3,
+        'backoff': 1.0,
+    },
+    'metrics': {
+        'enabled': False,
+        'directory': None,
+        'flush_interval': 5.0,
+        'route': None,
+    },
+    'profiling': {
+        'enabled': False,
+        'directory': None,
+        'threshold': 0.5,
+        'sample_rate': 0,
+        'interval': 0.01,
+        'max_files': 100,
     },
     'default_provider': 'watson.auth.providers.Session',
     'providers': {}
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
-import bcrypt
+"""Password hashing.
+
+bcrypt is imported when a password is first hashed or checked, rather than
+when the module is imported.
+"""
 
 
 def generate_password(password, rounds=10, encoding='utf-8'):
@@ -12,6 +16,7 @@ def generate_password(password, rounds=10, encoding='utf-8'):
     Returns:
         mixed: The generated password and the salt used
     """
+    import bcrypt
     salt = bcrypt.gensalt(rounds)
     hashed_password = bcrypt.hashpw(password.encode(encoding), salt)
     return hashed_password.decode(encoding), salt.decode(encoding)
@@ -29,6 +34,7 @@ def check_password(password, existing_password, salt, encoding='utf-8'):
     Returns:
         boolean: True/False if valid or invalid
     """
+    import bcrypt
     if isinstance(salt, str):
         salt = salt.encode(encoding)
     if isinstance(existing_password, str):
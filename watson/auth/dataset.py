@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import itertools
+import random
+from sqlalchemy import func
+from watson.auth import crypto, models
+
+
+class Generator(object):
+
+    """Populates the auth tables with a synthetic dataset of a given scale.
+
+    Permissions, roles (each granted a random sample of the permissions) and
+    users are inserted with bulk inserts, committing every batch_size rows.
+    Role membership is skewed so that the first roles are the most popular
+    (the weight of each role is 1 / rank ** skew), and users are given a
+    number of individual permission overrides. Every user shares a single
+    password which is only hashed once.
+
+    The dataset is reproducible for a given seed, and keys and identifiers
+    are prefixed so that it can be generated alongside existing data.
+
+    Attributes:
+        session: The SQLAlchemy session
+        user_model: The user model class
+        identifier (string): The name of the identifier field of the user
+        users (int): The number of users
+        permissions (int): The number of permissions
+        roles (int): The number of roles
+        permissions_per_role (int): The number of permissions granted to each role
+        roles_per_user (int): The maximum number of roles given to each user
+        overrides_per_user (int): The number of permissions given to each user
+        skew (float): The skew of role membership, 0 for a uniform distribution
+        deny_ratio (float): The proportion of grants that deny the permission
+        password (string): The password of every user
+        rounds (int): The complexity of the hashing
+        batch_size (int): The number of rows inserted per transaction
+        prefix (string): The prefix of the keys and identifiers
+        seed (int): The seed of the random number generator
+    """
+
+    def __init__(self, session, user_model, identifier='username',
+                 users=1000, permissions=100, roles=10,
+                 permissions_per_role=20, roles_per_user=2,
+                 overrides_per_user=1, skew=1.0, deny_ratio=0.1,
+                 password='password', rounds=4, batch_size=10000,
+                 prefix='synthetic', seed=0):
+        self.session = session
+        self.user_model = user_model
+        self.identifier = identifier
+        self.users = users
+        self.permissions = permissions
+        self.roles = roles
+        self.permissions_per_role = min(permissions_per_role, permissions)
+        self.roles_per_user = min(roles_per_user, roles)
+        self.overrides_per_user = min(overrides_per_user, permissions)
+        self.skew = skew
+        self.deny_ratio = deny_ratio
+        self.password = password
+        self.rounds = rounds
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.seed = seed
+
+    def permission_key(self, index):
+        return '{}.resource{}.action{}'.format(
+            self.prefix, index // 10, index % 10)
+
+    def role_key(self, index):
+        return '{}.role{}'.format(self.prefix, index)
+
+    def user_identifier(self, index):
+        return '{}.user{}'.format(self.prefix, index)
+
+    def _next_id(self, model):
+        return (self.session.query(func.max(model.id)).scalar() or 0) + 1
+
+    def _value(self, generator):
+        return 0 if generator.random() < self.deny_ratio else 1
+
+    def _insert(self, model, mappings):
+        counted = 0
+        for batch in _batches(mappings, self.batch_size):
+            try:
+                self.session.bulk_insert_mappings(model, batch)
+                self.session.commit()
+            except Exception:
+                self.session.rollback()
+                raise
+            counted += len(batch)
+        return counted
+
+    def _permissions(self, first_id):
+        for index in range(self.permissions):
+            key = self.permission_key(index)
+            yield {'id': first_id + index, 'key': key, 'name': key}
+
+    def _roles(self, first_id):
+        for index in range(self.roles):
+            key = self.role_key(index)
+            yield {'id': first_id + index, 'key': key, 'name': key}
+
+    def _grants(self, generator, role_ids, permission_ids):
+        for role_id in role_ids:
+            for permission_id in generator.sample(
+                    permission_ids, self.permissions_per_role):
+                yield {'role_id': role_id, 'permission_id': permission_id,
+                       'value': self._value(generator)}
+
+    def _users(self, generator, first_id, role_ids, permission_ids, hashed):
+        """Generates the users along with their roles and permissions.
+        """
+        password, salt = hashed
+        weights = list(itertools.accumulate(
+            1 / (rank + 1) ** self.skew for rank in range(len(role_ids))))
+        for index in range(self.users):
+            user_id = first_id + index
+            user = {
+                'id': user_id,
+                self.identifier: self.user_identifier(index),
+                '_password': password,
+                'salt': salt,
+            }
+            roles = set(generator.choices(
+                role_ids, cum_weights=weights, k=self.roles_per_user)) \
+                if role_ids else ()
+            memberships = [{'user_id': user_id, 'role_id': role_id}
+                           for role_id in roles]
+            overrides = [
+                {'user_id': user_id, 'permission_id': permission_id,
+                 'value': self._value(generator)}
+                for permission_id in generator.sample(
+                    permission_ids, self.overrides_per_user)]
+            yield user, memberships, overrides
+
+    def run(self, progress=None):
+        """Generates and inserts the dataset.
+
+        Args:
+            progress (callable): Called with the name of the table and the
+                                 number of rows inserted into it
+
+        Returns:
+            dict: The number of rows inserted into each table
+        """
+        generator = random.Random(self.seed)
+        counts = {}
+
+        def record(name, count):
+            counts[name] = counts.get(name, 0) + count
+            if progress:
+                progress(name, counts[name])
+
+        first_permission = self._next_id(models.Permission)
+        record('permissions', self._insert(
+            models.Permission, self._permissions(first_permission)))
+        permission_ids = list(range(
+            first_permission, first_permission + self.permissions))
+        first_role = self._next_id(models.Role)
+        record('roles', self._insert(models.Role, self._roles(first_role)))
+        role_ids = list(range(first_role, first_role + self.roles))
+        record('grants', self._insert(
+            models.RolesHasPermission,
+            self._grants(generator, role_ids, permission_ids)))
+        hashed = crypto.generate_password(self.password, self.rounds)
+        users = self._users(
+            generator, self._next_id(self.user_model), role_ids,
+            permission_ids, hashed)
+        for batch in _batches(users, self.batch_size):
+            record('users', self._insert(
+                self.user_model, [user for user, _, _ in batch]))
+            record('memberships', self._insert(
+                models.UsersHasRole,
+                [membership for _, memberships, _ in batch
+                 for membership in memberships]))
+            record('overrides', self._insert(
+                models.UsersHasPermission,
+                [override for _, _, overrides in batch
+                 for override in overrides]))
+        models.AclVersion.increment(self.session.connection())
+        self.session.commit()
+        return counts
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import json
+import sys
+from watson.auth import models
+
+FIELDS = ('id', 'identifier', 'roles', 'permissions', 'denied')
+
+
+class Exporter(object):
+
+    """Streams users with their effective roles and permissions.
+
+    The roles (and the permissions granted to them) are loaded once, users
+    are then retrieved a page at a time (keyed on their id, so no cursor is
+    left open between pages) and the roles and permissions of each page of
+    users are loaded with a query each, so memory use remains constant
+    regardless of the number of users.
+
+    Attributes:
+        session: The SQLAlchemy session
+        user_model: The user model class
+        identifier (string): The name of the identifier field of the user
+        batch_size (int): The number of users loaded at a time
+    """
+
+    def __init__(self, session, user_model, identifier, batch_size=1000):
+        self.session = session
+        self.user_model = user_model
+        self.identifier = identifier
+        self.batch_size = batch_size
+
+    def _roles(self):
+        roles = {role_id: (key, {}) for role_id, key in self.session.query(
+            models.Role.id, models.Role.key)}
+        query = self.session.query(
+            models.RolesHasPermission.role_id,
+            models.Permission.key,
+            models.RolesHasPermission.value).join(models.Permission)
+        for role_id, key, value in query:
+            roles[role_id][1][key] = 1 if value else 0
+        return roles
+
+    def _users(self):
+        identifier = getattr(self.user_model, self.identifier)
+        last_id = None
+        while True:
+            query = self.session.query(
+                self.user_model.id, identifier).order_by(self.user_model.id)
+            if last_id is not None:
+                query = query.filter(self.user_model.id > last_id)
+            batch = query.limit(self.batch_size).all()
+            if batch:
+                yield batch
+            if len(batch) < self.batch_size:
+                return
+            last_id = batch[-1][0]
+
+    def records(self):
+        """Generates a record for each user.
+
+        Permissions granted to the user override those inherited from their
+        roles, and a deny from any role wins over an allow from another.
+
+        Returns:
+            generator: dicts of id, identifier, roles, permissions (allowed
+                       keys) and denied (denied keys)
+        """
+        roles = self._roles()
+        for batch in self._users():
+            ids = [id_ for id_, _ in batch]
+            user_roles = {}
+            for user_id, role_id in self.session.query(
+                    models.UsersHasRole.user_id,
+                    models.UsersHasRole.role_id).filter(
+                        models.UsersHasRole.user_id.in_(ids)):
+                user_roles.setdefault(user_id, []).append(role_id)
+            user_permissions = {}
+            for user_id, key, value in self.session.query(
+                    models.UsersHasPermission.user_id,
+                    models.Permission.key,
+                    models.UsersHasPermission.value).join(
+                        models.Permission).filter(
+                            models.UsersHasPermission.user_id.in_(ids)):
+                user_permissions.setdefault(user_id, {})[key] = 1 if value else 0
+            for user_id, identifier in batch:
+                permissions = {}
+                role_keys = []
+                for role_id in user_roles.get(user_id, ()):
+                    if role_id not in roles:
+                        continue
+                    key, grants = roles[role_id]
+                    role_keys.append(key)
+                    for permission, value in grants.items():
+                        permissions[permission] = min(
+                            permissions.get(permission, value), value)
+                permissions.update(user_permissions.get(user_id, {}))
+                yield {
+                    'id': user_id,
+                    'identifier': identifier,
+                    'roles': sorted(role_keys),
+                    'permissions': sorted(
+                        key for key, value in permissions.items() if value),
+                    'denied': sorted(
+                        key for key, value in permissions.items() if not value),
+                }
+
+
+def open_output(path, compress=False):
+    """Opens the file to export to.
+
+    Args:
+        path (string): The path of the file, or - for stdout
+        compress (boolean): Whether or not to gzip the output, files ending
+                            in .gz are always compressed
+    """
+    if path == '-':
+        if compress:
+            return gzip.open(sys.stdout.buffer, 'wt', newline='')
+        return sys.stdout
+    if compress or path.endswith('.gz'):
+        return gzip.open(path, 'wt', newline='')
+    return open(path, 'w', newline='')
+
+
+def write_records(records, file, format='jsonl'):
+    """Writes the records to the file one at a time.
+
+    Args:
+        records (iterable): The records from Exporter.records
+        file: The open file to write to
+        format (string): Either 'jsonl' or 'csv'
+
+    Returns:
+        int: The number of records written
+    """
+    count = 0
+    if format == 'csv':
+        writer = csv.DictWriter(file, FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow({
+                key: ' '.join(value) if isinstance(value, list) else value
+                for key, value in record.items()})
+            count += 1
+    else:
+        for record in records:
+            file.write(json.dumps(record, separators=(',', ':')))
+            file.write('\n')
+            count += 1
+    return count
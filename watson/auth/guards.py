@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import collections
+from watson.common import imports
+from watson.framework import controllers, exceptions
+
+
+CONTEXT_KEY = 'auth_guard'
+CHALLENGE_ENVIRON_KEY = 'watson.auth.challenge'
+
+
+Guard = collections.namedtuple(
+    'Guard',
+    'provider policy login_redirect redirect_unauthenticated challenge')
+Guard.__doc__ = """The authorization metadata of a decorated controller action.
+
+Attributes:
+    provider (string): The dependency name of the provider
+    policy (watson.auth.authorization.Policy): The compiled policy
+    login_redirect (string): The URL/route unauthenticated users are sent to
+    redirect_unauthenticated (boolean): Whether or not unauthenticated users
+                                        may be redirected by the decorator
+    challenge (boolean): Whether or not unauthenticated requests are issued
+                         the WWW-Authenticate challenge of the provider
+"""
+
+
+def register(func, guard):
+    """Attaches the guard to a decorated controller action.
+
+    Args:
+        func (callable): The decorated action
+        guard (Guard): The guard for the action
+    """
+    func.__auth_guard__ = guard
+    return func
+
+
+def is_enforced(controller, guard):
+    """Determine whether or not the guard has already been enforced for the
+    current request by the route listener.
+
+    Args:
+        controller (watson.framework.controllers.Base): The executing controller
+        guard (Guard): The guard of the action being executed
+    """
+    event = getattr(controller, 'event', None)
+    if not event:
+        return False
+    return event.params.get('context', {}).get(CONTEXT_KEY) is guard
+
+
+class LazyProvider(object):
+
+    """Resolves a provider from the container of a controller.
+
+    The provider is only retrieved from the container the first time it is
+    required (and again only if the container changes), rather than on every
+    request.
+
+    Attributes:
+        name (string): The dependency name of the provider
+    """
+    __slots__ = ('name', '_resolved')
+
+    def __init__(self, name):
+        self.name = name
+        self._resolved = (None, None)
+
+    def __call__(self, controller):
+        """Retrieves the provider.
+
+        Args:
+            controller (watson.framework.controllers.Base): The executing controller
+        """
+        container, provider = self._resolved
+        if container is not controller.container:
+            container = controller.container
+            provider = container.get(self.name)
+            self._resolved = (container, provider)
+        return provider
+
+
+class RouteGuards(object):
+
+    """A table of the guarded controller actions for each route.
+
+    The table is built once when the application is initialized, allowing
+    requests to be rejected before the controller is instantiated.
+    """
+
+    def __init__(self):
+        self.routes = {}
+
+    def build(self, router):
+        """Populates the table from the routes within the router.
+
+        Args:
+            router (watson.routing.routers.Base): The application router
+        """
+        for name, route in router:
+            controller = route.options.get('controller')
+            if not controller:
+                continue
+            try:
+                controller_class = imports.load_definition_from_string(
+                    controller)
+            except Exception:
+                continue
+            guards = {}
+            for attr in dir(controller_class):
+                guard = getattr(
+                    getattr(controller_class, attr, None),
+                    '__auth_guard__', None)
+                if guard:
+                    guards[attr] = guard
+            if guards:
+                is_rest = issubclass(controller_class, controllers.Rest)
+                self.routes[name] = (is_rest, guards)
+
+    def match(self, route_match, request):
+        """Retrieves the guard for the action that will be executed.
+
+        Args:
+            route_match (watson.routing.routes.RouteMatch): The matched route
+            request (watson.http.messages.Request): The HTTP request
+        """
+        entry = self.routes.get(route_match.route.name)
+        if not entry:
+            return None
+        is_rest, guards = entry
+        if is_rest:
+            method = request.method
+        else:
+            method = '{}_action'.format(
+                route_match.params.get('action') or 'index')
+        return guards.get(method)
+
+    def enforce(self, guard, provider, request, route_match):
+        """Validates the request against the guard.
+
+        If the guard challenges unauthenticated requests, the challenge is
+        stored in the environ of the request so that it can be added to the
+        response (see watson.auth.listeners.Render).
+
+        Raises:
+            watson.framework.exceptions.ApplicationError if the user is
+            unauthenticated or unauthorized.
+
+        Returns:
+            boolean: Whether or not the guard was enforced, unauthenticated
+                     users that should be redirected are left for the
+                     decorator to handle.
+        """
+        user = getattr(request, 'user', None)
+        if not user:
+            if guard.redirect_unauthenticated and (
+                    guard.login_redirect or provider.config.get('login_route')):
+                return False
+            if guard.challenge:
+                request.environ[CHALLENGE_ENVIRON_KEY] = provider.challenge()
+            raise exceptions.ApplicationError(
+                status_code=provider.unauthenticated_status_code,
+                message='You must be logged in to view this page.')
+        if not provider.authorize(user, guard.policy, route_match.params):
+            raise exceptions.ApplicationError(
+                status_code=provider.unauthorized_status_code,
+                message='You are not authorized to view this page.')
+        return True
+
+    def __len__(self):
+        return len(self.routes)
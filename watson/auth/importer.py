@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+import csv
+import datetime
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from sqlalchemy import inspect
+from watson.auth import crypto
+
+BCRYPT_SALT_LENGTH = 29
+BOOLEANS = {
+    'true': True, 't': True, 'yes': True, 'y': True, '1': True,
+    'false': False, 'f': False, 'no': False, 'n': False, '0': False}
+
+
+def read_records(file, format=None):
+    """Streams user records from a CSV or JSON lines file.
+
+    Args:
+        file: The open file to read from
+        format (string): Either 'csv' or 'jsonl', if not specified it is
+                         determined from the extension of the file
+
+    Returns:
+        generator: dicts of the fields of each user
+    """
+    if not format:
+        name = getattr(file, 'name', '')
+        format = 'csv' if str(name).lower().endswith('.csv') else 'jsonl'
+    if format == 'csv':
+        for record in csv.DictReader(file):
+            yield record
+    else:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def validate_record(record):
+    """Validates a user record before it is hashed and imported.
+
+    Args:
+        record (dict): The user record
+
+    Returns:
+        string: The reason the record is invalid, None if it is valid
+    """
+    if not record.get('password') and not record.get('password_hash'):
+        return 'A password or password_hash is required'
+    return None
+
+
+def column_converters(model):
+    """Retrieves the functions that convert the values of a record into the
+    types of the columns of the model.
+
+    Columns of strings (or of types that have no python type) are not
+    converted.
+
+    Args:
+        model: The model class
+
+    Returns:
+        dict: The converter of each column attribute
+    """
+    converters = {}
+    for attr in inspect(model).column_attrs:
+        try:
+            python_type = attr.columns[0].type.python_type
+        except NotImplementedError:
+            continue
+        if python_type is not str:
+            converters[attr.key] = functools.partial(
+                _convert_value, python_type)
+    return converters
+
+
+def convert_record(record, converters):
+    """Converts the values of a user record into the types of their columns.
+
+    Empty values are converted to None.
+
+    Args:
+        record (dict): The user record
+        converters (dict): The converters of each column, see
+                           column_converters
+
+    Returns:
+        dict: The converted record
+
+    Raises:
+        ValueError if a value can not be converted
+    """
+    record = dict(record)
+    for key, convert in converters.items():
+        if key in record:
+            try:
+                record[key] = convert(record[key])
+            except (TypeError, ValueError):
+                raise ValueError('Invalid value for {0}: {1!r}'.format(
+                    key, record[key]))
+    return record
+
+
+def _convert_value(python_type, value):
+    if value is None or isinstance(value, python_type):
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if python_type is bool:
+            if value.lower() not in BOOLEANS:
+                raise ValueError(value)
+            return BOOLEANS[value.lower()]
+        if python_type is datetime.datetime:
+            return datetime.datetime.fromisoformat(value)
+        if python_type is datetime.date:
+            return datetime.date.fromisoformat(value)
+        if python_type is datetime.time:
+            return datetime.time.fromisoformat(value)
+    return python_type(value)
+
+
+def hash_record(record, rounds=10, encoding='utf-8'):
+    """Hashes the plain text password of a user record.
+
+    Records that already contain a `password_hash` are not hashed again, the
+    salt is extracted from the hash if it is not supplied.
+
+    Args:
+        record (dict): The user record
+        rounds (int): The complexity of the hashing
+
+    Returns:
+        dict: The record with `password_hash` and `salt` set
+
+    Raises:
+        ValueError if the record is invalid, see validate_record
+    """
+    reason = validate_record(record)
+    if reason:
+        raise ValueError(reason)
+    record = dict(record)
+    password = record.pop('password', None)
+    if record.get('password_hash'):
+        record.setdefault('salt', record['password_hash'][:BCRYPT_SALT_LENGTH])
+    elif password:
+        record['password_hash'], record['salt'] = crypto.generate_password(
+            password, rounds, encoding)
+    return record
+
+
+class Importer(object):
+
+    """Bulk imports users, hashing their passwords across a process pool.
+
+    Records are streamed, so the input can be larger than memory. Records
+    are read a batch at a time, and the passwords of a batch are hashed by
+    the pool while the previous batch is being inserted, so at most two
+    batches are held in memory. Each batch is inserted with a single bulk
+    insert and commit. The values of the records are converted into the types
+    of their columns (see convert_record), and invalid records (see
+    validate_record) or those with values that can not be converted are
+    skipped.
+
+    Attributes:
+        session: The SQLAlchemy session
+        user_model: The user model class
+        batch_size (int): The number of users inserted per transaction
+        processes (int): The number of processes used to hash passwords, if 0
+                         passwords are hashed in the current process
+        rounds (int): The complexity of the hashing
+    """
+
+    def __init__(self, session, user_model, batch_size=1000, processes=None,
+                 rounds=10, encoding='utf-8'):
+        self.session = session
+        self.user_model = user_model
+        self.batch_size = batch_size
+        self.processes = os.cpu_count() if processes is None else processes
+        self.rounds = rounds
+        self.encoding = encoding
+
+    @property
+    def columns(self):
+        return {attr.key for attr in inspect(self.user_model).column_attrs}
+
+    def _mapping(self, record, columns):
+        mapping = {key: value for key, value in record.items()
+                   if key in columns and key != '_password'}
+        mapping['_password'] = record.get('password_hash')
+        return mapping
+
+    @property
+    def converters(self):
+        return column_converters(self.user_model)
+
+    def _batches(self, records, invalid):
+        converters = self.converters
+        records = iter(records)
+        while True:
+            read = 0
+            batch = []
+            for record in itertools.islice(records, self.batch_size):
+                read += 1
+                reason = validate_record(record)
+                if not reason:
+                    try:
+                        record = convert_record(record, converters)
+                    except ValueError as exc:
+                        reason = str(exc)
+                if reason:
+                    if invalid:
+                        invalid(record, reason)
+                    continue
+                batch.append(record)
+            if not read:
+                return
+            if batch:
+                yield batch
+
+    def _hashed(self, records, pool, invalid):
+        hasher = functools.partial(
+            hash_record, rounds=self.rounds, encoding=self.encoding)
+        batches = self._batches(records, invalid)
+        if pool is None:
+            for batch in batches:
+                yield [hasher(record) for record in batch]
+            return
+        pending = None
+        for batch in batches:
+            result = pool.map_async(
+                hasher, batch, max(1, len(batch) // (self.processes * 4)))
+            if pending is not None:
+                yield pending.get()
+            pending = result
+        if pending is not None:
+            yield pending.get()
+
+    def run(self, records, progress=None, invalid=None):
+        """Imports the records.
+
+        Args:
+            records (iterable): The user records, see read_records
+            progress (callable): Called with the number of users imported and
+                                 the elapsed seconds after each batch
+            invalid (callable): Called with each record that is skipped and
+                                the reason it is invalid (or could not be
+                                converted)
+
+        Returns:
+            int: The number of users imported
+        """
+        columns = self.columns
+        imported = 0
+        started = time.monotonic()
+        pool = None
+        if self.processes:
+            pool = multiprocessing.Pool(self.processes)
+        try:
+            for batch in self._hashed(records, pool, invalid):
+                imported += self._insert(
+                    [self._mapping(record, columns) for record in batch])
+                if progress:
+                    progress(imported, time.monotonic() - started)
+        finally:
+            if pool:
+                pool.terminate()
+        return imported
+
+    def _insert(self, mappings):
+        try:
+            self.session.bulk_insert_mappings(self.user_model, mappings)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        return len(mappings)
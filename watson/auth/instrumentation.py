@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""Timing events for the hot paths of authentication and authorization.
+
+Providers and ACLs emit an event each time a user is authenticated, their
+password is verified, they are retrieved or resolved from a request, a JWT
+is decoded, the permissions of a user are generated or a role or permission
+is checked. Events are triggered through the watson event dispatcher
+(the application dispatcher once watson.auth.listeners.Init has run), or the
+module level hook registry if no dispatcher has been configured.
+
+The params of each event contain:
+
+    duration (float): The time taken in seconds
+    queries (int): The number of SQL statements executed (in the same thread)
+    cache_hit (boolean): Whether a cache was used, None if not applicable
+    nested (boolean): Whether the event occurred within another timed event
+
+along with any other params specific to the event. Events are only created
+when something is listening for them, so timing is skipped entirely
+otherwise.
+
+Example:
+
+.. code-block:: python
+
+    from watson.auth import instrumentation
+
+    def record(event):
+        statsd.timing(event.name, event.params['duration'])
+
+    instrumentation.hooks.add(instrumentation.GET_USER, record)
+"""
+import functools
+import threading
+import time
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
+from watson.events import types
+
+AUTHENTICATE = 'watson.auth.authenticate'
+PASSWORD_CHECK = 'watson.auth.password.check'
+GET_USER = 'watson.auth.get_user'
+HANDLE_REQUEST = 'watson.auth.handle_request'
+JWT_DECODE = 'watson.auth.jwt.decode'
+ACL_GENERATE = 'watson.auth.acl.generate'
+ACL_CHECK = 'watson.auth.acl.check'
+
+EVENTS = (AUTHENTICATE, PASSWORD_CHECK, GET_USER, HANDLE_REQUEST, JWT_DECODE,
+          ACL_GENERATE, ACL_CHECK)
+
+_local = threading.local()
+_counting = False
+_counting_lock = threading.Lock()
+
+
+class Hooks(object):
+
+    """A lightweight registry of callbacks for timing events, used when no
+    event dispatcher has been configured.
+    """
+
+    def __init__(self):
+        self._hooks = {}
+
+    def add(self, name, callback):
+        """Registers a callback for the event.
+
+        Args:
+            name (string): The name of the event, see EVENTS
+            callback (callable): Called with the watson.events.types.Event
+        """
+        self._hooks[name] = self._hooks.get(name, ()) + (callback,)
+
+    def remove(self, name, callback=None):
+        """Removes a callback, or all callbacks if not specified.
+        """
+        if callback is None:
+            self._hooks.pop(name, None)
+        else:
+            self._hooks[name] = tuple(
+                hook for hook in self._hooks.get(name, ())
+                if hook != callback)
+
+    def __contains__(self, name):
+        return bool(self._hooks.get(name))
+
+    def trigger(self, event):
+        for callback in self._hooks.get(event.name, ()):
+            callback(event)
+
+
+hooks = Hooks()
+
+
+class Timer(object):
+
+    """Times a block of code and emits the event once it has finished.
+    """
+
+    def __init__(self, instrumentation, name, target, params):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.target = target
+        self.params = dict(cache_hit=None, **params)
+        self.queries = 0
+
+    def __enter__(self):
+        stack = _stack()
+        self.params['nested'] = bool(stack)
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.started
+        stack = _stack()
+        stack.remove(self)
+        if stack:
+            stack[-1].queries += self.queries
+        self.params['duration'] = duration
+        self.params['queries'] = self.queries
+        self.instrumentation.emit(self.name, self.target, self.params)
+
+
+class Instrumentation(object):
+
+    """Emits timing events through an event dispatcher or hook registry.
+
+    Attributes:
+        dispatcher (watson.events.dispatcher.EventDispatcher): The dispatcher
+                                                               events are
+                                                               triggered on
+        hooks (Hooks): The registry used if there is no dispatcher
+    """
+
+    def __init__(self, dispatcher=None, hooks=hooks):
+        self.dispatcher = dispatcher
+        self.hooks = hooks
+
+    def listening(self, name):
+        """Whether or not anything is listening for the event.
+        """
+        if self.dispatcher is not None:
+            return bool(self.dispatcher.events.get(name))
+        return name in self.hooks
+
+    def timer(self, name, target, **params):
+        """Creates a timer for the event, see timed.
+        """
+        _count_queries()
+        return Timer(self, name, target, params)
+
+    def emit(self, name, target, params):
+        event = types.Event(name, target=target, params=params)
+        if self.dispatcher is not None:
+            self.dispatcher.trigger(event)
+        else:
+            self.hooks.trigger(event)
+        return event
+
+
+default = Instrumentation()
+
+
+def timed(name, params=None):
+    """Times the decorated method and emits the event.
+
+    The instrumentation is retrieved from the `instrumentation` attribute of
+    the instance, falling back to the default (hook registry) if not set.
+
+    Args:
+        name (string): The name of the event
+        params (callable): Called with the result and arguments of the method,
+                           returns a dict of additional params for the event
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = self.instrumentation or default
+            if not instrumentation.listening(name):
+                return func(self, *args, **kwargs)
+            with instrumentation.timer(name, self) as timer:
+                result = func(self, *args, **kwargs)
+                if params:
+                    timer.params.update(params(result, *args, **kwargs))
+                return result
+        return wrapper
+    return decorator
+
+
+def authenticate_params(result, username, password):
+    """The params of an authenticate event, whether or not the credentials
+    were valid.
+    """
+    return {'authenticated': result is not None}
+
+
+def handle_request_params(result, request):
+    """The params of a handle request event, whether or not the provider
+    resolved a user.
+    """
+    return {'authenticated': bool(getattr(request, 'user', None))}
+
+
+def check_params(check):
+    """Creates the params of an ACL check event, see timed.
+
+    Args:
+        check (string): The type of check, e.g. 'role' or 'permission'
+    """
+    def params(result, key, *args, **kwargs):
+        return {'check': check, 'key': key, 'result': bool(result)}
+    return params
+
+
+def annotate(**params):
+    """Adds params (such as cache_hit) to the innermost running timer.
+
+    Does nothing if there is no timer running in the current thread.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1].params.update(params)
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _increment(*args):
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1].queries += 1
+
+
+def _count_queries():
+    global _counting
+    if _counting:
+        return
+    with _counting_lock:
+        if not _counting:
+            sqlalchemy_event.listen(Engine, 'before_cursor_execute', _increment)
+            _counting = True
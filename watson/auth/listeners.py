@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 from watson.common import datastructures, imports
-from watson.console.command import find_commands_in_module
 from watson.di import ContainerAware
 from watson.framework import events
-from watson.auth import config, commands
+from watson.auth import config, guards, profiling
+from watson.auth.providers import abc
 
 
 class Init(ContainerAware):
@@ -15,8 +15,12 @@ class Init(ContainerAware):
         self.ensure_database_initialised(event)
         self.update_config(event.target)
         self.setup_providers(event.target)
+        self.setup_acl_versioning(event.target)
+        self.setup_metrics(event.target)
+        self.setup_profiling(event.target)
         self.setup_forgotten_password_manager(event.target)
         self.load_default_commands(event.target.config)
+        self.setup_route_guards(event.target)
         self.setup_route_listener()
 
     def ensure_database_initialised(self, event):
@@ -28,6 +32,8 @@ class Init(ContainerAware):
             listener(event)
 
     def load_default_commands(self, config):
+        from watson.console.command import find_commands_in_module
+        from watson.auth import commands
         existing_commands = config.get('commands', [])
         db_commands = find_commands_in_module(commands)
         db_commands.extend(existing_commands)
@@ -42,6 +48,12 @@ class Init(ContainerAware):
             'watson.auth', 'views')
 
     def setup_providers(self, app):
+        app.container.add_definition('auth_instrumentation', {
+            'item': 'watson.auth.instrumentation.Instrumentation',
+            'init': {
+                'dispatcher': 'shared_event_dispatcher'
+            }
+        })
         auth_config = app.config['auth']
         if not auth_config['providers']:
             auth_config['providers'][auth_config['default_provider']] = {}
@@ -62,19 +74,73 @@ class Init(ContainerAware):
                 'session': lambda container: container.get('sqlalchemy_session_{0}'.format(container.get('application.config')['auth']['providers'][provider]['session'])),
             }
         }
-        dependency_config.update(app.config['dependencies'][
-            'definitions'].get(provider, {}))
+        definition = app.config['dependencies']['definitions'].get(
+            provider, {})
+        dependency_config.update(definition)
+        dependency_config['property'] = dict(
+            {'instrumentation': 'auth_instrumentation'},
+            **definition.get('property', {}))
         app.container.add_definition(provider, dependency_config)
 
+    def setup_acl_versioning(self, app):
+        from watson.auth import models
+        sessions = {
+            provider_config['session']
+            for provider_config in app.config['auth']['providers'].values()}
+        for session in sessions:
+            models.track_acl_version(
+                self.container.get('sqlalchemy_session_{0}'.format(session)))
+
+    def setup_metrics(self, app):
+        metrics_config = app.config['auth']['metrics'].copy()
+        route = metrics_config.pop('route')
+        if not metrics_config.pop('enabled'):
+            return
+        from watson.auth import metrics
+        registry = metrics.Registry(**metrics_config)
+        app.container.add('auth_metrics', registry)
+        metrics.Collector(registry).listen(
+            self.container.get('shared_event_dispatcher'))
+        if route:
+            app.container.get('router').add_definition({
+                'name': 'auth_metrics',
+                'path': route,
+                'options': {
+                    'controller': 'watson.auth.metrics.Controller'
+                }
+            })
+
+    def setup_profiling(self, app):
+        profiling_config = app.config['auth']['profiling'].copy()
+        if not profiling_config.pop('enabled'):
+            return
+        profiler = profiling.Profiler(**profiling_config)
+        app.container.add('auth_profiler', profiler)
+        profiling.install(profiler)
+
     def setup_forgotten_password_manager(self, app):
+        init = {
+            'mailer': 'mailer',
+            'email_address_field': app.config['auth']['common']['model']['email_address']
+        }
+        mail_queue = app.config['auth']['mail_queue'].copy()
+        if mail_queue.pop('enabled'):
+            mail_queue['mailer'] = 'mailer'
+            app.container.add_definition('auth_mail_queue', {
+                'item': 'watson.auth.mail.Queue',
+                'init': mail_queue
+            })
+            init['mail_queue'] = 'auth_mail_queue'
         app.container.add_definition('auth_forgotten_password_token_manager', {
             'item': 'watson.auth.managers.ForgottenPasswordToken',
-            'init': {
-                'mailer': 'mailer',
-                'email_address_field': app.config['auth']['common']['model']['email_address']
-            }
+            'init': init
         })
 
+    def setup_route_guards(self, app):
+        route_guards = guards.RouteGuards()
+        route_guards.build(app.container.get('router'))
+        app.container.add('auth_route_guards', route_guards)
+
     def setup_route_listener(self):
         dispatcher = self.container.get('shared_event_dispatcher')
         dispatcher.add(
@@ -82,17 +148,89 @@ class Init(ContainerAware):
             self.container.get('watson.auth.listeners.Route'),
             1,
             False)
+        dispatcher.add(
+            events.DISPATCH_EXECUTE,
+            self.container.get('watson.auth.listeners.Dispatch'),
+            0,
+            False)
+        dispatcher.add(
+            events.RENDER_VIEW,
+            self.container.get('watson.auth.listeners.Render'),
+            0,
+            False)
 
 
 class Route(ContainerAware):
 
     """Listens for a route event and attempts to inject the user into the
     request if one has been authenticated.
+
+    If the matched route executes a guarded controller action, the guard is
+    enforced before the controller is instantiated.
     """
 
+    @profiling.profiled()
     def __call__(self, event):
         auth_config = self.container.get('application').config['auth']
-        request = event.params['context']['request']
-        for provider in auth_config['providers']:
-            provider = self.container.get(provider)
+        context = event.params['context']
+        request = context['request']
+        authenticated_by = None
+        for name in auth_config['providers']:
+            provider = self.container.get(name)
+            user = getattr(request, 'user', None)
             provider.handle_request(request)
+            if request.user and request.user is not user:
+                authenticated_by = provider
+        if getattr(request, 'user', None) and authenticated_by:
+            acl = request.user.acl
+            acl.resources.clear()
+            acl.instrumentation = authenticated_by.instrumentation
+            authenticated_by.refresh_acl(request.user)
+        self.enforce_guard(context)
+
+    def enforce_guard(self, context):
+        route_match = context.get('route_match')
+        if not route_match:
+            return
+        route_guards = self.container.get('auth_route_guards')
+        request = context['request']
+        guard = route_guards.match(route_match, request)
+        if guard and route_guards.enforce(
+                guard, self.container.get(guard.provider), request,
+                route_match):
+            context[guards.CONTEXT_KEY] = guard
+
+
+class Dispatch(ContainerAware):
+
+    """Listens for a dispatch event and adds any cookies set by the providers
+    during the request to the response.
+
+    Registered with a lower priority than the application dispatch listener
+    so that it is run once the controller has been executed.
+    """
+
+    def __call__(self, event):
+        context = event.params['context']
+        cookies = context['request'].environ.get(abc.COOKIES_ENVIRON_KEY)
+        response = context.get('response')
+        if cookies and response is not None:
+            response.cookies.merge(cookies)
+
+
+class Render(ContainerAware):
+
+    """Listens for a render event and adds the WWW-Authenticate challenge of
+    a request rejected by a route guard to the response.
+
+    Registered with a lower priority than the application render listener so
+    that the response of the rejected request has been created.
+    """
+
+    def __call__(self, event):
+        context = event.params['context']
+        challenge = context['request'].environ.get(
+            guards.CHALLENGE_ENVIRON_KEY)
+        response = context.get('response')
+        if challenge and response is not None:
+            response.headers.add('WWW-Authenticate', challenge, replace=True)
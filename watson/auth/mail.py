@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import atexit
+import copy
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Queue(object):
+
+    """Dispatches mail messages from a bounded queue in a background thread.
+
+    Messages are rendered by the caller and only transmitted by the queue, so
+    requests that send mail do not wait on the mail server. Messages are sent
+    in batches, after which the connection of the backend is closed (if it
+    supports it). Failed messages are retried with an exponential backoff.
+
+    Messages are transmitted via their own backend (a copy of the backend of
+    the mailer, without its connection), so the queue never shares an SMTP
+    connection with requests that use the mailer directly.
+
+    If the queue is full the message is dropped (and a warning logged) rather
+    than transmitted by the request.
+
+    Attributes:
+        mailer (watson.framework.mail.Mailer): The mailer used to transmit
+        backend (watson.mail.backends.abc.Base): The backend used to transmit
+        max_size (int): The maximum number of messages waiting to be sent
+        batch_size (int): The maximum number of messages sent per connection
+        retries (int): The number of times a failed message is retried
+        backoff (float): The seconds to wait before the first retry, doubled
+                         for each subsequent retry
+    """
+
+    def __init__(self, mailer, max_size=1000, batch_size=20, retries=3,
+                 backoff=1.0, backend=None):
+        self.mailer = mailer
+        self.backend = backend or _copy_backend(mailer.backend)
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self._queue = queue.Queue(max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts the background thread, if it is not already running.
+        """
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='watson.auth.mail', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def put(self, message):
+        """Queues a message to be transmitted.
+
+        Args:
+            message (watson.mail.Message): The rendered message
+
+        Returns:
+            boolean: False if the queue was full and the message was dropped
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            logger.warning(
+                'Mail queue is full, dropping message to %s.',
+                message.recipients.to)
+            return False
+        return True
+
+    def join(self):
+        """Blocks until all queued messages have been transmitted.
+        """
+        self._queue.join()
+
+    def stop(self, timeout=None):
+        """Transmits any queued messages and stops the background thread.
+
+        Args:
+            timeout (float): The seconds to wait for the queue to drain
+        """
+        with self._lock:
+            if not self.running:
+                return
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                # the thread stops once it has drained the queue
+                pass
+            self._stopping.set()
+            self._thread.join(timeout)
+            self._thread = None
+        atexit.unregister(self.stop)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is _STOP
+            messages = batch[:-1] if stopping else batch
+            try:
+                for message in messages:
+                    self._transmit(message)
+                if messages:
+                    self._close()
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stopping or (
+                    self._stopping.is_set() and self._queue.empty()):
+                return
+
+    def _transmit(self, message):
+        for attempt in range(self.retries + 1):
+            try:
+                message.backend = self.backend
+                self.mailer.transmit(message)
+                return True
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception(
+                        'Failed to send mail after %s attempts.', attempt + 1)
+                    return False
+                self._close()
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _close(self):
+        close = getattr(self.backend, 'quit', None)
+        if close:
+            close()
+        _discard_connection(self.backend)
+
+
+def _copy_backend(backend):
+    backend = copy.copy(backend)
+    _discard_connection(backend)
+    return backend
+
+
+def _discard_connection(backend):
+    # SMTP backends only reconnect once both of these have been reset
+    for attribute in ('_smtp', '_connected'):
+        vars(backend).pop(attribute, None)
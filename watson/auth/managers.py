@@ -1,14 +1,32 @@
 # -*- coding: utf-8 -*-
-import uuid
-from watson.auth import models
+import collections
+import datetime
+import hashlib
+import hmac
+import secrets
+import time
+from watson.auth import models, signing
+from watson.auth.providers import exceptions
 from watson.db.contextmanagers import transaction_scope
 
 
+SIGNED_TOKEN_PURPOSE = 'reset'
+
+SignedToken = collections.namedtuple('SignedToken', 'token user')
+
+
 def generate_forgotten_token():
     """Generates a unique identifier that can be used to validate a forgotten
     password request.
     """
-    return uuid.uuid4().hex
+    return secrets.token_urlsafe(32)
+
+
+def hash_forgotten_token(token):
+    """Generates the digest of a forgotten password token that is stored in
+    the database.
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
 
 
 class ForgottenPasswordToken(object):
@@ -17,14 +35,17 @@ class ForgottenPasswordToken(object):
     Attributes:
         email_address_field (string): The email property of the user model.
         mailer (watson.mail.backends.abc.Base): The mailer backend used to send the email.
+        mail_queue (watson.auth.mail.Queue): The queue emails are sent from, if not set emails are sent immediately.
     """
     email_address_field = None
     mailer = None
+    mail_queue = None
     provider = None
 
-    def __init__(self, mailer, email_address_field):
+    def __init__(self, mailer, email_address_field, mail_queue=None):
         self.mailer = mailer
         self.email_address_field = email_address_field
+        self.mail_queue = mail_queue
 
     def create_token(self, user, request):
         """Create a new forgotten password token.
@@ -32,19 +53,95 @@ class ForgottenPasswordToken(object):
         Email the user their reset password link. The template for this email
         can be overridden via `auth/emails/forgotten-password.html`.
 
+        If `forgotten_password_token_signed` is enabled on the provider, a
+        signed token is returned instead and nothing is written to the
+        database.
+
         Args:
             user (watson.auth.models.User): The user who forgot their password
             request (watson.http.messages.Request): The HTTP request
         """
-        token = models.ForgottenPasswordToken(token=generate_forgotten_token())
+        if self.signed:
+            return self.create_signed_token(user)
+        plain_token = generate_forgotten_token()
+        token = models.ForgottenPasswordToken(
+            digest=hash_forgotten_token(plain_token))
+        token.token = plain_token
         user.forgotten_password_tokens.append(token)
         with transaction_scope(self.provider.session) as session:
             session.add(user)
         return token
 
+    # Signed tokens
+
+    @property
+    def signed(self):
+        return self.provider.config.get('forgotten_password_token_signed', False)
+
+    @property
+    def _secret(self):
+        if not self.provider.config.get('secret'):
+            raise exceptions.InvalidConfiguration(
+                'Secret not specified, ensure "secret" key is set on provider configuration when signed forgotten password tokens are enabled.')
+        return self.provider.config['secret'].encode(
+            self.provider.config['encoding'])
+
+    def _password_fingerprint(self, user):
+        return hmac.new(
+            self._secret,
+            (user.password or '').encode(self.provider.config['encoding']),
+            hashlib.sha256).hexdigest()[:16]
+
+    def create_signed_token(self, user):
+        """Creates a stateless forgotten password token.
+
+        The token is signed and contains the id of the user, when it expires
+        and a fingerprint of their current password, so it can no longer be
+        used once the password has been changed.
+
+        Args:
+            user (watson.auth.models.User): The user who forgot their password
+
+        Returns:
+            SignedToken
+        """
+        ttl = self.provider.config.get('forgotten_password_token_ttl') or 0
+        token = signing.sign({
+            'p': SIGNED_TOKEN_PURPOSE,
+            'u': user.id,
+            'e': int(time.time()) + ttl if ttl else None,
+            'f': self._password_fingerprint(user),
+        }, self._secret, self.provider.config['encoding'])
+        return SignedToken(token, user)
+
+    def get_signed_token(self, token):
+        """Retrieves the user of a signed forgotten password token.
+
+        Args:
+            token (string): The signed token
+
+        Returns:
+            SignedToken or None if the token is invalid, has expired or the
+            password of the user has since been changed.
+        """
+        data = signing.unsign(
+            token, self._secret, self.provider.config['encoding'])
+        if not data or data.get('p') != SIGNED_TOKEN_PURPOSE:
+            return None
+        if data['e'] and data['e'] < time.time():
+            return None
+        user = self.provider.user_query.get(data['u'])
+        if not user or not hmac.compare_digest(
+                data['f'], self._password_fingerprint(user)):
+            return None
+        return SignedToken(token, user)
+
     def notify_user(self, user, request, subject, template, **kwargs):
         """Notify a user regarding a specific action via email.
 
+        The email is rendered immediately, but if a mail queue has been
+        configured it will be sent in the background.
+
         Args:
             user (watson.auth.models.User): The user to notify
             request (watson.http.messages.Request): The HTTP request
@@ -53,12 +150,16 @@ class ForgottenPasswordToken(object):
         """
         body = {'user': user, 'request': request, 'provider': self.provider}
         body.update(kwargs)
-        self.mailer.send(
+        message = self.mailer.create(
             subject=subject,
             from_=self.provider.config['system_email_from_address'],
             template=template,
             body=body,
             to=getattr(user, self.email_address_field))
+        if self.mail_queue:
+            self.mail_queue.put(message)
+        else:
+            self.mailer.transmit(message)
 
     def delete_token(self, token):
         """Delete a token.
@@ -72,20 +173,33 @@ class ForgottenPasswordToken(object):
     def get_token(self, token, model=models.ForgottenPasswordToken):
         """Retrieve a user based on the supplied token.
 
+        Tokens older than the `forgotten_password_token_ttl` of the provider
+        are ignored.
+
         Args:
             token (string): The forgotten password token identifier
         """
-        return self.provider.session.query(
-            model).filter_by(
-                token=token).order_by(model.id.desc()).first()
+        if not token:
+            return None
+        if self.signed:
+            return self.get_signed_token(token)
+        query = self.provider.session.query(model).filter(
+            model.digest == hash_forgotten_token(token))
+        ttl = self.provider.config.get('forgotten_password_token_ttl')
+        if ttl:
+            query = query.filter(
+                model.created_date > datetime.datetime.now() - datetime.timedelta(seconds=ttl))
+        return query.first()
 
     def update_user_password(self, token, password):
         """Update the users password.
 
         Once the user has been updated, make sure that the token has been
-        deleted to prevent further access of that token.
+        deleted to prevent further access of that token. Signed tokens are
+        invalidated by the change of password instead.
         """
         token.user.password = password
         with transaction_scope(self.provider.session) as session:
             session.add(token.user)
-            session.delete(token)
+            if not isinstance(token, SignedToken):
+                session.delete(token)
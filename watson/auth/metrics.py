@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""Counters and histograms for authentication, rendered in the Prometheus
+text exposition format.
+
+A Collector listens for the timing events of watson.auth.instrumentation
+and records login attempts, password verification latency, JWT decode
+failures, cache hits and misses and authorization denials in a Registry.
+
+Each process records into its own registry. When a directory is configured
+the registry periodically writes its values to a file named after the pid of
+the process, and rendering aggregates the files of every process, so that
+any worker of a multi-process (e.g. gunicorn) deployment can serve the
+metrics of the whole deployment. The directory should be emptied before the
+deployment is started.
+
+Example:
+
+.. code-block:: python
+
+    from watson.auth import instrumentation, metrics
+
+    registry = metrics.Registry()
+    metrics.Collector(registry).listen(instrumentation.hooks)
+    print(registry.render())
+"""
+import atexit
+import bisect
+import collections
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from watson.common import imports
+from watson.common.contextmanagers import suppress
+from watson.framework import controllers
+from watson.auth import instrumentation
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0)
+
+
+class _CounterValue(object):
+
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increments the counter.
+        """
+        with self._lock:
+            self._value += amount
+
+    def get(self):
+        return self._value
+
+
+class _HistogramValue(object):
+
+    __slots__ = ('_buckets', '_counts', '_sum', '_lock')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Records an observation in the bucket it falls in.
+        """
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def get(self):
+        with self._lock:
+            return [list(self._counts), self._sum]
+
+
+class Metric(object):
+
+    """A named metric, with a value for each combination of label values.
+
+    Attributes:
+        name (string): The name of the metric
+        documentation (string): The help text of the metric
+        labelnames (tuple): The names of the labels
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Retrieves the value for the label values, creating it if required.
+        """
+        value = self._values.get(values)
+        if value is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    'Expected {0} label values for {1}, got {2}'.format(
+                        len(self.labelnames), self.name, len(values)))
+            with self._lock:
+                value = self._values.get(values)
+                if value is None:
+                    value = self._values[values] = self._create()
+        return value
+
+    def _create(self):
+        raise NotImplementedError()  # pragma: no cover
+
+    def snapshot(self):
+        """The values of the metric, serializable to JSON.
+        """
+        with self._lock:
+            values = list(self._values.items())
+        return {
+            'type': self.type,
+            'documentation': self.documentation,
+            'labelnames': list(self.labelnames),
+            'values': [[list(labels), value.get()] for labels, value in values],
+        }
+
+
+class Counter(Metric):
+
+    """A value that only ever increases.
+    """
+    type = 'counter'
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _create(self):
+        return _CounterValue()
+
+
+class Histogram(Metric):
+
+    """Counts observations (such as durations) in configurable buckets.
+
+    Attributes:
+        buckets (tuple): The (sorted) upper bounds of the buckets
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _create(self):
+        return _HistogramValue(self.buckets)
+
+    def snapshot(self):
+        snapshot = super(Histogram, self).snapshot()
+        snapshot['buckets'] = list(self.buckets)
+        return snapshot
+
+
+class Registry(object):
+
+    """A thread safe registry of metrics.
+
+    Attributes:
+        directory (string): The directory the values of each process are
+                            written to, None if only the current process is
+                            rendered
+        flush_interval (float): The minimum seconds between writes
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self._exit)
+
+    def counter(self, name, documentation, labelnames=()):
+        """Retrieves the counter, registering it if it does not exist.
+        """
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        """Retrieves the histogram, registering it if it does not exist.
+        """
+        return self._register(
+            Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def _register(self, class_, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = class_(name, *args, **kwargs)
+            elif not isinstance(metric, class_):
+                raise ValueError(
+                    '{0} is already registered as a {1}'.format(
+                        name, metric.type))
+            return metric
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def __contains__(self, name):
+        return name in self._metrics
+
+    def snapshot(self):
+        """The values of every metric in the current process.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return collections.OrderedDict(
+            (metric.name, metric.snapshot()) for metric in metrics)
+
+    def collect(self):
+        """The values of every metric, aggregated across processes if a
+        directory has been configured.
+        """
+        snapshot = self.snapshot()
+        if not self.directory:
+            return snapshot
+        own = '{0}.json'.format(os.getpid())
+        for filename in sorted(os.listdir(self.directory)):
+            if filename == own or not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as file:
+                    _merge(snapshot, json.load(file))
+            except (OSError, ValueError):
+                continue
+        return snapshot
+
+    def render(self):
+        """Renders the metrics in the Prometheus text exposition format.
+        """
+        return render(self.collect())
+
+    def flush(self):
+        """Writes the values of the current process to the directory.
+        """
+        self._flushed = time.monotonic()
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, '{0}.json'.format(os.getpid()))
+        descriptor, temporary = tempfile.mkstemp(
+            dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(self.snapshot(), file)
+            os.replace(temporary, path)
+        except Exception:
+            os.unlink(temporary)
+            raise
+
+    def _exit(self):
+        with suppress(OSError):
+            self.flush()
+
+    def maybe_flush(self):
+        """Writes the values of the current process if the flush interval has
+        elapsed since they were last written.
+        """
+        if self.directory and \
+                time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+
+class Collector(object):
+
+    """Records the timing events of watson.auth as metrics.
+
+    Attributes:
+        registry (Registry): The registry metrics are recorded in
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.login_attempts = registry.counter(
+            'watson_auth_login_attempts_total',
+            'The number of attempts to authenticate a username and password.',
+            ('provider', 'result'))
+        self.password_checks = registry.histogram(
+            'watson_auth_password_check_seconds',
+            'The time taken to verify a password.',
+            ('provider',))
+        self.jwt_decode_failures = registry.counter(
+            'watson_auth_jwt_decode_failures_total',
+            'The number of tokens that could not be decoded.',
+            ('provider',))
+        self.cache_requests = registry.counter(
+            'watson_auth_cache_requests_total',
+            'The number of cache lookups.',
+            ('event', 'result'))
+        self.authorization_denials = registry.counter(
+            'watson_auth_authorization_denials_total',
+            'The number of role and permission checks that were denied.',
+            ('check',))
+        self.handle_requests = registry.histogram(
+            'watson_auth_handle_request_seconds',
+            'The time taken to resolve the user of a request.',
+            ('provider',))
+        self._handlers = {
+            instrumentation.AUTHENTICATE: self._authenticate,
+            instrumentation.PASSWORD_CHECK: self._password_check,
+            instrumentation.JWT_DECODE: self._jwt_decode,
+            instrumentation.HANDLE_REQUEST: self._handle_request,
+            instrumentation.ACL_GENERATE: None,
+            instrumentation.ACL_CHECK: self._acl_check,
+        }
+
+    def listen(self, target):
+        """Registers the collector for the events it records.
+
+        Args:
+            target: An event dispatcher or watson.auth.instrumentation.Hooks
+        """
+        for name in self._handlers:
+            target.add(name, self)
+
+    def __call__(self, event):
+        params = event.params
+        if params.get('cache_hit') is not None:
+            self.cache_requests.labels(
+                event.name.replace('watson.auth.', ''),
+                'hit' if params['cache_hit'] else 'miss').inc()
+        handler = self._handlers.get(event.name)
+        if handler:
+            handler(event)
+        self.registry.maybe_flush()
+
+    def _authenticate(self, event):
+        self.login_attempts.labels(
+            imports.get_qualified_name(event.target),
+            'success' if event.params.get('authenticated') else 'failure'
+        ).inc()
+
+    def _password_check(self, event):
+        self.password_checks.labels(
+            imports.get_qualified_name(event.target)).observe(
+                event.params['duration'])
+
+    def _jwt_decode(self, event):
+        if not event.params.get('valid'):
+            self.jwt_decode_failures.labels(
+                imports.get_qualified_name(event.target)).inc()
+
+    def _handle_request(self, event):
+        self.handle_requests.labels(
+            imports.get_qualified_name(event.target)).observe(
+                event.params['duration'])
+
+    def _acl_check(self, event):
+        if not event.params['nested'] and not event.params['result']:
+            self.authorization_denials.labels(event.params['check']).inc()
+
+
+class Controller(controllers.Rest):
+
+    """Renders the metrics of the 'auth_metrics' registry.
+    """
+
+    def GET(self):
+        registry = self.container.get('auth_metrics')
+        response = self.response
+        response.headers.set('Content-Type', CONTENT_TYPE)
+        response.body = registry.render()
+        return response
+
+
+def wsgi_app(registry):
+    """Creates a WSGI application that renders the metrics of the registry,
+    for serving them outside of the watson application (e.g. on a separate
+    port).
+    """
+    def application(environ, start_response):
+        body = registry.render().encode('utf-8')
+        start_response('200 OK', [
+            ('Content-Type', CONTENT_TYPE),
+            ('Content-Length', str(len(body)))])
+        return [body]
+    return application
+
+
+def render(snapshot):
+    """Renders a snapshot of a registry in the Prometheus text exposition
+    format.
+    """
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append('# HELP {0} {1}'.format(
+            name, metric['documentation'].replace('\\', r'\\').replace(
+                '\n', r'\n')))
+        lines.append('# TYPE {0} {1}'.format(name, metric['type']))
+        labelnames = metric['labelnames']
+        for labels, value in sorted(
+                metric['values'], key=lambda value: value[0]):
+            pairs = list(zip(labelnames, labels))
+            if metric['type'] == 'counter':
+                lines.append(_sample(name, pairs, value))
+                continue
+            counts, sum_ = value
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + [math.inf], counts):
+                cumulative += count
+                lines.append(_sample(
+                    name + '_bucket', pairs + [('le', _format(bound))],
+                    cumulative))
+            lines.append(_sample(name + '_sum', pairs, sum_))
+            lines.append(_sample(name + '_count', pairs, cumulative))
+    return '\n'.join(lines) + '\n'
+
+
+def _sample(name, pairs, value):
+    labels = ''
+    if pairs:
+        labels = '{{{0}}}'.format(','.join(
+            '{0}="{1}"'.format(label, _escape(str(value_)))
+            for label, value_ in pairs))
+    return '{0}{1} {2}'.format(name, labels, _format(value))
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return '{0}.0'.format(int(value))
+    return repr(float(value))
+
+
+def _merge(snapshot, other):
+    """Adds the values of another snapshot to the snapshot.
+    """
+    for name, metric in other.items():
+        existing = snapshot.setdefault(name, dict(metric, values=[]))
+        if existing['type'] != metric['type'] or \
+                existing.get('buckets') != metric.get('buckets'):
+            continue
+        values = {tuple(labels): value for labels, value in existing['values']}
+        for labels, value in metric['values']:
+            labels = tuple(labels)
+            current = values.get(labels)
+            if current is None:
+                values[labels] = value
+            elif metric['type'] == 'counter':
+                values[labels] = current + value
+            else:
+                values[labels] = [
+                    [a + b for a, b in zip(current[0], value[0])],
+                    current[1] + value[1]]
+        existing['values'] = [[list(labels), value]
+                              for labels, value in values.items()]
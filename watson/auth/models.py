@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
+import itertools
 from datetime import datetime
 from sqlalchemy import (Column, Integer, String, DateTime, ForeignKey,
-                        SmallInteger)
+                        SmallInteger, Index, event, inspect, select)
 from sqlalchemy.ext.declarative import declared_attr
-from sqlalchemy.orm import relationship
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, selectinload
 from watson.common import imports
 from watson.auth import authorization, crypto
 from watson.db.models import Model
@@ -61,6 +63,10 @@ class UserMixin(object):
         list roles: The roles associated with the user
         list permissions: The permissions associated with the user, overrides
                           the permissions associated with the role.
+        list resource_permissions: The permissions associated with the user
+                                   for specific resources.
+        list api_keys: The API keys that authenticate as the user.
+        list remember_tokens: The persistent login tokens of the user.
         date created_date: The time the user was created.
         date updated_date: The time the user was updated.
     """
@@ -87,12 +93,25 @@ class UserMixin(object):
     def permissions(cls):
         return relationship(UsersHasPermission, backref='user', cascade='all')
 
+    @declared_attr
+    def resource_permissions(cls):
+        return relationship(UsersHasResourcePermission, backref='user',
+                            cascade='all', lazy='dynamic')
+
     @declared_attr
     def roles(cls):
         return relationship(Role,
                             secondary=UsersHasRole.__tablename__,
                             backref='roles', cascade=None)
 
+    @declared_attr
+    def api_keys(cls):
+        return relationship(ApiKey, backref='user', cascade='all')
+
+    @declared_attr
+    def remember_tokens(cls):
+        return relationship(RememberToken, backref='user', cascade='all')
+
     @declared_attr
     def forgotten_password_tokens(cls):
         return relationship(ForgottenPasswordToken, backref='user', cascade='all')
@@ -134,6 +153,28 @@ class UserMixin(object):
         user_permission.permission = permission
         self.permissions.append(user_permission)
 
+    def add_resource_permission(
+            self, permission, resource_type, resource_id, value=1):
+        """Adds a permission to the user for a specific resource.
+
+        This overrides any permission given to the user or their roles when
+        validating against that resource.
+
+        Args:
+            Permission permission: The permission to attach
+            string resource_type: The type of resource, e.g. 'post'
+            mixed resource_id: The identifier of the resource
+            int value: The value to give the permission, can be either:
+                        0 - deny
+                        1 - allow
+        """
+        resource_permission = UsersHasResourcePermission(
+            resource_type=resource_type,
+            resource_id=str(resource_id),
+            value=value)
+        resource_permission.permission = permission
+        self.resource_permissions.append(resource_permission)
+
     def __repr__(self):
         return '<{0} id:{1}>'.format(imports.get_qualified_name(self), self.id)
 
@@ -162,6 +203,33 @@ class UsersHasPermission(Model):
     created_date = Column(DateTime, default=datetime.now)
 
 
+class UsersHasResourcePermission(Model):
+    """A permission granted to a user for a specific resource.
+
+    The resource is identified by an arbitrary type (for example 'post') and
+    the identifier of that resource. These grants override any global
+    permissions the user has for that resource.
+    """
+    user_id = Column(Integer,
+                     ForeignKey(_table_attr(UserMixin, 'id')),
+                     primary_key=True)
+    permission_id = Column(Integer,
+                           ForeignKey(_table_attr(Permission, 'id')),
+                           primary_key=True)
+    resource_type = Column(String(255), primary_key=True)
+    resource_id = Column(String(255), primary_key=True)
+    permission = relationship(Permission)
+    value = Column(SmallInteger, default=0)
+    created_date = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_resource_permission_user_resource',
+              'user_id', 'resource_type', 'resource_id'),
+        Index('ix_resource_permission_resource',
+              'resource_type', 'resource_id'),
+    )
+
+
 class UsersHasRole(Model):
     user_id = Column(Integer,
                      ForeignKey(_table_attr(UserMixin, 'id')),
@@ -171,13 +239,241 @@ class UsersHasRole(Model):
                      primary_key=True)
 
 
+class ApiKey(Model):
+    """An API key that authenticates as a user.
+
+    Only a short public prefix and a digest of the secret part of the key are
+    stored, see watson.auth.providers.ApiKey for generating keys.
+
+    Columns:
+        string prefix: The public prefix of the key, uniquely indexed
+        string digest: The hex digest of the secret part of the key
+        string scopes: Space separated permission keys the key is limited to
+        date expires_date: When the key expires, never if not set
+    """
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer,
+                     ForeignKey(_table_attr(UserMixin, 'id')),
+                     index=True)
+    name = Column(String(255))
+    prefix = Column(String(32), unique=True, nullable=False)
+    digest = Column(String(128), nullable=False)
+    scopes = Column(String(1024))
+    created_date = Column(DateTime, default=datetime.now)
+    expires_date = Column(DateTime)
+
+    @property
+    def scope_keys(self):
+        """The permission keys the key is limited to, or None if the key is
+        not limited.
+        """
+        if not self.scopes:
+            return None
+        return self.scopes.split()
+
+    def is_expired(self, now=None):
+        if not self.expires_date:
+            return False
+        return self.expires_date <= (now or datetime.now())
+
+    def __repr__(self):
+        return '<{0} prefix:{1}>'.format(
+            imports.get_qualified_name(self), self.prefix)
+
+
+class RememberToken(Model):
+    """A persistent login token that authenticates a user once their session
+    has expired.
+
+    The token is split into a selector and a validator. Only the selector
+    (uniquely indexed) and a SHA-256 digest of the validator are stored, see
+    watson.auth.providers.Session for issuing tokens.
+
+    Columns:
+        string selector: The public part of the token, uniquely indexed
+        string digest: The hex digest of the validator part of the token
+        date expires_date: When the token expires
+    """
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer,
+                     ForeignKey(_table_attr(UserMixin, 'id')),
+                     index=True)
+    selector = Column(String(32), unique=True, nullable=False)
+    digest = Column(String(64), nullable=False)
+    created_date = Column(DateTime, default=datetime.now)
+    expires_date = Column(DateTime, nullable=False)
+
+    def is_expired(self, now=None):
+        return self.expires_date <= (now or datetime.now())
+
+    def __repr__(self):
+        return '<{0} selector:{1}>'.format(
+            imports.get_qualified_name(self), self.selector)
+
+
 class ForgottenPasswordToken(Model):
+    """A token that allows a user to reset their password.
+
+    Only a SHA-256 digest of the token is stored (uniquely indexed), the plain
+    text token is only available as `token` when it is created, see
+    watson.auth.managers.ForgottenPasswordToken.
+
+    Columns:
+        string digest: The hex digest of the token
+        date created_date: When the token was created, tokens expire after
+                           the configured `forgotten_password_token_ttl`
+    """
+    token = None
     id = Column(Integer, primary_key=True)
-    token = Column(String(255))
+    digest = Column(String(64), unique=True, nullable=False)
     user_id = Column(Integer,
                      ForeignKey(_table_attr(UserMixin, 'id')))
-    created_date = Column(DateTime, default=datetime.now)
+    created_date = Column(DateTime, default=datetime.now, index=True)
 
     def __repr__(self):
         return '<{0} user id:{1}>'.format(
             imports.get_qualified_name(self), self.user.id)
+
+
+class AclVersion(Model):
+    """A monotonic counter that is incremented whenever roles, permissions or
+    the grants associated with them change.
+
+    Cached ACLs can be compared against the current version to determine
+    whether or not they are stale.
+    """
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_date = Column(DateTime, default=datetime.now)
+
+    @classmethod
+    def current(cls, session):
+        """Retrieves the current ACL version.
+
+        Args:
+            session: The SQLAlchemy session or connection to query against
+        """
+        table = cls.__table__
+        version = session.execute(
+            select([table.c.version]).where(table.c.id == 1)).scalar()
+        return version or 0
+
+    @classmethod
+    def increment(cls, connection):
+        """Increments the ACL version.
+
+        Args:
+            connection: The SQLAlchemy connection to execute against
+        """
+        table = cls.__table__
+        update = table.update().where(table.c.id == 1).values(
+            version=table.c.version + 1, updated_date=datetime.now())
+        if connection.execute(update).rowcount:
+            return
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(
+                    id=1, version=1, updated_date=datetime.now()))
+        except IntegrityError:
+            # The row was inserted by a concurrent transaction
+            connection.execute(update)
+
+
+@event.listens_for(AclVersion.__table__, 'after_create')
+def _seed_acl_version(table, connection, **kwargs):
+    connection.execute(table.insert().values(
+        id=1, version=0, updated_date=datetime.now()))
+
+
+def acl_loader_options(user_model):
+    """The loader options that eagerly load the roles and permissions the ACL
+    of a user is generated from.
+
+    Args:
+        user_model: The user model being queried
+    """
+    return (
+        selectinload(user_model.roles).selectinload(
+            Role.permissions).joinedload(RolesHasPermission.permission),
+        selectinload(user_model.permissions).joinedload(
+            UsersHasPermission.permission))
+
+
+def load_acl(user):
+    """Loads the roles and permissions the ACL of the user is generated from,
+    so that it can be generated once the user has been detached from its
+    session.
+
+    Args:
+        user (watson.auth.models.UserMixin): The user
+    """
+    for role in user.roles:
+        for grant in role.permissions:
+            grant.permission
+    for grant in user.permissions:
+        grant.permission
+
+
+ACL_MODELS = (Role, Permission, RolesHasPermission, UsersHasPermission,
+              UsersHasRole, UsersHasResourcePermission)
+
+
+def _acl_has_changed(session):
+    for obj in itertools.chain(session.new, session.deleted):
+        if isinstance(obj, ACL_MODELS):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, ACL_MODELS):
+            if session.is_modified(obj):
+                return True
+        elif isinstance(obj, UserMixin):
+            attrs = inspect(obj).attrs
+            if attrs.roles.history.has_changes() \
+                    or attrs.permissions.history.has_changes():
+                return True
+    return False
+
+
+def _increment_acl_version(session, flush_context):
+    if _acl_has_changed(session):
+        AclVersion.increment(session.connection())
+
+
+def track_acl_version(session):
+    """Increments the ACL version whenever a flush of the session changes
+    roles, permissions or the grants associated with them.
+
+    The sessions of the providers are tracked by watson.auth.listeners.Init.
+
+    Args:
+        session: The SQLAlchemy session class, sessionmaker or scoped session
+    """
+    if not event.contains(session, 'after_flush', _increment_acl_version):
+        event.listen(session, 'after_flush', _increment_acl_version)
+
+
+def delete_in_batches(session, model, criterion, batch_size=1000):
+    """Deletes the rows of a model matching the criterion in batches.
+
+    Each batch is deleted by primary key and committed separately, so that
+    large deletes do not hold locks on the table for long.
+
+    Args:
+        session: The SQLAlchemy session
+        model: The model to delete rows from
+        criterion: The filter that rows must match to be deleted
+        batch_size (int): The maximum number of rows deleted per transaction
+
+    Returns:
+        int: The number of rows deleted
+    """
+    deleted = 0
+    while True:
+        ids = [id_ for id_, in session.query(model.id).filter(
+            criterion).limit(batch_size)]
+        if not ids:
+            return deleted
+        session.query(model).filter(model.id.in_(ids)).delete(
+            synchronize_session=False)
+        session.commit()
+        deleted += len(ids)
@@ -1,10 +1,27 @@
 # -*- coding: utf-8 -*-
+import threading
+from watson.common import imports
+from watson.framework import events
 from watson.framework.debug import abc
+from watson.auth import instrumentation
 
 data = []
 
+ENVIRON_KEY = 'watson.auth.debug'
+
+_local = threading.local()
+
 
 class User(abc.Panel):
+
+    """Displays the authenticated user, along with how long authenticating
+    and authorizing them took during the request.
+
+    The timing events of watson.auth (see watson.auth.instrumentation) are
+    collected for each request, so the provider that resolved the user, the
+    time spent handling the request and generating the ACL, the number of
+    queries, cache hits and every role and permission check are displayed.
+    """
     title = 'Auth'
     icon = 'user'
 
@@ -22,10 +39,66 @@ class User(abc.Panel):
             )
         return user
 
+    def register_listeners(self):
+        dispatcher = self.application.dispatcher
+        dispatcher.add(events.ROUTE_MATCH, self.start, 1000)
+        for name in instrumentation.EVENTS:
+            dispatcher.add(name, self.record)
+
+    def start(self, event):
+        """Starts collecting the auth events of the request.
+        """
+        request = event.params['context']['request']
+        _local.events = request.environ[ENVIRON_KEY] = []
+
+    def record(self, event):
+        collected = getattr(_local, 'events', None)
+        if collected is not None:
+            collected.append((
+                event.name, imports.get_qualified_name(event.target),
+                dict(event.params)))
+
+    @property
+    def events(self):
+        return self.request.environ.get(ENVIRON_KEY, [])
+
+    @property
+    def performance(self):
+        """Summarizes the auth events of the request.
+        """
+        provider = None
+        handle_request_time = acl_time = 0
+        queries = 0
+        caches = []
+        checks = []
+        for name, target, params in self.events:
+            if not params.get('nested'):
+                queries += params['queries']
+            if params['cache_hit'] is not None:
+                caches.append((name, target, params['cache_hit']))
+            if name == instrumentation.HANDLE_REQUEST:
+                handle_request_time += params['duration']
+                if params.get('authenticated') and not provider:
+                    provider = target
+            elif name == instrumentation.ACL_GENERATE:
+                acl_time += params['duration']
+            elif name == instrumentation.ACL_CHECK:
+                checks.append(params)
+        return {
+            'provider': provider,
+            'handle_request_ms': round(handle_request_time * 1000, 3),
+            'acl_ms': round(acl_time * 1000, 3),
+            'queries': queries,
+            'caches': caches,
+            'checks': checks,
+        }
+
     def render(self):
+        _local.events = None
         return self._render({
             'request': self.request,
-            'user': self.user
+            'user': self.user,
+            'performance': self.performance,
         })
 
     def render_key_stat(self):
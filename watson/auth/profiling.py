@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Sampled profiling of slow authentication and authorization.
+
+The auth phases of a request (the route listener, authenticating a user and
+the authorization performed by the decorators) are profiled once a Profiler
+has been installed. Only the outermost phase in a thread is profiled, so a
+phase that occurs within another (such as authenticate within the route
+listener) is included in the profile of the outer phase.
+
+Two kinds of profiles are written to the directory:
+
+    - A cProfile of 1 in every `sample_rate` phases (.prof, readable with
+      pstats or snakeviz)
+    - The stack samples of any phase that takes longer than `threshold`
+      seconds (.txt, in the collapsed format used by flame graph tools)
+
+Stacks are sampled from a background thread every `interval` seconds once a
+phase has been running for longer than the threshold. Until then the thread
+sleeps, so phases that finish within the threshold are not slowed down. Only the newest `max_files`
+profiles are kept.
+
+Phases are profiled per thread, so coroutines are not profiled.
+"""
+import collections
+import datetime
+import functools
+import itertools
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = ('.prof', '.txt')
+
+profiler = None
+
+
+class Phase(object):
+
+    """A phase that is being profiled.
+    """
+    __slots__ = ('name', 'started', 'samples', 'profile')
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+        self.samples = []
+        self.profile = None
+
+
+class Profiler(object):
+
+    """Profiles slow and sampled auth phases.
+
+    Attributes:
+        directory (string): The directory profiles are written to
+        threshold (float): The seconds after which a phase is sampled, None
+                           to disable stack sampling
+        sample_rate (int): Profile 1 in every sample_rate phases with
+                           cProfile, 0 to disable
+        interval (float): The seconds between stack samples
+        max_files (int): The number of profiles kept in the directory
+    """
+
+    def __init__(self, directory=None, threshold=0.5, sample_rate=0,
+                 interval=0.01, max_files=100):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), 'watson.auth.profiles')
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_files = max_files
+        self._phases = itertools.count(1)
+        self._active = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def profile(self, name, func, *args, **kwargs):
+        """Calls the function, profiling it if it is the outermost phase of
+        the current thread.
+
+        Args:
+            name (string): The name of the phase
+            func (callable): The function to call
+        """
+        if getattr(self._local, 'phase', None) is not None:
+            return func(*args, **kwargs)
+        phase = self._local.phase = Phase(name)
+        ident = threading.get_ident()
+        if self.sample_rate and \
+                next(self._phases) % self.sample_rate == 0 and \
+                sys.getprofile() is None:
+            import cProfile
+            phase.profile = cProfile.Profile()
+        phase.started = time.perf_counter()
+        if self.threshold is not None:
+            self._active[ident] = phase
+            self._start_sampler()
+        try:
+            if phase.profile is not None:
+                return phase.profile.runcall(func, *args, **kwargs)
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - phase.started
+            self._active.pop(ident, None)
+            self._local.phase = None
+            if phase.profile is not None:
+                self._write(phase, duration, '.prof', phase.profile.dump_stats)
+            elif self.threshold is not None and duration >= self.threshold:
+                self._write(phase, duration, '.txt', functools.partial(
+                    _write_samples, phase, duration))
+
+    def profiles(self):
+        """The paths of the profiles in the directory, oldest first.
+        """
+        return [
+            os.path.join(self.directory, filename)
+            for filename in sorted(os.listdir(self.directory))
+            if filename.endswith(EXTENSIONS)]
+
+    def _write(self, phase, duration, extension, write):
+        filename = '{0}-{1}-{2}ms-{3}{4}'.format(
+            datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S.%f'),
+            os.getpid(), int(duration * 1000),
+            re.sub(r'[^\w.]+', '_', phase.name), extension)
+        try:
+            write(os.path.join(self.directory, filename))
+            for path in self.profiles()[:-self.max_files or None]:
+                os.unlink(path)
+        except OSError:
+            logger.exception('Unable to write the profile of %s', phase.name)
+
+    def _start_sampler(self):
+        self._wakeup.set()
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._sample, name='watson.auth.profiling',
+                    daemon=True)
+                self._thread.start()
+
+    def _sample(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                active = self._active.copy()
+                if not active:
+                    break
+                now = time.perf_counter()
+                delay = min(
+                    phase.started for phase in active.values()
+                ) + self.threshold - now
+                if delay > 0:
+                    # phases started later can not pass the threshold sooner
+                    time.sleep(delay)
+                    continue
+                frames = sys._current_frames()
+                for ident, phase in active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and \
+                            now - phase.started >= self.threshold:
+                        phase.samples.append(_stack(frame))
+                del frames
+                time.sleep(self.interval)
+
+
+def install(profiler_):
+    """Sets the profiler used by the profiled functions, None to disable
+    profiling.
+    """
+    global profiler
+    profiler = profiler_
+
+
+def profiled(name=None):
+    """Profiles the decorated function as a phase, if a profiler has been
+    installed.
+
+    Args:
+        name (string): The name of the phase, defaults to the qualified name
+                       of the function
+    """
+    def decorator(func):
+        phase = name or '{0}.{1}'.format(func.__module__, func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if profiler is None:
+                return func(*args, **kwargs)
+            return profiler.profile(phase, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _stack(frame):
+    stack = []
+    while frame is not None:
+        stack.append('{0}.{1}'.format(
+            frame.f_globals.get('__name__', '?'), frame.f_code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+def _write_samples(phase, duration, path):
+    counts = collections.Counter(phase.samples)
+    with open(path, 'w') as file:
+        file.write('# phase: {0}\n'.format(phase.name))
+        file.write('# duration: {0:.6f}\n'.format(duration))
+        file.write('# samples: {0}\n'.format(len(phase.samples)))
+        for stack, count in counts.most_common():
+            file.write('{0} {1}\n'.format(stack, count))
@@ -1,5 +1,34 @@
-from watson.auth.providers.session import Provider as Session
-from watson.auth.providers.jwt import Provider as JWT
+# -*- coding: utf-8 -*-
+"""The providers are loaded when they are first accessed, so that the
+dependencies of a provider (such as PyJWT) are only imported if it is used.
+"""
+import importlib
+import sys
+import types
 
+PROVIDERS = {
+    'Session': 'watson.auth.providers.session',
+    'JWT': 'watson.auth.providers.jwt',
+    'Basic': 'watson.auth.providers.basic',
+    'ApiKey': 'watson.auth.providers.api_key',
+}
 
-__all__ = (Session, JWT)
+
+class _Module(types.ModuleType):
+
+    def __getattr__(self, name):
+        if name not in PROVIDERS:
+            raise AttributeError(
+                "module '{0}' has no attribute '{1}'".format(
+                    self.__name__, name))
+        provider = importlib.import_module(PROVIDERS[name]).Provider
+        setattr(self, name, provider)
+        return provider
+
+    def __dir__(self):
+        return sorted(set(super(_Module, self).__dir__()) | set(PROVIDERS))
+
+
+sys.modules[__name__].__class__ = _Module
+
+__all__ = ('Session', 'JWT', 'Basic', 'ApiKey')
@@ -1,20 +1,54 @@
 import abc
+import asyncio
+import functools
+import threading
 from sqlalchemy.orm import exc
-from watson.auth import crypto
+from watson.auth import authorization, crypto, profiling
+from watson.auth.instrumentation import (
+    annotate, authenticate_params, timed, AUTHENTICATE, GET_USER,
+    PASSWORD_CHECK)
 from watson.auth.providers import exceptions
 from watson.common import imports
 from watson.common.decorators import cached_property
+from watson.http.cookies import CookieDict
+
+COOKIES_ENVIRON_KEY = 'watson.auth.cookies'
 
 
 class Base(object):
 
+    """The base provider that all auth providers should extend.
+
+    Attributes:
+        config (dict): The configuration for the provider
+        session: The SQLAlchemy (scoped) session used to retrieve users
+        async_session: An optional SQLAlchemy AsyncSession used by the
+                       asynchronous methods, if not set the queries are run
+                       against `session` within the executor.
+        executor (concurrent.futures.Executor): The executor that blocking
+                                                work (queries and password
+                                                hashing) is offloaded to.
+        instrumentation (watson.auth.instrumentation.Instrumentation): Emits
+            timing events, defaults to the hook registry if not set.
+        unauthenticated_status_code (string): The status code of requests
+                                              made without a user
+        unauthorized_status_code (string): The status code of requests made
+                                           by a user without access
+    """
+    unauthenticated_status_code = '403'
+    unauthorized_status_code = '401'
     config = None
     session = None
+    async_session = None
+    executor = None
+    instrumentation = None
 
-    def __init__(self, config, session):
+    def __init__(self, config, session, async_session=None, executor=None):
         self._validate_configuration(config)
         self.config = config
         self.session = session
+        self.async_session = async_session
+        self.executor = executor
 
     # Configuration
 
@@ -46,18 +80,44 @@ class Base(object):
     def user_query(self):
         return self.session.query(self.user_model)
 
-    def get_user(self, username):
+    @timed(GET_USER)
+    def get_user(self, username, options=()):
         """Retrieves a user from the database based on their username.
 
         Args:
             username (string): The username of the user to find.
+            options (tuple): The loader options to apply to the query.
         """
         user_field = getattr(self.user_model, self.user_model_identifier)
         try:
-            return self.user_query.filter(user_field == username).one()
+            return self.user_query.options(*options).filter(
+                user_field == username).one()
         except exc.NoResultFound:
             return None
 
+    async def aget_user(self, username):
+        """Asynchronously retrieves a user based on their username.
+
+        The roles and permissions of the user are loaded eagerly, as they
+        cannot be lazily loaded from within the event loop.
+
+        Args:
+            username (string): The username of the user to find.
+        """
+        from watson.auth.models import acl_loader_options
+        options = acl_loader_options(self.user_model)
+        if self.async_session is None:
+            return await self._run_in_worker(self.get_user, username, options)
+        from sqlalchemy import select
+        user_field = getattr(self.user_model, self.user_model_identifier)
+        result = await self.async_session.execute(
+            select(self.user_model).options(*options).where(
+                user_field == username))
+        user = result.scalars().first()
+        if user is not None:
+            user.acl.resources.session = self.session
+        return user
+
     def get_user_by_email_address(self, email_address):
         email_column = getattr(
             self.user_model, self.config['model']['email_address'])
@@ -68,6 +128,8 @@ class Base(object):
 
     # Authentication
 
+    @profiling.profiled()
+    @timed(AUTHENTICATE, authenticate_params)
     def authenticate(self, username, password):
         """Validate a user against a supplied username and password.
 
@@ -80,11 +142,75 @@ class Base(object):
             return None
         user = self.get_user(username)
         if user:
-            if crypto.check_password(password, user.password, user.salt,
-                                     self.config['encoding']):
+            annotate(cache_hit=False)
+            if self.check_password(user, password):
+                return user
+        return None
+
+    async def aauthenticate(self, username, password):
+        """Asynchronously validate a user against a supplied username and
+        password.
+
+        The password is verified within the executor so that hashing does
+        not block the event loop.
+
+        Args:
+            username (string): The username of the user.
+            password (string): The password of the user.
+        """
+        password_config = self.config['password']
+        if len(password) > password_config['max_length']:
+            return None
+        user = await self.aget_user(username)
+        if user:
+            if await self._run_in_executor(
+                    self.check_password, user, password):
                 return user
         return None
 
+    @timed(PASSWORD_CHECK)
+    def check_password(self, user, password):
+        """Verifies the supplied password against the hashed password of the
+        user.
+
+        Args:
+            user (watson.auth.models.UserMixin): The user
+            password (string): The plain text password
+        """
+        return crypto.check_password(
+            password, user.password, user.salt, self.config['encoding'])
+
+    def _run_in_executor(self, func, *args):
+        loop = _get_running_loop()
+        return loop.run_in_executor(
+            self.executor, functools.partial(func, *args))
+
+    async def _run_in_worker(self, func, *args):
+        """Runs a function that queries `session` and returns a user within
+        the executor.
+
+        The ACL of the user is loaded before the (thread-local) session of the
+        worker thread is removed, and any resource permissions are retrieved
+        via `session` instead.
+        """
+        from watson.auth.models import load_acl
+        caller = threading.get_ident()
+
+        def run():
+            try:
+                user = func(*args)
+                if isinstance(user, self.user_model):
+                    load_acl(user)
+                return user
+            finally:
+                if threading.get_ident() != caller \
+                        and hasattr(self.session, 'remove'):
+                    self.session.remove()
+        user = await self._run_in_executor(run)
+        if isinstance(user, self.user_model):
+            user.acl.resources.session = self.session
+        return user
+
     def user_meets_requirements(self, user, requires):
         for require in requires or []:
             if not require(user):
@@ -93,12 +219,91 @@ class Base(object):
 
     # Authorization
 
-    def is_authorized(self, user, roles=None, permissions=None, requires=None):
-        no_role = roles and not user.acl.has_role(roles)
-        no_permission = permissions and not user.acl.has_permission(
-            permissions)
-        no_requires = self.user_meets_requirements(user, requires)
-        return False if no_role or no_permission or not no_requires else True
+    def is_authorized(self, user, roles=None, permissions=None, requires=None,
+                      resource=None):
+        """Validates the user against the supplied roles, permissions and
+        requirements.
+
+        Overriding this customises how the decorators and guards authorize
+        users (see authorize).
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to validate
+            roles (list|string): The roles the user must have one of
+            permissions (string): The permission the user must have
+            requires (list): Callables the user must satisfy
+            resource (tuple): The (resource_type, resource_id) the permission
+                              must be granted against
+        """
+        if roles and not user.acl.has_role(roles):
+            return False
+        if permissions:
+            if resource:
+                if not user.acl.has_resource_permission(
+                        permissions, *resource):
+                    return False
+            elif not user.acl.has_permission(permissions):
+                return False
+        return self.user_meets_requirements(user, requires)
+
+    def authorize(self, user, policy, params=None):
+        """Validates the user against a compiled policy.
+
+        The policy is evaluated directly, unless is_authorized has been
+        overridden in which case each of the policy's permissions is validated
+        via is_authorized instead.
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to validate
+            policy (watson.auth.authorization.Policy): The compiled policy
+            params (dict): The params to retrieve the resource identifier from
+        """
+        if type(self).is_authorized is Base.is_authorized:
+            return policy(user, params)
+        resource = authorization.resolve_resource(
+            policy.resource, params or {})
+        if policy.permissions and policy.resource and resource is None:
+            return False
+        for permission in policy.permissions or (None,):
+            if not self.is_authorized(
+                    user, policy.roles, permission, policy.requires, resource):
+                return False
+        return True
+
+    @cached_property
+    def acl_version_stamp(self):
+        return authorization.AclVersionStamp(
+            self.config.get('acl_version_interval') or 0)
+
+    def refresh_acl(self, user):
+        """Invalidates the users ACL if the global ACL version has changed.
+
+        This is disabled unless `acl_version_interval` has been configured.
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to refresh
+        """
+        if self.config.get('acl_version_interval') is None:
+            return
+        version = self.acl_version_stamp.current(self.session)
+        if user.acl.version != version:
+            user.acl.invalidate(version)
+
+    # Responses
+
+    def response_cookies(self, request):
+        """The cookies that will be added to the response of the request.
+
+        Cookies set here are added to the response once the controller has
+        been executed (see watson.auth.listeners.Dispatch).
+
+        Args:
+            request (watson.http.messages.Request): The HTTP request
+
+        Returns:
+            watson.http.cookies.CookieDict
+        """
+        return request.environ.setdefault(COOKIES_ENVIRON_KEY, CookieDict())
 
     # Actions
 
@@ -113,3 +318,22 @@ class Base(object):
     @abc.abstractmethod
     def handle_request(self, request):
         raise NotImplementedError  # pragma: no cover
+
+    async def ahandle_request(self, request):
+        """Asynchronously inject the authenticated user into the request.
+
+        Providers should override this to avoid blocking the event loop, by
+        default handle_request is run within the executor.
+        """
+        def handle_request():
+            self.handle_request(request)
+            return request.user
+        await self._run_in_worker(handle_request)
+
+
+def _get_running_loop():
+    # asyncio.get_running_loop was added in Python 3.7
+    get_running_loop = getattr(asyncio, 'get_running_loop', None)
+    if get_running_loop is None:  # pragma: no cover
+        return asyncio.get_event_loop()
+    return get_running_loop()
@@ -0,0 +1,143 @@
+import datetime
+import hashlib
+import hmac
+import secrets
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from watson.auth.instrumentation import (
+    handle_request_params, timed, HANDLE_REQUEST)
+from watson.auth.providers import abc
+from watson.db.contextmanagers import transaction_scope
+
+
+SEPARATOR = '.'
+PREFIX_ATTEMPTS = 3
+
+
+class Provider(abc.Base):
+
+    """Authenticates requests via an API key supplied in a request header.
+
+    Keys are made up of a short public prefix and a long random secret. Only
+    the prefix (uniquely indexed) and a SHA-256 digest of the secret are
+    stored, so retrieving a key is a single indexed query and validating it a
+    constant time comparison, rather than the hashing required for passwords.
+
+    If a `secret` is configured the digest is an HMAC keyed with that secret.
+    Should a generated prefix collide with an existing one, a new key is
+    generated (up to PREFIX_ATTEMPTS times).
+    """
+
+    defaults = {
+        'header': 'X-Api-Key',
+        'prefix_length': 16,
+        'secret_length': 32,
+    }
+
+    @property
+    def api_key_model(self):
+        from watson.auth.models import ApiKey
+        return ApiKey
+
+    def digest(self, secret):
+        """Generates the digest of the secret part of a key.
+
+        Args:
+            secret (string): The secret part of the key
+        """
+        secret = secret.encode(self.config['encoding'])
+        if self.config.get('secret'):
+            return hmac.new(
+                self.config['secret'].encode(self.config['encoding']),
+                secret, hashlib.sha256).hexdigest()
+        return hashlib.sha256(secret).hexdigest()
+
+    def generate_key(self, user, name=None, scopes=None, expires=None):
+        """Creates a new API key for the user.
+
+        The plain text key is only available at this point, so it must be
+        given to the user immediately.
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to create the key for
+            name (string): A human readable name for the key
+            scopes (list): The permission keys the key is limited to
+            expires (int): The number of seconds until the key expires
+
+        Returns:
+            tuple: The ApiKey model and the plain text key
+        """
+        prefix_length = self.config.get(
+            'prefix_length', self.defaults['prefix_length'])
+        secret_length = self.config.get(
+            'secret_length', self.defaults['secret_length'])
+        for attempt in range(PREFIX_ATTEMPTS):
+            prefix = secrets.token_hex(prefix_length // 2)
+            secret = secrets.token_urlsafe(secret_length)
+            api_key = self.api_key_model(
+                name=name,
+                prefix=prefix,
+                digest=self.digest(secret),
+                scopes=' '.join(scopes) if scopes else None)
+            if expires:
+                api_key.expires_date = datetime.datetime.now() + \
+                    datetime.timedelta(seconds=expires)
+            user.api_keys.append(api_key)
+            try:
+                with transaction_scope(self.session) as session:
+                    session.add(user)
+            except IntegrityError:
+                if attempt == PREFIX_ATTEMPTS - 1:
+                    raise
+            else:
+                return api_key, '{}{}{}'.format(prefix, SEPARATOR, secret)
+
+    def get_api_key(self, key):
+        """Retrieves the ApiKey model for a plain text key.
+
+        Args:
+            key (string): The plain text key
+
+        Returns:
+            The ApiKey or None if the key is invalid or has expired.
+        """
+        prefix, separator, secret = key.partition(SEPARATOR)
+        if not separator or not secret:
+            return None
+        api_key = self.session.query(self.api_key_model).options(
+            joinedload(self.api_key_model.user)).filter(
+                self.api_key_model.prefix == prefix).first()
+        if not api_key:
+            return None
+        if not hmac.compare_digest(api_key.digest, self.digest(secret)):
+            return None
+        if api_key.is_expired():
+            return None
+        return api_key
+
+    def revoke_key(self, api_key):
+        """Deletes an API key.
+        """
+        with transaction_scope(self.session) as session:
+            session.delete(api_key)
+
+    def login(self, user, request):
+        request.user = user
+
+    def logout(self, request):
+        request.user = None
+
+    @timed(HANDLE_REQUEST, handle_request_params)
+    def handle_request(self, request):
+        if not hasattr(request, 'user'):
+            request.user = None
+        if not request.user:
+            request.user = None
+            key = request.headers.get(
+                self.config.get('header', self.defaults['header']))
+            if key:
+                api_key = self.get_api_key(key.strip())
+                if api_key:
+                    user = api_key.user
+                    user.acl.limit_to_scopes(api_key.scope_keys)
+                    request.user = user
@@ -0,0 +1,202 @@
+import base64
+import binascii
+import collections
+import hashlib
+import hmac
+import os
+import threading
+import time
+from watson.auth import profiling
+from watson.auth.instrumentation import (
+    annotate, authenticate_params, handle_request_params, timed,
+    AUTHENTICATE, HANDLE_REQUEST)
+from watson.auth.providers import abc
+
+
+class CredentialCache(object):
+
+    """A bounded, thread safe cache of credentials that have been verified.
+
+    Entries are keyed by an HMAC of the supplied username and password (the
+    plain text password is never stored), and hold the hashed password of the
+    user at the time of verification so that an entry is invalidated as soon
+    as the password is changed.
+
+    Attributes:
+        max_size (int): The maximum number of entries to store
+        ttl (int): The number of seconds an entry is valid for
+    """
+
+    def __init__(self, max_size=1024, ttl=300, key=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._key = key or os.urandom(32)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, username, password, encoding='utf-8'):
+        message = '{}:{}'.format(username, password).encode(encoding)
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def get(self, digest, password_hash):
+        """Determine whether or not the credentials have been verified.
+
+        Args:
+            digest (bytes): The digest of the credentials
+            password_hash (string): The current hashed password of the user
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if not entry:
+                return False
+            expires, cached_hash = entry
+            if expires < time.monotonic() or not hmac.compare_digest(
+                    cached_hash, password_hash):
+                del self._entries[digest]
+                return False
+            self._entries.move_to_end(digest)
+            return True
+
+    def set(self, digest, password_hash):
+        with self._lock:
+            self._entries[digest] = (
+                time.monotonic() + self.ttl, password_hash)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Provider(abc.Base):
+
+    """Authenticates requests via the HTTP Basic Authorization header.
+
+    Verified credentials are cached so that clients making many requests
+    only incur the cost of hashing their password once per cache window, and
+    the number of concurrent verifications per client is limited.
+    """
+
+    defaults = {
+        'realm': 'watson',
+        'cache': {
+            'max_size': 1024,
+            'ttl': 300,
+        },
+        'concurrency': {
+            'max_per_client': 2,
+            'timeout': 5,
+        },
+    }
+
+    unauthenticated_status_code = '401'
+    unauthorized_status_code = '403'
+
+    def __init__(self, config, session, async_session=None, executor=None):
+        super(Provider, self).__init__(
+            config, session, async_session, executor)
+        cache_config = config.get('cache', self.defaults['cache'])
+        concurrency_config = config.get(
+            'concurrency', self.defaults['concurrency'])
+        self.cache = CredentialCache(
+            max_size=cache_config['max_size'], ttl=cache_config['ttl'])
+        self.max_per_client = concurrency_config['max_per_client']
+        self.timeout = concurrency_config['timeout']
+        self._client_semaphores = {}
+        self._client_semaphores_lock = threading.Lock()
+
+    def _client_semaphore(self, username):
+        with self._client_semaphores_lock:
+            semaphore = self._client_semaphores.get(username)
+            if not semaphore:
+                semaphore = threading.BoundedSemaphore(self.max_per_client)
+                self._client_semaphores[username] = semaphore
+            return semaphore
+
+    @profiling.profiled()
+    @timed(AUTHENTICATE, authenticate_params)
+    def authenticate(self, username, password):
+        """Validate a user against a supplied username and password.
+
+        If the credentials have been verified within the cache window then
+        the password is not hashed again.
+
+        Args:
+            username (string): The username of the user.
+            password (string): The password of the user.
+        """
+        if len(password) > self.config['password']['max_length']:
+            return None
+        user = self.get_user(username)
+        if not user:
+            return None
+        digest = self.cache.digest(username, password, self.config['encoding'])
+        if self.cache.get(digest, user.password):
+            annotate(cache_hit=True)
+            return user
+        semaphore = self._client_semaphore(username)
+        if not semaphore.acquire(timeout=self.timeout):
+            return None
+        try:
+            # Another request may have verified the same credentials whilst
+            # waiting for the semaphore.
+            if self.cache.get(digest, user.password):
+                annotate(cache_hit=True)
+                return user
+            annotate(cache_hit=False)
+            if not self.check_password(user, password):
+                return None
+            self.cache.set(digest, user.password)
+            return user
+        finally:
+            semaphore.release()
+
+    def credentials_from_request(self, request):
+        """Retrieves the username and password from the Authorization header.
+
+        Returns:
+            tuple: (username, password) or None if invalid or not supplied.
+        """
+        header = request.headers.get('Authorization')
+        if not header:
+            return None
+        parts = header.split(' ', 1)
+        if len(parts) != 2 or parts[0].lower() != 'basic':
+            return None
+        try:
+            decoded = base64.b64decode(parts[1].strip()).decode(
+                self.config['encoding'])
+        except (binascii.Error, UnicodeDecodeError):
+            return None
+        username, separator, password = decoded.partition(':')
+        if not separator:
+            return None
+        return username, password
+
+    def challenge(self):
+        """The value of the WWW-Authenticate header sent to unauthenticated
+        clients.
+        """
+        return 'Basic realm="{}"'.format(
+            self.config.get('realm', self.defaults['realm']))
+
+    def login(self, user, request):
+        request.user = user
+
+    def logout(self, request):
+        request.user = None
+
+    @timed(HANDLE_REQUEST, handle_request_params)
+    def handle_request(self, request):
+        if not hasattr(request, 'user'):
+            request.user = None
+        if not request.user:
+            request.user = None
+            credentials = self.credentials_from_request(request)
+            if credentials:
+                request.user = self.authenticate(*credentials)
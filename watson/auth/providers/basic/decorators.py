@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from watson.auth import authorization, guards, profiling
+
+
+DEPENDENCY = 'watson.auth.providers.Basic'
+get_provider = guards.LazyProvider(DEPENDENCY)
+
+
+def auth(func=None, roles=None, permissions=None, requires=None,
+         resource=None):
+    """Guards a controller action against unauthorized and unauthenticated access.
+
+    Unauthenticated requests receive a 401 response with a WWW-Authenticate
+    challenge, and unauthorized requests receive a 403 response.
+
+    Args:
+        roles (list|string): A list of roles that are able to access the route
+        permissions (list|string): A list of permissions that are able to access the route
+        requires (list): A list of watson.validators.abc.Validator objects with which to validate the user against
+        resource (tuple): A (resource_type, route_param) pair, the permissions will be validated against the resource identified by that route param
+
+    Example:
+
+    .. code-block:: python
+
+        class MyController(controllers.Rest):
+            @auth(roles='service')
+            def GET(self):
+                pass
+    """
+    def decorator(func):
+        policy = authorization.Policy(roles, permissions, requires, resource)
+        guard = guards.Guard(DEPENDENCY, policy, None, False, True)
+
+        @profiling.profiled('watson.auth.providers.basic.decorators.auth')
+        def authorize(self, kwargs):
+            if guards.is_enforced(self, guard):
+                return None
+            user = self.request.user
+            provider = get_provider(self)
+            if not user:
+                self.response.status_code = 401
+                self.response.headers.add(
+                    'WWW-Authenticate', provider.challenge(), replace=True)
+                return self.response
+            if not provider.authorize(user, policy, kwargs):
+                self.response.status_code = 403
+                return self.response
+            return None
+
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(self, *args, **kwargs):
+                response = authorize(self, kwargs)
+                if response is not None:
+                    return response
+                return await func(self, **kwargs)
+        else:
+            def wrapper(self, *args, **kwargs):
+                response = authorize(self, kwargs)
+                if response is not None:
+                    return response
+                return func(self, **kwargs)
+        return guards.register(wrapper, guard)
+
+    return decorator(func) if func else decorator
@@ -1,5 +1,7 @@
 import datetime
 import jwt
+from watson.auth.instrumentation import (
+    annotate, handle_request_params, timed, HANDLE_REQUEST, JWT_DECODE)
 from watson.auth.providers import abc, exceptions
 
 
@@ -36,21 +38,48 @@ class Provider(abc.Base):
             return self._create_token(request.user, expiry=-1)
         return ''
 
-    def handle_request(self, request):
+    def _username_from_request(self, request):
         if not hasattr(request, 'user'):
             request.user = None
-        if not request.user:
-            authorization_header = request.headers.get('Authorization')
-            request.user = None
-            if authorization_header:
-                token = authorization_header.split(' ')[1].encode(
-                    self.config['encoding'])
-                try:
-                    payload = jwt.decode(
-                        token,
-                        self.config['secret'],
-                        algorithms=[self.config['algorithm']])
-                    username = payload[self.config['key']]
-                    request.user = self.get_user(username)
-                except:  # noqa, pragma: no cover
-                    pass
+        if request.user:
+            return None
+        authorization_header = request.headers.get('Authorization')
+        request.user = None
+        if authorization_header:
+            token = authorization_header.split(' ')[1].encode(
+                self.config['encoding'])
+            payload = self.decode_token(token)
+            if payload:
+                return payload.get(self.config['key'])
+        return None
+
+    @timed(JWT_DECODE)
+    def decode_token(self, token):
+        """Verifies and decodes a token.
+
+        Args:
+            token (bytes): The encoded token
+
+        Returns:
+            dict: The payload of the token, or None if it is invalid
+        """
+        try:
+            payload = jwt.decode(
+                token,
+                self.config['secret'],
+                algorithms=[self.config['algorithm']])
+        except Exception:
+            payload = None
+        annotate(valid=payload is not None)
+        return payload
+
+    @timed(HANDLE_REQUEST, handle_request_params)
+    def handle_request(self, request):
+        username = self._username_from_request(request)
+        if username:
+            request.user = self.get_user(username)
+
+    async def ahandle_request(self, request):
+        username = self._username_from_request(request)
+        if username:
+            request.user = await self.aget_user(username)
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import functools
 from watson.common import imports
+from watson.auth import authorization, guards, profiling
 from watson.framework.views import Model
 
 
 DEPENDENCY = 'watson.auth.providers.JWT'
+get_provider = guards.LazyProvider(DEPENDENCY)
+
+load_form_class = functools.lru_cache(maxsize=None)(
+    imports.load_definition_from_string)
 
 
 def login(
@@ -28,25 +35,49 @@ def login(
                 pass
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
-            form = imports.load_definition_from_string(
-                form_class)(action=self.request)
+        def prepare(self):
+            provider = get_provider(self)
+            form = load_form_class(form_class)(action=self.request)
             form.data = self.request
-            user = None
-            if self.request.is_method(method):
-                result = {}
+            return provider, form
+
+        def complete(self, provider, user):
+            result = {}
+            if user and provider.user_meets_requirements(user, requires):
+                result['token'] = provider.login(user, self.request)
+            else:
+                self.response.status_code = 403
+                result['message'] = 'Unable to authenticate the specified credentials.'
+            return Model(format='json', data=result)
+
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(self, *args, **kwargs):
+                provider, form = prepare(self)
+                if self.request.is_method(method):
+                    user = None
+                    if form.is_valid():
+                        user = await provider.aauthenticate(
+                            username=getattr(
+                                form, provider.user_model_identifier),
+                            password=form.password)
+                    return complete(self, provider, user)
+                return await func(self, **kwargs)
+        else:
+            @profiling.profiled('watson.auth.providers.jwt.decorators.login')
+            def authenticate(self, provider, form):
+                user = None
                 if form.is_valid():
                     user = provider.authenticate(
-                        username=getattr(form, provider.user_model_identifier),
+                        username=getattr(
+                            form, provider.user_model_identifier),
                         password=form.password)
-                if user and provider.user_meets_requirements(user, requires):
-                    result['token'] = provider.login(user, self.request)
-                else:
-                    self.response.status_code = 403
-                    result['message'] = 'Unable to authenticate the specified credentials.'
-                return Model(format='json', data=result)
-            return func(self, **kwargs)
+                return complete(self, provider, user)
+
+            def wrapper(self, *args, **kwargs):
+                provider, form = prepare(self)
+                if self.request.is_method(method):
+                    return authenticate(self, provider, form)
+                return func(self, **kwargs)
         return wrapper
     return decorator(func) if func else decorator
 
@@ -66,22 +97,37 @@ def logout(func=None):
                 pass
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
-            func(self, **kwargs)
-            return Model(
-                format='json', data={'token': provider.logout(self.request)})
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(self, *args, **kwargs):
+                provider = get_provider(self)
+                await func(self, **kwargs)
+                return Model(
+                    format='json',
+                    data={'token': provider.logout(self.request)})
+        else:
+            @profiling.profiled('watson.auth.providers.jwt.decorators.logout')
+            def log_out(self, provider):
+                return provider.logout(self.request)
+
+            def wrapper(self, *args, **kwargs):
+                provider = get_provider(self)
+                func(self, **kwargs)
+                return Model(
+                    format='json',
+                    data={'token': log_out(self, provider)})
         return wrapper
     return decorator(func) if func else decorator
 
 
-def auth(func=None, roles=None, permissions=None, requires=None):
+def auth(func=None, roles=None, permissions=None, requires=None,
+         resource=None):
     """Guards a controller action against unauthorized and unauthenticated access.
 
     Args:
         roles (list|string): A list of roles that are able to access the route
         permissions (list|string): A list of permissions that are able to access the route
         requires (list): A list of watson.validators.abc.Validator objects with which to validate the user against
+        resource (tuple): A (resource_type, route_param) pair, the permissions will be validated against the resource identified by that route param
         login_redirect (string): A URL/route to redirect the user to if they are unauthenticated
         should_remember_referrer (boolean): Whether or not
 
@@ -93,23 +139,45 @@ def auth(func=None, roles=None, permissions=None, requires=None):
             @auth(roles='admin')
             def dashboard_action(self):
                 pass
+
+        class PostController(controllers.Action):
+            @auth(permissions='posts.edit', resource=('post', 'id'))
+            def edit_action(self, id):
+                pass
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
+        policy = authorization.Policy(roles, permissions, requires, resource)
+        guard = guards.Guard(DEPENDENCY, policy, None, False, False)
+
+        @profiling.profiled('watson.auth.providers.jwt.decorators.auth')
+        def authorize(self, kwargs):
+            if guards.is_enforced(self, guard):
+                return None
             user = self.request.user
             status_code = 200
             if not user:
                 status_code = 403
-            else:
-                if not provider.is_authorized(
-                        user, roles, permissions, requires):
-                    status_code = 401
+            elif not get_provider(self).authorize(
+                    user, policy, kwargs):
+                status_code = 401
             if status_code != 200:
                 self.response.status_code = status_code
                 return self.response
-            return func(self, **kwargs)
-        return wrapper
+            return None
+
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(self, *args, **kwargs):
+                response = authorize(self, kwargs)
+                if response is not None:
+                    return response
+                return await func(self, **kwargs)
+        else:
+            def wrapper(self, *args, **kwargs):
+                response = authorize(self, kwargs)
+                if response is not None:
+                    return response
+                return func(self, **kwargs)
+        return guards.register(wrapper, guard)
 
     return decorator(func) if func else decorator
 
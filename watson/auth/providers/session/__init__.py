@@ -1,27 +1,388 @@
-from watson.auth.providers import abc
+import datetime
+import hashlib
+import hmac
+import secrets
+import time
+from watson.auth import signing, snapshots
+from watson.auth.instrumentation import (
+    annotate, handle_request_params, timed, HANDLE_REQUEST)
+from watson.auth.providers import abc, exceptions
+from watson.common.decorators import cached_property
+from watson.db.contextmanagers import transaction_scope
+
+
+SEPARATOR = '.'
 
 
 class Provider(abc.Base):
 
-    defaults = {}
+    """Authenticates users via the request session.
+
+    If `snapshot` is enabled, a signed snapshot of the user (their id,
+    identifier, roles and permissions) is stored in the session alongside
+    the identifier. The user is then restored from the snapshot rather than
+    the database, until the snapshot is older than `revalidate_interval`
+    seconds or the ACL version has changed.
+
+    If `cookie` is enabled, the session store is not used at all. Instead
+    the identifier, issue time and ACL version of the user (and the snapshot
+    if enabled) are stored in a signed, and optionally encrypted, cookie so
+    that no shared session store is required between nodes.
+
+    If `remember` is enabled, users that request to be remembered when
+    logging in are issued a persistent token. Once their session has expired
+    they are authenticated via the token with a single indexed lookup rather
+    than having to log in again. Tokens are rotated each time they are used.
+    """
+
+    defaults = {
+        'snapshot': {
+            'enabled': False,
+            'revalidate_interval': 300,
+        },
+        'cookie': {
+            'enabled': False,
+            'name': 'watson.auth',
+            'max_age': 86400,
+            'encrypt': False,
+            'path': '/',
+            'domain': None,
+            'secure': False,
+            'httponly': True,
+        },
+        'remember': {
+            'enabled': False,
+            'name': 'watson.auth.remember',
+            'max_age': 2592000,
+        }
+    }
 
     def _validate_configuration(self, config):
         super(Provider, self)._validate_configuration(config)
+        if config.get('snapshot', {}).get('enabled') and 'secret' not in config:
+            raise exceptions.InvalidConfiguration(
+                'Secret not specified, ensure "secret" key is set on provider configuration when snapshots are enabled.')
+        cookie = config.get('cookie', {})
+        if cookie.get('enabled') and 'secret' not in config:
+            raise exceptions.InvalidConfiguration(
+                'Secret not specified, ensure "secret" key is set on provider configuration when cookies are enabled.')
+        if cookie.get('enabled') and cookie.get('encrypt'):
+            try:
+                import cryptography  # noqa
+            except ImportError:
+                raise exceptions.InvalidConfiguration(
+                    'Encrypted cookies require the "cryptography" package to be installed.')
 
-    def handle_request(self, request):
+    @property
+    def snapshot_enabled(self):
+        return self.config.get('snapshot', {}).get('enabled', False)
+
+    @property
+    def snapshot_key(self):
+        return '{}.snapshot'.format(self.config['key'])
+
+    @property
+    def cookie_enabled(self):
+        return self.config.get('cookie', {}).get('enabled', False)
+
+    @property
+    def remember_enabled(self):
+        return self.config.get('remember', {}).get('enabled', False)
+
+    @cached_property
+    def cookie_serializer(self):
+        return signing.Serializer(
+            self.config['secret'],
+            self.config['encoding'],
+            self.config['cookie'].get('encrypt', False))
+
+    def _username_from_request(self, request):
         if not hasattr(request, 'user'):
             request.user = None
-        if not request.user:
-            request.user = None
-            username = request.session[self.config['key']]
-            if username:
-                request.user = self.get_user(username)
+        if request.user:
+            return None
+        request.user = None
+        if self.cookie_enabled:
+            state = self.read_cookie(request)
+            return state['i'] if state else None
+        return request.session[self.config['key']]
+
+    # Cookies
+
+    @property
+    def _cookie_cache_key(self):
+        return '{}.{}'.format(
+            abc.COOKIES_ENVIRON_KEY, self.config['cookie']['name'])
+
+    def read_cookie(self, request):
+        """Retrieves the verified auth state from the request cookie.
+
+        Returns:
+            dict or None if the cookie is missing, invalid or has expired.
+        """
+        cache_key = self._cookie_cache_key
+        if cache_key not in request.environ:
+            state = None
+            morsel = request.cookies[self.config['cookie']['name']]
+            if morsel:
+                state = self.cookie_serializer.loads(morsel.value)
+            if state and time.time() - state['t'] > self.config['cookie']['max_age']:
+                state = None
+            request.environ[cache_key] = state
+        return request.environ[cache_key]
+
+    def write_cookie(self, user, request, snapshot=None):
+        """Stores the auth state of the user in a signed cookie.
+
+        The issue time of an existing cookie for the same user is retained
+        so that reissuing the cookie does not extend its lifetime.
+
+        Args:
+            user (watson.auth.models.UserMixin): The authenticated user
+            request (watson.http.messages.Request): The HTTP request
+            snapshot (dict): The snapshot of the user if enabled
+        """
+        identifier = getattr(user, self.user_model_identifier)
+        existing = self.read_cookie(request)
+        issued = int(time.time())
+        if existing and existing['i'] == identifier:
+            issued = existing['t']
+        state = {
+            'i': identifier,
+            't': issued,
+            'v': self._current_acl_version(),
+        }
+        if snapshot:
+            state['s'] = snapshot
+        cookie = self.config['cookie']
+        self._add_cookie(
+            request, cookie['name'], self.cookie_serializer.dumps(state),
+            cookie['max_age'])
+
+    def delete_cookie(self, request):
+        """Expires the auth cookie.
+        """
+        self._add_cookie(request, self.config['cookie']['name'], '').expire()
+
+    def _add_cookie(self, request, name, value, max_age=0):
+        cookie = self.config.get('cookie', self.defaults['cookie'])
+        return self.response_cookies(request).add(
+            name,
+            value,
+            expires=max_age,
+            path=cookie.get('path'),
+            domain=cookie.get('domain'),
+            secure=cookie.get('secure') or request.is_secure(),
+            httponly=cookie.get('httponly'))
+
+    # Remember me
+
+    @property
+    def remember_token_model(self):
+        from watson.auth.models import RememberToken
+        return RememberToken
+
+    def _remember_digest(self, validator):
+        return hashlib.sha256(
+            validator.encode(self.config['encoding'])).hexdigest()
+
+    def remember(self, user, request):
+        """Issues a persistent login token to the user.
+
+        The token is only available in plain text at this point, and is sent
+        to the user as a cookie.
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to remember
+            request (watson.http.messages.Request): The HTTP request
+        """
+        config = self.config['remember']
+        selector = secrets.token_urlsafe(12)
+        validator = secrets.token_urlsafe(32)
+        token = self.remember_token_model(
+            selector=selector,
+            digest=self._remember_digest(validator),
+            expires_date=datetime.datetime.now() + datetime.timedelta(
+                seconds=config['max_age']))
+        with transaction_scope(self.session) as session:
+            user.remember_tokens.append(token)
+            session.add(user)
+        self._add_cookie(
+            request, config['name'],
+            '{}{}{}'.format(selector, SEPARATOR, validator),
+            config['max_age'])
+        return token
+
+    def _remember_token_from_request(self, request):
+        morsel = request.cookies[self.config['remember']['name']]
+        if not morsel or not morsel.value:
+            return None, None
+        selector, separator, validator = morsel.value.partition(SEPARATOR)
+        if not separator or not validator:
+            return None, None
+        token = self.session.query(self.remember_token_model).filter(
+            self.remember_token_model.selector == selector).first()
+        return token, validator
+
+    def user_from_remember_token(self, request):
+        """Authenticates the user via the persistent login token in the
+        request cookies.
+
+        Valid tokens are rotated. If the selector is valid but the validator
+        does not match, the token has likely been stolen and all of the users
+        tokens are revoked.
+
+        Returns:
+            watson.auth.models.UserMixin or None if the token is invalid.
+        """
+        token, validator = self._remember_token_from_request(request)
+        if not token:
+            return None
+        user = token.user
+        if not hmac.compare_digest(
+                token.digest, self._remember_digest(validator)):
+            self.revoke_remember_tokens(user)
+            return None
+        with transaction_scope(self.session) as session:
+            session.delete(token)
+        if token.is_expired():
+            return None
+        self.remember(user, request)
+        return user
+
+    def revoke_remember_tokens(self, user):
+        """Deletes all of the persistent login tokens of the user.
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to forget
+        """
+        model = self.remember_token_model
+        with transaction_scope(self.session) as session:
+            session.query(model).filter(model.user_id == user.id).delete(
+                synchronize_session=False)
+        if user in self.session:
+            self.session.expire(user, ['remember_tokens'])
+
+    def forget(self, request):
+        """Revokes the persistent login token in the request and expires the
+        cookie.
+        """
+        token, _ = self._remember_token_from_request(request)
+        if token:
+            with transaction_scope(self.session) as session:
+                session.delete(token)
+        self._add_cookie(
+            request, self.config['remember']['name'], '').expire()
+
+    # Snapshots
+
+    def _current_acl_version(self):
+        if self.config.get('acl_version_interval') is None:
+            return None
+        return self.acl_version_stamp.current(self.session)
+
+    def store_snapshot(self, user, request):
+        """Stores a signed snapshot of the user in the session (or cookie).
+
+        Args:
+            user (watson.auth.models.UserMixin): The user to snapshot
+            request (watson.http.messages.Request): The HTTP request
+        """
+        snapshot = snapshots.create(
+            user, self.user_model_identifier, self._current_acl_version())
+        if self.cookie_enabled:
+            self.write_cookie(user, request, snapshot)
+            return
+        request.session[self.snapshot_key] = signing.sign(
+            snapshot, self.config['secret'], self.config['encoding'])
+
+    def _stored_snapshot(self, request):
+        if self.cookie_enabled:
+            state = self.read_cookie(request)
+            return state.get('s') if state else None
+        return signing.unsign(
+            request.session[self.snapshot_key],
+            self.config['secret'],
+            self.config['encoding'])
+
+    def user_from_snapshot(self, request, username):
+        """Restores the user from the snapshot stored in the session.
+
+        Returns:
+            watson.auth.snapshots.User or None if the snapshot is missing,
+            invalid or needs to be revalidated.
+        """
+        snapshot = self._stored_snapshot(request)
+        if not snapshot or snapshot['i'] != username:
+            return None
+        interval = self.config['snapshot']['revalidate_interval']
+        if time.time() - snapshot['t'] > interval:
+            return None
+        if snapshot['v'] != self._current_acl_version():
+            return None
+        return snapshots.User(
+            snapshot,
+            self.user_model_identifier,
+            lambda: self.get_user(username),
+            self.session)
+
+    # Actions
+
+    @timed(HANDLE_REQUEST, handle_request_params)
+    def handle_request(self, request):
+        username = self._username_from_request(request)
+        if not username:
+            if request.user is None and self.remember_enabled:
+                user = self.user_from_remember_token(request)
+                if user:
+                    self.login(user, request)
+            return
+        if self.snapshot_enabled:
+            request.user = self.user_from_snapshot(request, username)
+            annotate(cache_hit=bool(request.user))
+            if request.user:
+                return
+        request.user = self.get_user(username)
+        if request.user and self.snapshot_enabled:
+            self.store_snapshot(request.user, request)
+
+    async def ahandle_request(self, request):
+        username = self._username_from_request(request)
+        if not username:
+            if request.user is None and self.remember_enabled:
+                user = await self._run_in_worker(
+                    self.user_from_remember_token, request)
+                if user:
+                    self.login(user, request)
+            return
+        if self.snapshot_enabled:
+            request.user = self.user_from_snapshot(request, username)
+            if request.user:
+                return
+        request.user = await self.aget_user(username)
+        if request.user and self.snapshot_enabled:
+            self.store_snapshot(request.user, request)
 
     def login(self, user, request):
         request.user = user
-        request.session[self.config['key']] = getattr(
-            user, self.user_model_identifier)
+        if self.cookie_enabled:
+            request.environ[self._cookie_cache_key] = None
+        if self.snapshot_enabled:
+            self.store_snapshot(user, request)
+        elif self.cookie_enabled:
+            self.write_cookie(user, request)
+        if not self.cookie_enabled:
+            request.session[self.config['key']] = getattr(
+                user, self.user_model_identifier)
 
     def logout(self, request):
-        del request.session[self.config['key']]
+        if self.remember_enabled:
+            self.forget(request)
+        if self.cookie_enabled:
+            request.environ[self._cookie_cache_key] = None
+            self.delete_cookie(request)
+        else:
+            del request.session[self.config['key']]
+            if self.snapshot_enabled:
+                del request.session[self.snapshot_key]
         request.user = None
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import functools
 from urllib import parse
 from watson.common import imports
+from watson.auth import authorization, guards, profiling
 from watson.framework import exceptions
 
 DEPENDENCY = 'watson.auth.providers.Session'
+get_provider = guards.LazyProvider(DEPENDENCY)
+
+load_form_class = functools.lru_cache(maxsize=None)(
+    imports.load_definition_from_string)
 
 
 def login(
@@ -13,7 +20,8 @@ def login(
         redirect_callback=None,
         requires=None,
         invalid_credentials_message='Invalid username and/or password.',
-        form_class='watson.auth.forms.Login'):
+        form_class='watson.auth.forms.Login',
+        remember_field='remember'):
     """Attempts to log in a user based upon their supplied credentials.
 
     Args:
@@ -22,6 +30,10 @@ def login(
         redirect_callback (callable): A callable that allows you to dynamically change where the user is redirected to
         requires (list): A list of watson.validators.abc.Validator objects with which to validate the user against
         form_class (string): The form used to validate the user credentials against
+        remember_field (string): The posted field that requests the user to be remembered
+
+    If `remember` is enabled on the provider and the `remember_field` was
+    posted, the user will also be issued a persistent login token.
 
     Example:
 
@@ -33,35 +45,68 @@ def login(
                 pass
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
+        def prepare(self):
+            provider = get_provider(self)
             redirect_url = provider.config.get('authenticated_route', redirect)
             if self.request.user:
-                return self.redirect(redirect_url)
-            form = imports.load_definition_from_string(
-                form_class)(action=self.request)
+                return provider, None, self.redirect(redirect_url)
+            form = load_form_class(form_class)(action=self.request)
             form.data = self.request
-            user = None
-            if self.request.is_method(method):
+            return provider, form, None
+
+        def complete(self, provider, form, user):
+            redirect_url = provider.config.get('authenticated_route', redirect)
+            if user:
+                if self.request.get['redirect']:
+                    redirect_url = parse.unquote_plus(
+                        self.request.get['redirect'])
+                if provider.user_meets_requirements(user, requires):
+                    provider.login(user, self.request)
+                    if provider.remember_enabled and \
+                            self.request.post.get(remember_field):
+                        provider.remember(user, self.request)
+                    if redirect_callback:
+                        redirect_url = redirect_callback(user)
+            else:
+                self.flash_messages.add(
+                    invalid_credentials_message, namespace='error')
+                redirect_url = form.action
+            return self.redirect(redirect_url, clear=True)
+
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(self, *args, **kwargs):
+                provider, form, response = prepare(self)
+                if response is not None:
+                    return response
+                if self.request.is_method(method):
+                    user = None
+                    if form.is_valid():
+                        user = await provider.aauthenticate(
+                            username=getattr(
+                                form, provider.user_model_identifier),
+                            password=form.password)
+                    return complete(self, provider, form, user)
+                kwargs['form'] = form
+                return await func(self, **kwargs)
+        else:
+            @profiling.profiled('watson.auth.providers.session.decorators.login')
+            def authenticate(self, provider, form):
+                user = None
                 if form.is_valid():
                     user = provider.authenticate(
-                        username=getattr(form, provider.user_model_identifier),
+                        username=getattr(
+                            form, provider.user_model_identifier),
                         password=form.password)
-                if user:
-                    if self.request.get['redirect']:
-                        redirect_url = parse.unquote_plus(
-                            self.request.get['redirect'])
-                    if provider.user_meets_requirements(user, requires):
-                        provider.login(user, self.request)
-                        if redirect_callback:
-                            redirect_url = redirect_callback(user)
-                else:
-                    self.flash_messages.add(
-                        invalid_credentials_message, namespace='error')
-                    redirect_url = form.action
-                return self.redirect(redirect_url, clear=True)
-            kwargs['form'] = form
-            return func(self, **kwargs)
+                return complete(self, provider, form, user)
+
+            def wrapper(self, *args, **kwargs):
+                provider, form, response = prepare(self)
+                if response is not None:
+                    return response
+                if self.request.is_method(method):
+                    return authenticate(self, provider, form)
+                kwargs['form'] = form
+                return func(self, **kwargs)
         return wrapper
     return decorator(func) if func else decorator
 
@@ -82,11 +127,22 @@ def logout(func=None, redirect=None):
                 pass
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
-            func(self, **kwargs)
-            provider.logout(self.request)
-            return self.redirect(redirect, clear=True)
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(self, *args, **kwargs):
+                provider = get_provider(self)
+                await func(self, **kwargs)
+                provider.logout(self.request)
+                return self.redirect(redirect, clear=True)
+        else:
+            @profiling.profiled('watson.auth.providers.session.decorators.logout')
+            def log_out(self, provider):
+                provider.logout(self.request)
+
+            def wrapper(self, *args, **kwargs):
+                provider = get_provider(self)
+                func(self, **kwargs)
+                log_out(self, provider)
+                return self.redirect(redirect, clear=True)
         return wrapper
     return decorator(func) if func else decorator
 
@@ -96,6 +152,7 @@ def auth(
         roles=None,
         permissions=None,
         requires=None,
+        resource=None,
         login_redirect=None,
         should_remember_referrer=True):
     """Guards a controller action against unauthorized and unauthenticated access.
@@ -104,6 +161,7 @@ def auth(
         roles (list|string): A list of roles that are able to access the route
         permissions (list|string): A list of permissions that are able to access the route
         requires (list): A list of watson.validators.abc.Validator objects with which to validate the user against
+        resource (tuple): A (resource_type, route_param) pair, the permissions will be validated against the resource identified by that route param
         login_redirect (string): A URL/route to redirect the user to if they are unauthenticated
         should_remember_referrer (boolean): Whether or not
 
@@ -115,11 +173,23 @@ def auth(
             @auth(roles='admin')
             def dashboard_action(self):
                 pass
+
+        class PostController(controllers.Action):
+            @auth(permissions='posts.edit', resource=('post', 'id'))
+            def edit_action(self, id):
+                pass
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
+        policy = authorization.Policy(roles, permissions, requires, resource)
+        guard = guards.Guard(
+            DEPENDENCY, policy, login_redirect, True, False)
+
+        @profiling.profiled('watson.auth.providers.session.decorators.auth')
+        def authorize(self, kwargs):
+            if guards.is_enforced(self, guard):
+                return None
             user = self.request.user
+            provider = get_provider(self)
             if not user:
                 redirect_to = login_redirect if login_redirect else provider.config.get('login_route')
                 if should_remember_referrer and redirect_to:
@@ -131,14 +201,25 @@ def auth(
                 raise exceptions.ApplicationError(
                     status_code='403',
                     message='You must be logged in to view this page.')
-            else:
-                if not provider.is_authorized(
-                        user, roles, permissions, requires):
-                    raise exceptions.ApplicationError(
-                        status_code='401',
-                        message='You must be logged in to view this page.')
-            return func(self, **kwargs)
-        return wrapper
+            elif not provider.authorize(user, policy, kwargs):
+                raise exceptions.ApplicationError(
+                    status_code='401',
+                    message='You are not authorized to view this page.')
+            return None
+
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(self, *args, **kwargs):
+                response = authorize(self, kwargs)
+                if response is not None:
+                    return response
+                return await func(self, **kwargs)
+        else:
+            def wrapper(self, *args, **kwargs):
+                response = authorize(self, kwargs)
+                if response is not None:
+                    return response
+                return func(self, **kwargs)
+        return guards.register(wrapper, guard)
 
     return decorator(func) if func else decorator
 
@@ -164,13 +245,13 @@ def forgotten(
         error_message (string): The flash message that will be displayed to the user if it fails
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
+        @profiling.profiled('watson.auth.providers.session.decorators.forgotten')
+        def request_reset(self, kwargs):
+            provider = get_provider(self)
             redirect_url = provider.config.get('authenticated_route', redirect)
             if self.request.user:
                 return self.redirect(redirect_url)
-            form = imports.load_definition_from_string(
-                form_class)(action=self.request)
+            form = load_form_class(form_class)(action=self.request)
             if self.request.is_method(method):
                 user = None
                 namespace = 'error'
@@ -196,6 +277,12 @@ def forgotten(
                 self.flash_messages.add(message, namespace)
                 return self.redirect(str(self.request.url))
             kwargs['form'] = form
+            return None
+
+        def wrapper(self, *args, **kwargs):
+            response = request_reset(self, kwargs)
+            if response is not None:
+                return response
             return func(self, **kwargs)
         return wrapper
 
@@ -229,13 +316,13 @@ def reset(
         invalid_message (string): The flash message that will be displayed to the user if it fails due to a password mismatch
     """
     def decorator(func):
-        def wrapper(self, *args, **kwargs):
-            provider = self.container.get(DEPENDENCY)
+        @profiling.profiled('watson.auth.providers.session.decorators.reset')
+        def reset_password(self, kwargs):
+            provider = get_provider(self)
             redirect_url = provider.config.get('authenticated_route', redirect)
             if self.request.user:
                 return self.redirect(redirect_url)
-            form = imports.load_definition_from_string(
-                form_class)(action=self.request)
+            form = load_form_class(form_class)(action=self.request)
             kwargs['form'] = form
             forgotten_password_token_manager = self.container.get(
                 'auth_forgotten_password_token_manager')
@@ -269,6 +356,12 @@ def reset(
                 self.flash_messages.add(message, namespace)
                 return self.redirect(
                     provider.config['forgotten_password_route'])
+            return None
+
+        def wrapper(self, *args, **kwargs):
+            response = reset_password(self, kwargs)
+            if response is not None:
+                return response
             return func(self, **kwargs)
         return wrapper
 
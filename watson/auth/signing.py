@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+
+
+SEPARATOR = '.'
+
+
+def _encode(value):
+    return base64.urlsafe_b64encode(value).rstrip(b'=')
+
+
+def _decode(value):
+    return base64.urlsafe_b64decode(value + b'=' * (-len(value) % 4))
+
+
+def _signature(payload, secret, encoding):
+    if isinstance(secret, str):
+        secret = secret.encode(encoding)
+    return _encode(hmac.new(secret, payload, hashlib.sha256).digest())
+
+
+def sign(data, secret, encoding='utf-8'):
+    """Serializes and signs the data.
+
+    Args:
+        data (mixed): JSON serializable data
+        secret (string|bytes): The key used to sign the data
+
+    Returns:
+        string: The compact, url safe, signed value
+    """
+    payload = _encode(json.dumps(
+        data, separators=(',', ':'), sort_keys=True).encode(encoding))
+    signature = _signature(payload, secret, encoding)
+    return (payload + SEPARATOR.encode(encoding) + signature).decode(encoding)
+
+
+def unsign(value, secret, encoding='utf-8'):
+    """Verifies and deserializes a value created by sign.
+
+    Args:
+        value (string): The signed value
+        secret (string|bytes): The key used to sign the data
+
+    Returns:
+        mixed: The data, or None if the signature is invalid.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    value = value.encode(encoding)
+    payload, separator, signature = value.rpartition(
+        SEPARATOR.encode(encoding))
+    if not separator:
+        return None
+    if not hmac.compare_digest(
+            signature, _signature(payload, secret, encoding)):
+        return None
+    try:
+        return json.loads(_decode(payload).decode(encoding))
+    except (binascii.Error, ValueError):
+        return None
+
+
+class Serializer(object):
+
+    """Signs, and optionally encrypts, values with a preloaded key.
+
+    The key is encoded (and the encryption key derived) once, rather than
+    every time a value is signed or verified. Encryption requires the
+    `cryptography` package.
+
+    Attributes:
+        key (bytes): The key used to sign values
+        encoding (string): The encoding of the signed values
+    """
+
+    def __init__(self, secret, encoding='utf-8', encrypt=False):
+        if isinstance(secret, str):
+            secret = secret.encode(encoding)
+        self.key = secret
+        self.encoding = encoding
+        self._fernet = None
+        if encrypt:
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(base64.urlsafe_b64encode(hmac.new(
+                secret, b'watson.auth.encrypt', hashlib.sha256).digest()))
+
+    @property
+    def encrypted(self):
+        return self._fernet is not None
+
+    def dumps(self, data):
+        """Signs (and encrypts) the data.
+
+        Args:
+            data (mixed): JSON serializable data
+
+        Returns:
+            string: The signed value
+        """
+        value = sign(data, self.key, self.encoding)
+        if self._fernet:
+            value = self._fernet.encrypt(
+                value.encode(self.encoding)).decode(self.encoding)
+        return value
+
+    def loads(self, value):
+        """Decrypts and verifies a value created by dumps.
+
+        Args:
+            value (string): The signed value
+
+        Returns:
+            mixed: The data, or None if the value is invalid.
+        """
+        if self._fernet:
+            from cryptography.fernet import InvalidToken
+            if not value or not isinstance(value, str):
+                return None
+            try:
+                value = self._fernet.decrypt(
+                    value.encode(self.encoding)).decode(self.encoding)
+            except (InvalidToken, ValueError):
+                return None
+        return unsign(value, self.key, self.encoding)
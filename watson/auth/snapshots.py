@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import time
+from watson.auth import authorization
+from watson.auth.instrumentation import (
+    annotate, check_params, timed, ACL_CHECK, ACL_GENERATE)
+
+
+def create(user, identifier, acl_version=None):
+    """Creates a compact snapshot of a user and their ACL.
+
+    Args:
+        user (watson.auth.models.UserMixin): The user to snapshot
+        identifier (string): The name of the identifier field of the user
+        acl_version (int): The ACL version the snapshot is valid for
+
+    Returns:
+        dict: The JSON serializable snapshot
+    """
+    role_permissions = {}
+    for role in user.roles:
+        for permission in role.permissions:
+            key = permission.permission.key
+            value = 1 if permission.value else 0
+            role_permissions[key] = min(
+                role_permissions.get(key, value), value)
+    return {
+        'id': user.id,
+        'i': getattr(user, identifier),
+        'r': sorted(role.key for role in user.roles),
+        'rp': role_permissions,
+        'up': {permission.permission.key: 1 if permission.value else 0
+               for permission in user.permissions},
+        't': int(time.time()),
+        'v': acl_version,
+    }
+
+
+class Acl(authorization.Acl):
+
+    """An Acl generated from a user snapshot rather than the database.
+    """
+
+    def __init__(self, user, data, session=None):
+        super(Acl, self).__init__(user)
+        self.resources = authorization.ResourcePermissions(user, session)
+        self._role_keys = frozenset(data['r'])
+        self._data = data
+
+    @timed(ACL_CHECK, check_params('role'))
+    def has_role(self, role_key):
+        if isinstance(role_key, (list, tuple, set, frozenset)):
+            return not self._role_keys.isdisjoint(role_key)
+        return role_key in self._role_keys
+
+    @timed(ACL_GENERATE)
+    def _generate_user_permissions(self):
+        annotate(cache_hit=True)
+        permissions = {}
+        for inherited, grants in ((1, self._data['rp']), (0, self._data['up'])):
+            permissions.update(
+                {key: authorization.Permission(
+                    id=None, name=key, inherited=inherited, value=value)
+                    for key, value in grants.items()})
+        self._permissions = permissions
+        self._role_tree = authorization.PermissionTree(self._data['rp'])
+        self._user_tree = authorization.PermissionTree(self._data['up'])
+
+
+class User(object):
+
+    """A user that has been restored from a snapshot.
+
+    The id, identifier and ACL of the user are served from the snapshot. If
+    any other attribute is accessed the user is loaded from the database.
+
+    Attributes:
+        snapshot (dict): The snapshot the user was restored from
+    """
+
+    def __init__(self, snapshot, identifier, loader, session=None):
+        """Initializes the user.
+
+        Args:
+            snapshot (dict): The snapshot created via create()
+            identifier (string): The name of the identifier field of the user
+            loader (callable): Retrieves the user from the database
+            session: The SQLAlchemy session used for resource permissions
+        """
+        self.__dict__.update({
+            'snapshot': snapshot,
+            'id': snapshot['id'],
+            identifier: snapshot['i'],
+            '_loader': loader,
+            '_session': session,
+            '_user': None,
+            '_acl': None,
+        })
+
+    @property
+    def acl(self):
+        if not self._acl:
+            self._acl = Acl(self, self.snapshot, self._session)
+        return self._acl
+
+    @property
+    def user(self):
+        """The user model, loaded from the database on first access.
+        """
+        if self._user is None:
+            self._user = self._loader()
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return '<{0}.User id:{1}>'.format(__name__, self.id)
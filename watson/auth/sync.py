@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import json
+from watson.auth import models
+
+
+def load_definition(file, format=None):
+    """Loads an ACL definition from a JSON or YAML file.
+
+    YAML definitions require PyYAML to be installed.
+
+    Example:
+
+    .. code-block:: yaml
+
+        permissions:
+            posts.create: Create posts
+            posts.delete: Delete posts
+        roles:
+            editor:
+                name: Editor
+                permissions:
+                    posts.create: 1
+                    posts.delete: 0
+
+    Args:
+        file: The open file to read from
+        format (string): Either 'json' or 'yaml', if not specified it is
+                         determined from the extension of the file
+
+    Returns:
+        dict: The definition
+    """
+    if not format:
+        name = str(getattr(file, 'name', '')).lower()
+        format = 'yaml' if name.endswith(('.yml', '.yaml')) else 'json'
+    if format == 'yaml':
+        import yaml
+        return yaml.safe_load(file) or {}
+    return json.load(file)
+
+
+class Changes(object):
+
+    """The changes required to bring the database in line with a definition.
+
+    Attributes:
+        permissions (list): New Permission models
+        roles (list): New Role models
+        renamed (list): (model, name) of existing roles and permissions with a changed name
+        grants (list): New (role key, permission key, value) grants
+        updated_grants (list): (role key, RolesHasPermission, value) of grants with a changed value
+        removed_grants (list): (role key, RolesHasPermission) of grants to delete
+    """
+
+    def __init__(self):
+        self.permissions = []
+        self.roles = []
+        self.renamed = []
+        self.grants = []
+        self.updated_grants = []
+        self.removed_grants = []
+
+    def __bool__(self):
+        return any((self.permissions, self.roles, self.renamed, self.grants,
+                    self.updated_grants, self.removed_grants))
+
+    def summary(self):
+        """A human readable list of the changes.
+        """
+        lines = ['Add permission: {}'.format(permission.key)
+                 for permission in self.permissions]
+        lines.extend('Add role: {}'.format(role.key) for role in self.roles)
+        lines.extend('Rename {}: {}'.format(obj.key, name)
+                     for obj, name in self.renamed)
+        lines.extend('Grant {} to {}: {}'.format(permission, role, value)
+                     for role, permission, value in self.grants)
+        lines.extend('Update {} on {}: {}'.format(
+            grant.permission.key, role, value)
+            for role, grant, value in self.updated_grants)
+        lines.extend('Revoke {} from {}'.format(grant.permission.key, role)
+                     for role, grant in self.removed_grants)
+        return lines
+
+
+class AclSync(object):
+
+    """Synchronizes roles, permissions and their grants with a definition.
+
+    The difference is calculated with a query each for the permissions,
+    roles and grants, and applied in a single transaction. Roles and
+    permissions that are not in the definition are left untouched, however
+    the grants of each role in the definition are made to match it exactly.
+    Permissions that are only referenced by a grant are named after their key.
+
+    Attributes:
+        session: The SQLAlchemy session
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def _normalize(self, definition):
+        permissions = {}
+        for key, name in (definition.get('permissions') or {}).items():
+            permissions[key] = name or key
+        roles = {}
+        for key, role in (definition.get('roles') or {}).items():
+            role = role or {}
+            grants = {permission: 1 if value else 0
+                      for permission, value in (role.get('permissions') or {}).items()}
+            for permission in grants:
+                permissions.setdefault(permission, None)
+            roles[key] = (role.get('name') or key, grants)
+        return permissions, roles
+
+    def diff(self, definition):
+        """Calculates the changes required to apply the definition.
+
+        Args:
+            definition (dict): The definition, see load_definition
+
+        Returns:
+            Changes
+        """
+        changes = Changes()
+        permissions, roles = self._normalize(definition)
+        existing_permissions = {
+            permission.key: permission for permission in self.session.query(
+                models.Permission).filter(
+                    models.Permission.key.in_(list(permissions)))
+        } if permissions else {}
+        existing_roles = {
+            role.key: role for role in self.session.query(
+                models.Role).filter(models.Role.key.in_(list(roles)))
+        } if roles else {}
+        for key, name in permissions.items():
+            permission = existing_permissions.get(key)
+            if not permission:
+                changes.permissions.append(
+                    models.Permission(key=key, name=name or key))
+            elif name and permission.name != name:
+                changes.renamed.append((permission, name))
+        existing_grants = {}
+        role_ids = {role.id: key for key, role in existing_roles.items()}
+        if role_ids:
+            query = self.session.query(
+                models.RolesHasPermission, models.Permission.key).join(
+                    models.Permission).filter(
+                        models.RolesHasPermission.role_id.in_(list(role_ids)))
+            for grant, permission_key in query:
+                existing_grants[role_ids[grant.role_id], permission_key] = grant
+        for key, (name, grants) in roles.items():
+            role = existing_roles.get(key)
+            if not role:
+                changes.roles.append(models.Role(key=key, name=name))
+            elif role.name != name:
+                changes.renamed.append((role, name))
+            for permission_key, value in grants.items():
+                grant = existing_grants.pop((key, permission_key), None)
+                if grant is None:
+                    changes.grants.append((key, permission_key, value))
+                elif grant.value != value:
+                    changes.updated_grants.append((key, grant, value))
+        changes.removed_grants.extend(
+            (role, grant) for (role, _), grant in existing_grants.items()
+            if role in roles)
+        return changes
+
+    def apply(self, changes):
+        """Applies the changes in a single transaction.
+
+        Args:
+            changes (Changes): The changes calculated via diff
+        """
+        if not changes:
+            return
+        session = self.session
+        try:
+            session.add_all(changes.permissions)
+            session.add_all(changes.roles)
+            for obj, name in changes.renamed:
+                obj.name = name
+            for _, grant, value in changes.updated_grants:
+                grant.value = value
+            for _, grant in changes.removed_grants:
+                session.delete(grant)
+            session.flush()
+            if changes.grants:
+                permission_keys = {grant[1] for grant in changes.grants}
+                role_keys = {grant[0] for grant in changes.grants}
+                permission_ids = dict(session.query(
+                    models.Permission.key, models.Permission.id).filter(
+                        models.Permission.key.in_(list(permission_keys))))
+                role_ids = dict(session.query(
+                    models.Role.key, models.Role.id).filter(
+                        models.Role.key.in_(list(role_keys))))
+                session.bulk_insert_mappings(models.RolesHasPermission, [
+                    {'role_id': role_ids[role],
+                     'permission_id': permission_ids[permission],
+                     'value': value}
+                    for role, permission, value in changes.grants])
+                models.AclVersion.increment(session.connection())
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    def sync(self, definition, dry_run=False):
+        """Calculates and applies (unless dry_run) the changes.
+
+        Returns:
+            Changes
+        """
+        changes = self.diff(definition)
+        if not dry_run:
+            self.apply(changes)
+        return changes